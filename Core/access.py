@@ -0,0 +1,163 @@
+import numpy as np
+
+import Dynamics.multirate as multirate
+import Dynamics.propagation as prop
+import utils.attitude_ref as att_ref
+import utils.convert as convert
+
+# Bisection steps used to refine the rise and set times within a sample interval
+REFINE_ITER = 40
+
+def station_frames(stations_lla, planet):
+    '''
+    Planet fixed positions and local vertical of a set of ground stations
+    :param stations_lla: (S,3) station [lat (deg), lon (deg), alt (m)]
+    :param planet: central body
+    :return: (S,3) pcpf positions and (S,3) unit geodetic up vectors
+    '''
+    stations_lla    = np.atleast_2d(np.asarray(stations_lla, dtype=np.float64))
+    lat             = np.radians(stations_lla[:,0])
+    lon             = np.radians(stations_lla[:,1])
+    up              = np.stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)], axis=-1)
+    return att_ref.lla2pcpf(stations_lla, planet), up
+
+def sin_elevations(pcpf, positions, up):
+    '''
+    Sine of the elevation of a satellite seen from every station. Written with
+    matrix products so no (T,S,3) line of sight array is formed
+    :param pcpf: (T,3) satellite pcpf positions
+    :param positions: (S,3) station pcpf positions
+    :param up: (S,3) station up vectors
+    :return: (T,S) sine of the elevation
+    '''
+    height  = pcpf @ up.T - np.einsum('ij,ij->i', positions, up)
+    dist2   = (np.einsum('ij,ij->i', pcpf, pcpf)[:,None] - 2*pcpf @ positions.T
+               + np.einsum('ij,ij->i', positions, positions))
+    return height/np.sqrt(np.maximum(dist2, 1e-12))
+
+def refine(sat, planet, positions, up, sin_mask, k, station):
+    '''
+    Times within the sample intervals [k, k+1] where the elevation crosses the mask,
+    found by bisection on the quintic Hermite interpolant of the inertial trajectory
+    :param sat: satellite
+    :param planet: central body
+    :param positions: (S,3) station pcpf positions
+    :param up: (S,3) station up vectors
+    :param sin_mask: sine of the elevation mask
+    :param k: (E,) sample index at the start of each crossing interval
+    :param station: (E,) station index of each crossing
+    :return: (E,) crossing times
+    '''
+    times   = sat.time_history
+    states  = sat.state_history
+    t0      = times[k][:,None]
+    t1      = times[k+1][:,None]
+    y0      = states[k,0:6]
+    y1      = states[k+1,0:6]
+    a0      = prop.gravity_batch(y0[:,0:3], planet.mu)
+    a1      = prop.gravity_batch(y1[:,0:3], planet.mu)
+    epoch   = convert.daysSinceJ2000(sat.t0)
+
+    def elevation_margin(t):
+        pci     = multirate.hermite(t0, y0, a0, t1, y1, a1, t)
+        pcpf    = att_ref.pci2pcpf(pci, planet, epoch + convert.convertSecToDays(t[:,0]))[:,0:3]
+        los     = pcpf - positions[station]
+        return np.einsum('ij,ij->i', los, up[station])/np.linalg.norm(los, axis=1) - sin_mask
+
+    # The margin changes sign across the interval, keep the half where it still does
+    rising  = elevation_margin(t0) < 0
+    t_lo    = t0.copy()
+    t_hi    = t1.copy()
+    for _ in range(REFINE_ITER):
+        t_mid   = 0.5*(t_lo + t_hi)
+        below   = (elevation_margin(t_mid) < 0)[:,None]
+        t_lo    = np.where(below == rising[:,None], t_mid, t_lo)
+        t_hi    = np.where(below == rising[:,None], t_hi, t_mid)
+    return 0.5*(t_lo + t_hi)[:,0]
+
+def access_windows(sat, planet, positions, up, mask):
+    '''
+    Access windows of one satellite over a set of ground stations. The elevation
+    is evaluated at every recorded sample for all stations at once, and only the
+    sample intervals where it crosses the mask are refined. Passes that rise and set
+    between two samples are not found
+    :param sat: satellite after the run
+    :param planet: central body
+    :param positions: (S,3) station pcpf positions
+    :param up: (S,3) station up vectors
+    :param mask: elevation mask in degrees
+    :return: dictionary of (W,) station, rise, set and max_elevation (deg), ordered by station then rise
+    '''
+    times       = sat.time_history
+    num_times   = len(times)
+    sin_mask    = np.sin(np.radians(mask))
+    sin_el      = sin_elevations(sat.pcpf_hist[:,0:3], positions, up)
+    visible     = sin_el > sin_mask
+
+    # Station-major crossings alternate rise and set, so a station visible at the start
+    # opens with a rise at the first sample and one visible at the end closes with a set
+    # at the last sample
+    station, k  = np.nonzero(visible[1:].T != visible[:-1].T)
+    edge_times  = refine(sat, planet, positions, up, sin_mask, k, station)
+    start       = np.flatnonzero(visible[0])
+    end         = np.flatnonzero(visible[-1])
+    station     = np.concatenate((start, station, end))
+    index       = np.concatenate((np.zeros(len(start), dtype=int), k+1, np.full(len(end), num_times)))
+    edge_times  = np.concatenate((times[np.zeros(len(start), dtype=int)], edge_times,
+                                  times[np.full(len(end), num_times-1)]))
+    order       = np.lexsort((index, station))
+    station, index, edge_times = station[order], index[order], edge_times[order]
+
+    # Largest sampled elevation over the samples of each window
+    rise, stop      = index[0::2], index[1::2]
+    flat            = np.append(sin_el.T.ravel(), 0)
+    bounds          = np.column_stack((station[0::2]*num_times + rise,
+                                       station[0::2]*num_times + np.maximum(stop, rise+1))).ravel()
+    sin_max         = np.maximum.reduceat(flat, bounds)[0::2] if len(bounds) else np.zeros(0)
+
+    return {"station"       : station[0::2],
+            "rise"          : edge_times[0::2],
+            "set"           : edge_times[1::2],
+            "max_elevation" : np.degrees(np.arcsin(np.clip(sin_max, -1, 1)))}
+
+class Access():
+    '''
+    Ground station access of every satellite in a finished run
+    '''
+    def __init__(self, stations, mask):
+        '''
+        :param stations: dictionary of station name -> [lat (deg), lon (deg), alt (m)]
+        :param mask: elevation mask in degrees
+        '''
+        self.station_names  = list(stations.keys())
+        self.stations_lla   = np.array([stations[name] for name in self.station_names], dtype=np.float64)
+        self.mask           = mask
+
+    def run(self, simulator):
+        '''
+        :param simulator: simulator after the run
+        :return: list with a dictionary per access window
+        '''
+        planet          = simulator.central_body
+        positions, up   = station_frames(self.stations_lla, planet)
+
+        windows = []
+        for sat in simulator.satellites:
+            result = access_windows(sat, planet, positions, up, self.mask)
+            windows.extend({"satellite"     : sat.name,
+                            "station"       : self.station_names[station],
+                            "rise"          : float(rise),
+                            "set"           : float(set_time),
+                            "duration"      : float(set_time - rise),
+                            "max_elevation" : float(max_el)}
+                           for station, rise, set_time, max_el in zip(result["station"], result["rise"],
+                                                                      result["set"], result["max_elevation"]))
+        return windows
+
+    def report(self, windows):
+        print(f"{len(windows)} access windows above {self.mask:.1f} deg over {len(self.station_names)} stations")
+        if windows:
+            print(f"{'satellite':>16} {'station':>16} {'rise [s]':>10} {'set [s]':>10} {'duration [s]':>13} {'max el [deg]':>13}")
+        for window in windows:
+            print(f"{window['satellite']:>16} {window['station']:>16} {window['rise']:>10.2f} {window['set']:>10.2f} "
+                  f"{window['duration']:>13.2f} {window['max_elevation']:>13.2f}")
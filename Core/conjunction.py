@@ -0,0 +1,206 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+import Dynamics.multirate as multirate
+import Dynamics.propagation as prop
+
+# Bisection steps used to refine the time of closest approach within a sample interval
+REFINE_ITER = 40
+
+def relative_states(states, pairs, idx):
+    '''
+    :param states: (T,N,6) translational states
+    :param pairs: (K,2) satellite index pairs
+    :param idx: (K,...) time indices
+    :return: (K,...,6) states of the first satellite relative to the second
+    '''
+    return states[idx, pairs[:,0].reshape((-1,) + (1,)*(idx.ndim-1))] \
+         - states[idx, pairs[:,1].reshape((-1,) + (1,)*(idx.ndim-1))]
+
+def screen_pairs(positions, velocities, threshold, h, mu):
+    '''
+    Pairs that can come within the threshold during a window of +-h around one
+    sample time. Candidates are found with a k-d tree query sized by the largest
+    possible relative motion over the window, then kept only if their linearized
+    relative motion passes within the threshold plus a gravity gradient margin
+    :param positions: (N,3) positions at the sample time
+    :param velocities: (N,3) velocities at the sample time
+    :param threshold: screening distance
+    :param h: half width of the window
+    :param mu: gravitational parameter of the central body
+    :return: (K,2) index pairs
+    '''
+    # Relative acceleration of two objects a distance s apart is below 2 mu s/r^3,
+    # 1.5x that is used as the margin
+    r_min   = np.min(np.linalg.norm(positions, axis=1))
+    G       = 3*mu/r_min**3
+    v_max   = 2*np.max(np.linalg.norm(velocities, axis=1))
+    radius  = (threshold + v_max*h)/(1 - 0.5*G*h*h) if 0.5*G*h*h < 1 else np.inf
+
+    tree    = cKDTree(positions)
+    pairs   = tree.query_pairs(radius, output_type='ndarray')
+    if len(pairs) == 0:
+        return pairs
+
+    d       = positions[pairs[:,0]] - positions[pairs[:,1]]
+    v       = velocities[pairs[:,0]] - velocities[pairs[:,1]]
+    v2      = np.maximum(np.einsum('ij,ij->i', v, v), 1e-300)
+    tau     = np.clip(-np.einsum('ij,ij->i', d, v)/v2, -h, h)
+    miss    = np.linalg.norm(d + v*tau[:,None], axis=1)
+    margin  = 0.5*G*(np.linalg.norm(d, axis=1) + np.sqrt(v2)*h)*h*h
+    return pairs[miss - margin < threshold]
+
+def local_minima(states, pairs, centers, half):
+    '''
+    Sample of smallest separation of each candidate pair within its window,
+    kept only where it is a local minimum of the sampled separation
+    :param states: (T,N,6) translational states
+    :param pairs: (K,2) satellite index pairs
+    :param centers: (K,) window center indices
+    :param half: window half width in samples
+    :return: mask of the kept candidates and (K,) sample indices of the minima
+    '''
+    num_times   = len(states)
+    offsets     = np.arange(-half-1, half+2)
+    idx         = np.clip(centers[:,None] + offsets, 0, num_times-1)
+    rel         = relative_states(states, pairs, idx)
+    d2          = np.einsum('ijk,ijk->ij', rel[...,0:3], rel[...,0:3])
+
+    # The window itself excludes the first and last columns, which are only used to
+    # check that a minimum on the window edge is not still decreasing into the next one
+    rows        = np.arange(len(pairs))
+    m           = np.argmin(d2[:,1:-1], axis=1) + 1
+    keep        = (d2[rows,m] <= d2[rows,m-1]) & (d2[rows,m] <= d2[rows,m+1])
+    return keep, idx[rows,m]
+
+def refine(times, states, pairs, n, mu):
+    '''
+    Time of closest approach between the samples either side of n, from quintic
+    Hermite interpolation of the relative trajectory
+    :param times: (T,) sample times
+    :param states: (T,N,6) translational states
+    :param pairs: (K,2) satellite index pairs
+    :param n: (K,) sample indices of the sampled minima
+    :param mu: gravitational parameter of the central body
+    :return: (K,) times of closest approach and (K,6) relative states at them
+    '''
+    num_times   = len(times)
+    rel         = relative_states(states, pairs, n)
+    closing     = np.einsum('ij,ij->i', rel[:,0:3], rel[:,3:6]) < 0
+
+    # Still closing at the sample, so the minimum is after it, otherwise before it
+    lo          = np.where(closing, n, np.maximum(n-1, 0))
+    hi          = np.where(closing, np.minimum(n+1, num_times-1), n)
+    t0          = times[lo][:,None]
+    t1          = times[hi][:,None]
+    edge        = lo == hi
+    t1[edge]    = t0[edge] + 1
+
+    def interval_end(idx):
+        y   = relative_states(states, pairs, idx)
+        a   = (prop.gravity_batch(states[idx, pairs[:,0], 0:3], mu)
+               - prop.gravity_batch(states[idx, pairs[:,1], 0:3], mu))
+        return y, a
+
+    y0, a0      = interval_end(lo)
+    y1, a1      = interval_end(hi)
+
+    # Bisection on the range rate, which changes sign at the closest approach
+    t_lo        = t0.copy()
+    t_hi        = t1.copy()
+    for _ in range(REFINE_ITER):
+        t_mid   = 0.5*(t_lo + t_hi)
+        y       = multirate.hermite(t0, y0, a0, t1, y1, a1, t_mid)
+        opening = np.einsum('ij,ij->i', y[:,0:3], y[:,3:6])[:,None] > 0
+        t_hi    = np.where(opening, t_mid, t_hi)
+        t_lo    = np.where(opening, t_lo, t_mid)
+
+    tca         = 0.5*(t_lo + t_hi)
+    tca[edge]   = t0[edge]
+    y           = multirate.hermite(t0, y0, a0, t1, y1, a1, tca)
+    y[edge]     = y0[edge]
+    return tca[:,0], y
+
+def screen(times, states, threshold, step, mu):
+    '''
+    Close approaches between every pair of satellites. The positions are indexed
+    with a k-d tree on a coarse grid of the samples, only the pairs found close
+    to each other are checked on the full sample grid, and their times of closest
+    approach are refined by interpolating the trajectories between samples
+    :param times: (T,) sample times
+    :param states: (T,N,6) translational states
+    :param threshold: largest miss distance reported
+    :param step: spacing of the coarse grid, rounded to a whole number of samples
+    :param mu: gravitational parameter of the central body
+    :return: dictionary of (K,2) pairs, (K,) tca, (K,) miss_distance and (K,3) relative_velocity,
+             sorted by time of closest approach
+    '''
+    num_times   = len(times)
+    sample_dt   = (times[-1] - times[0])/max(num_times-1, 1)
+    half        = max(int(round(0.5*step/sample_dt)), 1)
+    centers     = list(range(0, num_times, 2*half))
+    if num_times-1 - centers[-1] > half:
+        centers.append(num_times-1)
+
+    pairs       = []
+    windows     = []
+    for c in centers:
+        lo, hi      = max(c-half, 0), min(c+half, num_times-1)
+        h           = max(times[c] - times[lo], times[hi] - times[c])
+        found       = screen_pairs(states[c,:,0:3], states[c,:,3:6], threshold, h, mu)
+        pairs.append(found)
+        windows.append(np.full(len(found), c))
+    pairs       = np.concatenate(pairs).reshape(-1, 2)
+    windows     = np.concatenate(windows).astype(int)
+
+    keep, n     = local_minima(states, pairs, windows, half)
+    pairs, n    = pairs[keep], n[keep]
+
+    # Windows share their edge samples, so the same minimum can be found twice
+    _, unique   = np.unique(np.column_stack((pairs, n)), axis=0, return_index=True)
+    pairs, n    = pairs[unique], n[unique]
+
+    tca, rel    = refine(times, states, pairs, n, mu)
+    miss        = np.linalg.norm(rel[:,0:3], axis=1)
+    close       = miss < threshold
+    order       = np.argsort(tca[close], kind='stable')
+    return {"pairs"             : pairs[close][order],
+            "tca"               : tca[close][order],
+            "miss_distance"     : miss[close][order],
+            "relative_velocity" : rel[close][order,3:6]}
+
+class Screening():
+    '''
+    Close-approach screening of every satellite in a finished run
+    '''
+    def __init__(self, threshold, step):
+        self.threshold  = threshold
+        self.step       = step
+
+    def run(self, simulator):
+        '''
+        :param simulator: simulator after the run
+        :return: list with a dictionary per close approach
+        '''
+        states  = np.concatenate([sat.state_history[:,None,0:6] for sat in simulator.single_sats]
+                                 + [con.state_history[:,:,0:6] for con in simulator.constellations], axis=1)
+        names   = [sat.name for sat in simulator.satellites]
+        result  = screen(simulator.time_array[:len(states)], states, self.threshold, self.step,
+                         simulator.central_body.mu)
+
+        return [{"sat_1"            : names[i],
+                 "sat_2"            : names[j],
+                 "tca"              : float(tca),
+                 "miss_distance"    : float(miss),
+                 "relative_speed"   : float(np.linalg.norm(v_rel)),
+                 "relative_velocity": v_rel.tolist()}
+                for (i, j), tca, miss, v_rel in zip(result["pairs"], result["tca"], result["miss_distance"],
+                                                    result["relative_velocity"])]
+
+    def report(self, conjunctions):
+        print(f"{len(conjunctions)} close approaches within {self.threshold:.1f} m")
+        if conjunctions:
+            print(f"{'sat 1':>16} {'sat 2':>16} {'tca [s]':>12} {'miss [m]':>12} {'rel speed [m/s]':>16}")
+        for event in conjunctions:
+            print(f"{event['sat_1']:>16} {event['sat_2']:>16} {event['tca']:>12.3f} "
+                  f"{event['miss_distance']:>12.2f} {event['relative_speed']:>16.2f}")
@@ -0,0 +1,212 @@
+import numpy as np
+
+import Dynamics.ephemeris as ephemeris
+import Dynamics.multirate as multirate
+import Dynamics.propagation as prop
+import utils.convert as convert
+
+# Bisection steps used to refine an event time within a control step
+REFINE_ITER = 40
+
+# Event name -> direction of the zero crossing that triggers it: -1 when the event
+# function goes from positive to negative, 1 for the reverse and 0 for both
+DIRECTIONS  = {"impact"         : -1,
+               "reentry"        : -1,
+               "umbra"          : 0,
+               "penumbra"       : 0,
+               "periapsis"      : 1,
+               "apoapsis"       : -1,
+               "ascending_node" : 1,
+               "descending_node": -1}
+TERMINAL    = ["impact", "reentry"]
+SHADOWS     = ["umbra", "penumbra"]
+
+def shadow_margins(r, sun, planet):
+    '''
+    Conical shadow model. Seen from the satellite, the body and the Sun are discs
+    of angular radius a_b and a_s whose centers are c apart. The satellite is in
+    the umbra when c < a_b - a_s and in the penumbra when c < a_b + a_s
+    :param r: (K,3) satellite positions
+    :param sun: (K,3) Sun positions relative to the central body
+    :param planet: central body
+    :return: (K,) umbra margins c - (a_b - a_s) and (K,) penumbra margins c - (a_b + a_s), negative in shadow
+    '''
+    to_sun  = sun - r
+    r_mag   = np.linalg.norm(r, axis=1)
+    sun_mag = np.linalg.norm(to_sun, axis=1)
+    a_b     = np.arcsin(np.clip(planet.radius/r_mag, -1, 1))
+    a_s     = np.arcsin(ephemeris.SUN_RADIUS/sun_mag)
+    cos_c   = -np.einsum('ij,ij->i', r, to_sun)/(r_mag*sun_mag)
+    c       = np.arccos(np.clip(cos_c, -1, 1))
+    return c - (a_b - a_s), c - (a_b + a_s)
+
+class Events():
+    '''
+    Events found within each control step as the run progresses. The event
+    functions are evaluated for every satellite at both ends of the step, and
+    where one changes sign its root is refined on the quintic Hermite interpolant
+    of the step. Terminal events stop propagating the satellite, which keeps its
+    state at the event for the rest of the run; logged events are only recorded
+    '''
+    def __init__(self, terminal, logged, reentry_alt=100e3):
+        '''
+        :param terminal: names of the terminal events
+        :param logged: names of the logged events
+        :param reentry_alt: altitude above the central body radius of the reentry event
+        '''
+        for name in terminal + logged:
+            if name not in DIRECTIONS.keys():
+                print(f"Unknown event {name}")
+                exit()
+        for name in terminal:
+            if name not in TERMINAL:
+                print(f"Event {name} can not be terminal")
+                exit()
+
+        self.names          = list(terminal) + list(logged)
+        self.terminal       = np.array([name in terminal for name in self.names], dtype=bool)
+        self.directions     = np.array([DIRECTIONS[name] for name in self.names])
+        self.reentry_alt    = reentry_alt
+        self.log            = []
+
+        # Event functions at the end of the last step, the start of the next one
+        self.t_last         = None
+        self.g_last         = None
+
+    def functions(self, t, states, planet, epoch):
+        '''
+        :param t: (K,) times since the start of the run
+        :param states: (K,6) translational states
+        :param planet: central body
+        :param epoch: start of the run in days since J2000
+        :return: (K,E) values of the event functions
+        '''
+        r       = states[:,0:3]
+        r_mag   = np.linalg.norm(r, axis=1)
+        values  = np.empty((len(states), len(self.names)))
+        if any(name in SHADOWS for name in self.names):
+            sun             = ephemeris.sun_position(planet, epoch + convert.convertSecToDays(t))
+            umbra, penumbra = shadow_margins(r, sun, planet)
+
+        for e, name in enumerate(self.names):
+            if name == "impact":
+                values[:,e] = r_mag - planet.radius
+            elif name == "reentry":
+                values[:,e] = r_mag - planet.radius - self.reentry_alt
+            elif name == "umbra":
+                values[:,e] = umbra
+            elif name == "penumbra":
+                values[:,e] = penumbra
+            elif name in ["periapsis", "apoapsis"]:
+                values[:,e] = np.einsum('ij,ij->i', r, states[:,3:6])
+            else:
+                values[:,e] = r[:,2]
+        return values
+
+    def check(self, simulator, t_now, t_next):
+        '''
+        Finds the events within the step just taken and stops the satellites that
+        reached a terminal event
+        :param simulator: simulator, its satellites have recorded the states at t_next
+        :param t_now: start of the step
+        :param t_next: end of the step
+        '''
+        planet  = simulator.central_body
+        epoch   = convert.daysSinceJ2000(simulator.t0)
+        states  = np.concatenate([np.array([sat.state_history[-2:,0:6] for sat in simulator.single_sats]).reshape(-1, 2, 6)]
+                                 + [con.state_history[-2:,:,0:6].transpose(1, 0, 2) for con in simulator.constellations])
+        active  = ~simulator.stopped_mask()
+        y0      = states[:,0]
+        y1      = states[:,1]
+
+        t0      = np.full(len(states), t_now, dtype=np.float64)
+        if self.t_last == t_now and len(self.g_last) == len(states):
+            g0  = self.g_last
+        else:
+            g0  = self.functions(t0, y0, planet, epoch)
+        g1      = self.functions(t0 + (t_next - t_now), y1, planet, epoch)
+        self.t_last, self.g_last = t_next, g1
+
+        down    = (g0 >= 0) & (g1 < 0)
+        up      = (g0 < 0) & (g1 >= 0)
+        crossed = np.where(self.directions < 0, down, np.where(self.directions > 0, up, down | up)) & active[:,None]
+        sat_idx, event_idx = np.nonzero(crossed)
+        if len(sat_idx) == 0:
+            return
+
+        t_event, y_event = self.refine(t_now, t_next, y0[sat_idx], y1[sat_idx], g0[sat_idx, event_idx] >= 0,
+                                       event_idx, planet, epoch)
+
+        # Only the earliest terminal event of a satellite counts, and nothing after it is logged
+        terminal    = self.terminal[event_idx]
+        t_stop      = np.full(len(states), np.inf)
+        np.minimum.at(t_stop, sat_idx[terminal], t_event[terminal])
+        order       = np.argsort(t_event, kind='stable')
+        for k in order:
+            sat = sat_idx[k]
+            if t_event[k] > t_stop[sat] or (terminal[k] and t_event[k] != t_stop[sat]):
+                continue
+            name    = self.names[event_idx[k]]
+            entry   = {"satellite"  : simulator.satellites[sat].name,
+                       "index"      : int(sat),
+                       "event"      : name,
+                       "t"          : float(t_event[k]),
+                       "altitude"   : float(np.linalg.norm(y_event[k,0:3]) - planet.radius),
+                       "terminal"   : bool(terminal[k])}
+            if name in SHADOWS:
+                entry["direction"] = "entry" if down[sat, event_idx[k]] else "exit"
+            self.log.append(entry)
+            if terminal[k]:
+                simulator.stop(simulator.satellites[sat], y_event[k])
+
+    def refine(self, t_now, t_next, y0, y1, positive, event_idx, planet, epoch):
+        '''
+        Bisection on the event functions along the Hermite interpolant of the step
+        :param t_now: start of the step
+        :param t_next: end of the step
+        :param y0: (K,6) states at t_now
+        :param y1: (K,6) states at t_next
+        :param positive: (K,) whether each event function starts the step non-negative
+        :param event_idx: (K,) event index of each crossing
+        :param planet: central body
+        :param epoch: start of the run in days since J2000
+        :return: (K,) event times and (K,6) states at them
+        '''
+        rows    = np.arange(len(y0))
+        t0      = np.full((len(y0), 1), t_now, dtype=np.float64)
+        t1      = np.full((len(y0), 1), t_next, dtype=np.float64)
+        a0      = prop.gravity_batch(y0[:,0:3], planet.mu)
+        a1      = prop.gravity_batch(y1[:,0:3], planet.mu)
+
+        t_lo    = t0.copy()
+        t_hi    = t1.copy()
+        for _ in range(REFINE_ITER):
+            t_mid   = 0.5*(t_lo + t_hi)
+            y       = multirate.hermite(t0, y0, a0, t1, y1, a1, t_mid)
+            same    = ((self.functions(t_mid[:,0], y, planet, epoch)[rows, event_idx] >= 0) == positive)[:,None]
+            t_lo    = np.where(same, t_mid, t_lo)
+            t_hi    = np.where(same, t_hi, t_mid)
+
+        t_event = 0.5*(t_lo + t_hi)
+        return t_event[:,0], multirate.hermite(t0, y0, a0, t1, y1, a1, t_event)
+
+    def restore(self, log, simulator):
+        '''
+        Replaces the log with one read back from a checkpoint and stops the satellites
+        that had reached a terminal event. Their recorded states are already frozen
+        :param log: list of logged events
+        :param simulator: simulator being resumed
+        '''
+        self.log    = list(log)
+        for entry in self.log:
+            if entry["terminal"]:
+                simulator.stop(simulator.satellites[entry["index"]])
+
+    def report(self):
+        print(f"{len(self.log)} events")
+        if self.log:
+            print(f"{'satellite':>16} {'event':>16} {'t [s]':>12} {'altitude [m]':>14}")
+        for entry in self.log:
+            name = entry["event"] + (f" {entry['direction']}" if "direction" in entry.keys() else "")
+            print(f"{entry['satellite']:>16} {name:>16} {entry['t']:>12.3f} {entry['altitude']:>14.1f}"
+                  + ("  terminal" if entry["terminal"] else ""))
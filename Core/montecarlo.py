@@ -0,0 +1,218 @@
+import os
+import copy
+import yaml
+import numpy as np
+import quaternion
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+
+import utils.loader as loader
+import utils.OEConvert as OEConvert
+import Vehicles.constellation as constellation
+
+STATISTICS  = ["final_state", "max_pointing_error", "min_altitude"]
+ORBIT_KEYS  = ["ecc", "inc", "lan", "argp", "TA"]
+
+def random_rotation(sigma_deg, rng):
+    '''
+    Draws a small rotation about a random axis
+    :param sigma_deg: 1-sigma rotation angle in degrees
+    :param rng: numpy random generator
+    :return: rotation quaternion
+    '''
+    axis    = rng.normal(size=3)
+    axis    = axis/np.linalg.norm(axis)
+    angle   = np.radians(rng.normal(scale=sigma_deg))
+    return quaternion.from_rotation_vector(angle*axis)
+
+def disperse_config(config, dispersions, rng):
+    '''
+    Applies the orbit and attitude dispersions to the initial conditions in a sim config
+    :param config: sim config dictionary, modified in place
+    :param dispersions: dispersion section of the Monte Carlo config
+    :param rng: numpy random generator
+    '''
+    orbit = dispersions.get("orbit", {})
+    for satellite in config["satellites"].values():
+        if "keplerian" in satellite.keys():
+            kep = satellite["keplerian"]
+            for key in ["alt", "semimajor"]:
+                if key in kep.keys() and not isinstance(kep[key], str):
+                    kep[key]   += rng.normal(scale=orbit.get("sma", 0))
+            for key in ORBIT_KEYS:
+                if not isinstance(kep[key], str):
+                    kep[key]   += rng.normal(scale=orbit.get(key, 0))
+            kep["ecc"]          = abs(kep["ecc"])
+        elif "cartesian" in satellite.keys():
+            cart        = satellite["cartesian"]
+            cart["r"]   = (np.array(cart["r"]) + rng.normal(scale=orbit.get("r", 0), size=3)).tolist()
+            cart["v"]   = (np.array(cart["v"]) + rng.normal(scale=orbit.get("v", 0), size=3)).tolist()
+
+        # Attitude errors are applied as a rotation of the body frame
+        q_body_to_inertial  = quaternion.from_float_array(satellite["q_body_to_inertial"])
+        q_body_to_inertial  = q_body_to_inertial * random_rotation(dispersions.get("attitude", 0), rng)
+        satellite["q_body_to_inertial"] = quaternion.as_float_array(q_body_to_inertial.normalized()).tolist()
+        satellite["omega_body"]         = (np.array(satellite["omega_body"], dtype=np.float64)
+                                           + rng.normal(scale=dispersions.get("omega_body", 0), size=3)).tolist()
+
+def disperse_states(states, mu, dispersions, rng):
+    '''
+    Applies the orbit and attitude dispersions to a stack of initial states, as
+    disperse_config does for the satellites of the sim config. Orbits are
+    dispersed in their Keplerian elements
+    :param states: (N,13) initial states
+    :param mu: gravitational parameter of the central body
+    :param dispersions: dispersion section of the Monte Carlo config
+    :param rng: numpy random generator
+    :return: (N,13) dispersed states
+    '''
+    orbit       = dispersions.get("orbit", {})
+    num_sats    = len(states)
+    kep         = OEConvert.cartesian_to_keplerian(states[:,0:6], mu)
+    kep[:,2:6]  = np.degrees(kep[:,2:6])
+    kep[:,0]   += rng.normal(scale=orbit.get("sma", 0), size=num_sats)
+    for col, key in enumerate(ORBIT_KEYS, start=1):
+        kep[:,col] += rng.normal(scale=orbit.get(key, 0), size=num_sats)
+    kep[:,1]    = np.abs(kep[:,1])
+
+    dispersed           = np.empty_like(states)
+    dispersed[:,0:6]    = OEConvert.keplerian_to_cartesian(kep, mu)
+    q_body_to_inertial  = quaternion.from_float_array(states[:,6:10])
+    q_errors            = np.array([random_rotation(dispersions.get("attitude", 0), rng) for _ in range(num_sats)])
+    q_dispersed         = quaternion.as_float_array(q_body_to_inertial * q_errors)
+    dispersed[:,6:10]   = q_dispersed/np.linalg.norm(q_dispersed, axis=1, keepdims=True)
+    dispersed[:,10:13]  = states[:,10:13] + rng.normal(scale=dispersions.get("omega_body", 0), size=(num_sats, 3))
+    return dispersed
+
+def disperse_vehicles(sats, constellations, dispersions, rng):
+    '''
+    Applies the inertia and controller gain dispersions, given as fractional 1-sigma
+    values, and disperses the initial states of the constellation members
+    :param sats: satellites of the run
+    :param constellations: constellations of the run
+    :param dispersions: dispersion section of the Monte Carlo config
+    :param rng: numpy random generator
+    '''
+    for sat in sats:
+        J_scale = 1 + rng.normal(scale=dispersions.get("inertia", 0), size=3)
+        sat.set_inertia(np.diag(np.diag(sat.J)*J_scale))
+        sat.controller.orient_kp   *= 1 + rng.normal(scale=dispersions.get("orient_control_kp", 0))
+        sat.controller.orient_kd   *= 1 + rng.normal(scale=dispersions.get("orient_control_kd", 0))
+
+    # Every member draws its own errors, they only share the nominal vehicle
+    for con in constellations:
+        num_sats    = con.num_sats
+        con.set_init_states(disperse_states(con.init_states, con.central_body.mu, dispersions, rng))
+
+        J_scale     = 1 + rng.normal(scale=dispersions.get("inertia", 0), size=(num_sats, 3))
+        con.set_inertias(np.eye(3)*(np.diag(con.J)*J_scale)[:,None,:])
+        kp          = con.controller.orient_kp*(1 + rng.normal(scale=dispersions.get("orient_control_kp", 0),
+                                                               size=num_sats))
+        kd          = con.controller.orient_kd*(1 + rng.normal(scale=dispersions.get("orient_control_kd", 0),
+                                                               size=num_sats))
+        con.set_gains(kp, kd)
+
+def pointing_error(sat):
+    '''
+    Angle between the body attitude and the target attitude over the run
+    :param sat: satellite after the run
+    :return: (N,) pointing error in degrees
+    '''
+    q_now       = quaternion.as_quat_array(sat.state_history[:,6:10])
+    q_target    = quaternion.as_quat_array(sat.target_orient_history)
+    dq          = quaternion.as_float_array(q_now * np.conjugate(q_target))
+    dq_w        = np.clip(np.abs(dq[:,0])/np.linalg.norm(dq, axis=1), 0, 1)
+    return np.degrees(2*np.arccos(dq_w))
+
+def summarize(sat, statistics):
+    summary = {}
+    if "final_state" in statistics:
+        summary["final_state"]          = np.array(sat.get_state())
+    if "max_pointing_error" in statistics:
+        summary["max_pointing_error"]   = np.max(pointing_error(sat))
+    if "min_altitude" in statistics:
+        summary["min_altitude"]         = np.min(sat.lla_hist[:,2])
+    return summary
+
+def run_case(config, dispersions, statistics, seed_seq):
+    '''
+    Runs one dispersed case. Called in the worker processes, so only the summary
+    statistics are sent back rather than the full histories
+    :param config: undispersed sim config dictionary
+    :param dispersions: dispersion section of the Monte Carlo config
+    :param statistics: names of the statistics to return
+    :param seed_seq: seed sequence of this case
+    :return: list with a dictionary of statistics per satellite
+    '''
+    rng     = np.random.default_rng(seed_seq)
+    config  = copy.deepcopy(config)
+    config["sim"]["save_file"] = None
+    disperse_config(config, dispersions, rng)
+
+    simulator = loader.build_sim(config, lambda sats, constellations: disperse_vehicles(sats, constellations,
+                                                                                       dispersions, rng),
+                                 verbose=False)
+    simulator.run()
+    return [summarize(sat, statistics) for sat in simulator.satellites]
+
+class MonteCarlo():
+    def __init__(self, mc_file):
+        with open(mc_file, 'r') as file:
+            mc_config   = yaml.safe_load(file)
+
+        mc_props            = mc_config["montecarlo"]
+        self.sim_file       = mc_props["sim_file"]
+        self.runs           = int(mc_props["runs"])
+        self.seed           = int(mc_props["seed"])
+        self.workers        = int(mc_props["workers"]) if "workers" in mc_props.keys() else 0
+        self.save_file      = mc_props["save_file"] if "save_file" in mc_props.keys() else None
+        self.dispersions    = mc_config["dispersions"] if "dispersions" in mc_config.keys() else {}
+        self.statistics     = mc_config["statistics"] if "statistics" in mc_config.keys() else STATISTICS
+
+        for stat in self.statistics:
+            if stat not in STATISTICS:
+                print(f"Unknown statistic {stat}")
+                exit()
+
+        with open(self.sim_file, 'r') as file:
+            self.config = yaml.safe_load(file)
+        self.sat_names  = list(self.config["satellites"].keys())
+        if "constellations" in self.config.keys() and self.config["constellations"]:
+            for name, con_props in self.config["constellations"].items():
+                self.sat_names += constellation.member_names(name, int(con_props["total"]), int(con_props["planes"]))
+
+    def run(self):
+        '''
+        Spreads the dispersed runs over a process pool. Every run draws from its own
+        child of the seed sequence, so results do not depend on the worker count or
+        the order the runs finish in
+        :return: dictionary of statistic name -> (runs, satellites, ...) array
+        '''
+        seeds   = np.random.SeedSequence(self.seed).spawn(self.runs)
+        workers = self.workers if self.workers > 0 else os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            cases   = executor.map(run_case, [self.config]*self.runs, [self.dispersions]*self.runs,
+                                   [self.statistics]*self.runs, seeds)
+            cases   = list(tqdm(cases, total=self.runs))
+
+        results = {stat: np.array([[sat_summary[stat] for sat_summary in case] for case in cases])
+                   for stat in self.statistics}
+
+        if self.save_file is not None:
+            os.makedirs(os.path.dirname(self.save_file) or ".", exist_ok=True)
+            np.savez(self.save_file, seed=self.seed, satellites=self.sat_names, **results)
+        return results
+
+    def report(self, results):
+        for i, name in enumerate(self.sat_names):
+            print(name)
+            if "max_pointing_error" in results.keys():
+                error = results["max_pointing_error"][:,i]
+                print(f"  max pointing error [deg]  mean {np.mean(error):.4f}  std {np.std(error):.4f}  worst {np.max(error):.4f}")
+            if "min_altitude" in results.keys():
+                alt = results["min_altitude"][:,i]
+                print(f"  min altitude [m]          mean {np.mean(alt):.1f}  std {np.std(alt):.1f}  worst {np.min(alt):.1f}")
+            if "final_state" in results.keys():
+                r_final = results["final_state"][:,i,0:3]
+                spread  = np.linalg.norm(r_final - np.mean(r_final, axis=0), axis=1)
+                print(f"  final position spread [m] rms {np.sqrt(np.mean(spread**2)):.1f}  max {np.max(spread):.1f}")
@@ -0,0 +1,243 @@
+import os
+import yaml
+import numpy as np
+
+import Dynamics.body as body
+
+FORMAT_VERSION      = 1
+HEADER_FILE         = "header.yaml"
+CHECKPOINT_FILE     = "checkpoint.yaml"
+CONJUNCTION_FILE    = "conjunctions.yaml"
+ACCESS_FILE         = "access.yaml"
+EVENT_FILE          = "events.yaml"
+
+# Satellite attribute -> column file. Recorded columns are written as the run
+# progresses, derived columns are computed from them when the run finishes
+RECORDED_COLUMNS    = {"time_history"           : "time",
+                       "state_history"          : "state",
+                       "target_orient_history"  : "target_orient"}
+DERIVED_COLUMNS     = {"lvlh_to_body_hist"      : "lvlh_to_body",
+                       "hill_to_body_hist"      : "hill_to_body",
+                       "pcpf_hist"              : "pcpf",
+                       "lla_hist"               : "lla"}
+COLUMNS             = {**RECORDED_COLUMNS, **DERIVED_COLUMNS}
+
+def sat_dir(save_dir, idx):
+    return os.path.join(save_dir, f"sat_{idx:04d}")
+
+def con_dir(save_dir, idx):
+    return os.path.join(save_dir, f"con_{idx:04d}")
+
+def satellite_header(sat, directory):
+    return {"name"              : sat.name,
+            "dir"               : os.path.basename(directory),
+            "rows"              : len(sat.state_history),
+            "mass"              : float(sat.mass),
+            "inertia"           : np.asarray(sat.J).tolist(),
+            "model"             : sat.model,
+            "colorscale"        : sat.colorscale,
+            "model_axis_order"  : list(sat.model_axis_order),
+            "lights"            : np.asarray(sat.lights).tolist(),
+            "columns"           : list(COLUMNS.values())}
+
+def member_header(member, con_idx):
+    # Constellation members share the constellation's column files, one column per member
+    header          = satellite_header(member, con_dir("", con_idx))
+    header["index"] = member.idx
+    return header
+
+def stores(simulator):
+    '''
+    Directory and history owner of every set of column files: one per single
+    satellite and one per constellation
+    '''
+    return ([(sat_dir("", i), sat) for i, sat in enumerate(simulator.single_sats)]
+            + [(con_dir("", i), con) for i, con in enumerate(simulator.constellations)])
+
+def write_yaml(data, path):
+    # Write to a temporary file first so a reader never sees a partial file
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w') as file:
+        yaml.safe_dump(data, file, sort_keys=False)
+    os.replace(tmp_file, path)
+
+def write_header(simulator, save_dir):
+    header = {"version"         : FORMAT_VERSION,
+              "central_body"    : {"name": simulator.central_body.name,
+                                   "data": simulator.central_body.planet_data},
+              "t0"              : simulator.t0,
+              "tf"              : float(simulator.tf),
+              "dt"              : float(simulator.dt),
+              "satellites"      : [satellite_header(sat, sat_dir("", i)) for i, sat in enumerate(simulator.single_sats)]
+                                  + [member_header(member, i) for i, con in enumerate(simulator.constellations)
+                                     for member in con.members]}
+    write_yaml(header, os.path.join(save_dir, HEADER_FILE))
+
+class Writer():
+    '''
+    Incremental writer for the columnar output. Recorded columns are preallocated
+    for the whole time grid as .npy memory maps, so each flush only writes the
+    rows recorded since the previous one
+    '''
+    def __init__(self, simulator, save_dir, resume=False):
+        self.simulator  = simulator
+        self.save_dir   = save_dir
+        self.columns    = []
+        self.written    = []
+
+        num_states      = len(simulator.time_array)
+        mode            = 'r+' if resume else 'w+'
+        checkpoint_file = os.path.join(save_dir, CHECKPOINT_FILE)
+        if not resume and os.path.exists(checkpoint_file):
+            # Left over from an earlier run into the same directory
+            os.remove(checkpoint_file)
+        self.stores     = stores(simulator)
+        for directory, owner in self.stores:
+            os.makedirs(os.path.join(save_dir, directory), exist_ok=True)
+            columns = {}
+            for attribute, column in RECORDED_COLUMNS.items():
+                row_shape           = np.shape(getattr(owner, attribute))[1:]
+                columns[attribute]  = np.lib.format.open_memmap(os.path.join(save_dir, directory, column + ".npy"),
+                                                                mode=mode, dtype=np.float64,
+                                                                shape=(num_states,) + row_shape)
+            self.columns.append(columns)
+            self.written.append(len(owner.state_history) if resume else 0)
+
+    def flush(self):
+        for i, (_, owner) in enumerate(self.stores):
+            start   = self.written[i]
+            stop    = len(owner.state_history)
+            for attribute, column in self.columns[i].items():
+                column[start:stop] = getattr(owner, attribute)[start:stop]
+                column.flush()
+            self.written[i] = stop
+
+    def checkpoint(self, time_idx):
+        '''
+        Flushes the new rows and records where the run can be resumed from
+        :param time_idx: index into the time grid of the next step to run
+        '''
+        self.flush()
+        simulator   = self.simulator
+        checkpoint  = {"time_index"     : int(time_idx),
+                       "t_now"          : float(simulator.time_array[time_idx]),
+                       "tf"             : float(simulator.tf),
+                       "dt"             : float(simulator.dt),
+                       "integrator_h"   : float(getattr(simulator.integrator, "h", 0)),
+                       "multirate"      : simulator.multirate.get_segment() if simulator.multirate is not None else None,
+                       "satellites"     : [{"name"  : sat.name,
+                                            "rows"  : int(self.written[i]),
+                                            "state" : np.asarray(sat.get_state()).tolist()}
+                                           for i, sat in enumerate(simulator.single_sats)],
+                       "constellations" : [{"name"  : con.name,
+                                            "rows"  : int(self.written[len(simulator.single_sats) + i])}
+                                           for i, con in enumerate(simulator.constellations)],
+                       "events"         : simulator.events.log if simulator.events is not None else []}
+        write_yaml(checkpoint, os.path.join(self.save_dir, CHECKPOINT_FILE))
+
+    def finalize(self):
+        self.flush()
+        for i, sat in enumerate(self.simulator.single_sats):
+            for attribute, column in DERIVED_COLUMNS.items():
+                np.save(os.path.join(sat_dir(self.save_dir, i), column + ".npy"),
+                        np.ascontiguousarray(getattr(sat, attribute)))
+
+        # Constellation columns are filled member by member
+        for i, con in enumerate(self.simulator.constellations):
+            for attribute, column in DERIVED_COLUMNS.items():
+                rows    = [getattr(member, attribute) for member in con.members]
+                data    = np.lib.format.open_memmap(os.path.join(con_dir(self.save_dir, i), column + ".npy"),
+                                                    mode='w+', dtype=np.float64,
+                                                    shape=(len(rows[0]), con.num_sats) + rows[0].shape[1:])
+                for j, member_rows in enumerate(rows):
+                    data[:,j] = member_rows
+                data.flush()
+                del data
+        write_header(self.simulator, self.save_dir)
+
+def save(simulator, save_dir):
+    '''
+    Writes a simulation as a small yaml header plus one contiguous .npy file per
+    satellite and quantity, so readers can memory map only the columns they use
+    :param simulator: simulator to save
+    :param save_dir: output directory
+    '''
+    Writer(simulator, save_dir).finalize()
+
+def save_conjunctions(conjunctions, save_dir):
+    os.makedirs(save_dir, exist_ok=True)
+    write_yaml(conjunctions, os.path.join(save_dir, CONJUNCTION_FILE))
+
+def save_access(windows, save_dir):
+    os.makedirs(save_dir, exist_ok=True)
+    write_yaml(windows, os.path.join(save_dir, ACCESS_FILE))
+
+def save_events(log, save_dir):
+    os.makedirs(save_dir, exist_ok=True)
+    write_yaml(log, os.path.join(save_dir, EVENT_FILE))
+
+def read_checkpoint(save_dir):
+    '''
+    Reads the latest checkpoint of a run and its recorded columns
+    :param save_dir: output directory of the run
+    :return: checkpoint dictionary, and per single satellite and per constellation a dictionary of recorded columns
+    '''
+    with open(os.path.join(save_dir, CHECKPOINT_FILE), 'r') as file:
+        checkpoint = yaml.safe_load(file)
+
+    def read_columns(directory, rows):
+        return {attribute: np.load(os.path.join(directory, column + ".npy"),
+                                   mmap_mode='r', allow_pickle=False)[:rows]
+                for attribute, column in RECORDED_COLUMNS.items()}
+
+    histories       = [read_columns(sat_dir(save_dir, i), props["rows"])
+                       for i, props in enumerate(checkpoint["satellites"])]
+    con_histories   = [read_columns(con_dir(save_dir, i), props["rows"])
+                       for i, props in enumerate(checkpoint.get("constellations", []))]
+    return checkpoint, histories, con_histories
+
+class SatelliteData():
+    '''
+    Read-only view of one saved satellite. Columns are memory mapped the first
+    time they are accessed
+    '''
+    def __init__(self, save_dir, props):
+        self.path               = os.path.join(save_dir, props["dir"])
+        self.rows               = props["rows"]
+        self.name               = props["name"]
+        self.mass               = props["mass"]
+        self.J                  = np.array(props["inertia"])
+        self.model              = props["model"]
+        self.colorscale         = props["colorscale"]
+        self.model_axis_order   = props["model_axis_order"]
+        self.lights             = np.array(props["lights"])
+        self.index              = props["index"] if "index" in props.keys() else None
+
+    def __getattr__(self, name):
+        if name not in COLUMNS.keys():
+            raise AttributeError(name)
+        column = np.load(os.path.join(self.path, COLUMNS[name] + ".npy"),
+                         mmap_mode='r', allow_pickle=False)[:self.rows]
+        if self.index is not None and name != "time_history":
+            column = column[:,self.index]
+        setattr(self, name, column)
+        return column
+
+class SimData():
+    '''
+    Saved simulation as read back from disk
+    '''
+    def __init__(self, save_dir):
+        with open(os.path.join(save_dir, HEADER_FILE), 'r') as file:
+            header = yaml.safe_load(file)
+
+        body_props          = header["central_body"]
+        self.save_dir       = save_dir
+        self.central_body   = body.Body(body_props["name"], body_props["data"])
+        self.t0             = header["t0"]
+        self.tf             = header["tf"]
+        self.dt             = header["dt"]
+        self.satellites     = [SatelliteData(save_dir, props) for props in header["satellites"]]
+
+def load(save_dir):
+    return SimData(save_dir)
@@ -2,36 +2,284 @@ import numpy as np
 from tqdm import tqdm
 from scipy.integrate import solve_ivp
 
+import Core.output as output
+import Dynamics.kepler as kepler
 import Dynamics.propagation as prop
+import utils.attitude_ref as att_ref
+import Vehicles.constellation as constellation
+import Vehicles.GNC.control as ctrl
 
 class Simulator():
-    def __init__(self, central_body, t0, tf, dt, satellites, save_file):
+    def __init__(self, central_body, t0, tf, dt, satellites, save_file, batch=False,
+                 integrator=None, checkpoint_interval=0, multirate=None, constellations=None, screening=None,
+                 access=None, events=None):
         self.central_body   = central_body
         self.t0             = t0
         self.t_now          = 0
         self.tf             = tf
         self.dt             = dt
         self.time_array     = np.arange(0, tf+dt, dt)
-        self.satellites     = satellites
+        self.single_sats    = satellites
+        self.constellations = constellations if constellations is not None else []
+        self.satellites     = satellites + [member for con in self.constellations for member in con.members]
         self.save_file      = save_file
+        self.batch          = batch
+        self.integrator     = integrator
+        self.multirate      = multirate
+        self.screening      = screening
+        self.conjunctions   = None
+        self.access         = access
+        self.access_windows = None
+        self.events         = events
+        self.stopped_sats   = []
+        self.start_index    = 0
+        self.show_progress  = True
+
+        # Number of steps between checkpoints, 0 disables them
+        self.checkpoint_steps   = int(round(checkpoint_interval/dt)) if checkpoint_interval else 0
+
+        # Preallocate the satellite histories for the whole run
+        for sat in self.single_sats:
+            sat.reserve_history(len(self.time_array))
+        for con in self.constellations:
+            con.reserve_history(len(self.time_array))
+
+        self.partition()
+
+    def partition(self):
+        '''
+        Splits the single satellites that are still propagated by propagator, and
+        builds the stacked properties each group is stepped with
+        '''
+        central_body        = self.central_body
+        satellites          = [sat for sat in self.single_sats if sat not in self.stopped_sats]
+
+        # Satellites whose translational state is propagated analytically
+        self.numeric_sats   = [sat for sat in satellites if sat.propagator != "kepler"]
+        self.kepler_sats    = [sat for sat in satellites if sat.propagator == "kepler"]
+        if self.kepler_sats:
+            # The epoch is the first recorded state, so resumed runs reproduce the same orbit
+            self.kepler     = kepler.KeplerPropagator([sat.state_history[0,0:6] for sat in self.kepler_sats],
+                                                      central_body, [sat.j2_secular for sat in self.kepler_sats])
+
+        # Stacked vehicle properties for the batched propagation
+        self.masses         = np.array([sat.mass for sat in self.numeric_sats])
+        self.Js             = np.array([sat.J for sat in self.numeric_sats])
+        self.ballistics     = np.array([sat.ballistic for sat in self.numeric_sats])
+        if self.numeric_sats:
+            self.batch_dynamics = prop.StateDotBatch(self.masses, self.Js, central_body, self.ballistics)
+            if self.multirate is not None:
+                self.multirate.setup(self.numeric_sats, central_body)
+
+    def stop(self, sat, orbit_state=None):
+        '''
+        Stops propagating a satellite, which keeps its last recorded state for the
+        rest of the run
+        :param sat: satellite to stop
+        :param orbit_state: translational state the last recorded state is replaced with
+        '''
+        if orbit_state is not None:
+            sat.state_store.last()[0:6] = orbit_state
+        if isinstance(sat, constellation.ConstellationMember):
+            sat.constellation.stopped[sat.idx] = True
+        elif sat not in self.stopped_sats:
+            self.stopped_sats.append(sat)
+            self.partition()
+
+    def stopped_mask(self):
+        return np.concatenate([np.array([sat in self.stopped_sats for sat in self.single_sats], dtype=bool)]
+                              + [con.stopped for con in self.constellations])
+
+    def get_inputs(self, sats):
+        '''
+        Guidance and control inputs of a set of satellites, evaluated as one stacked call
+        :param sats: satellites to evaluate
+        :return: (N,4) target quaternions, (N,3) thrust and (N,3) torque commands
+        '''
+        states      = np.array([sat.get_state() for sat in sats])
+        q_prev      = np.array([sat.target_orient_store.last() for sat in sats])
+        k_p         = np.array([sat.controller.orient_kp for sat in sats], dtype=np.float64)
+        k_d         = np.array([sat.controller.orient_kd for sat in sats], dtype=np.float64)
+
+        q_targets   = att_ref.get_inertial_to_lvlh(states[:,0:6], q_prev)
+        T_bodies    = np.zeros((len(sats), 3))
+        L_bodies    = ctrl.get_torque_cmds(states[:,6:13], q_targets, k_p, k_d)
+        return q_targets, T_bodies, L_bodies
 
     def tic(self, t_now, t_next):
-        for sat in self.satellites:
-            q_target, T_body, L_body = sat.get_inputs(self.central_body.mu)
-            
-            sol = solve_ivp(prop.state_dot, t_span=[t_now, t_next], y0=sat.get_state(), 
-                            args=(sat.mass, sat.J, T_body, L_body, self.central_body), 
-                            method='RK45')
-            
-            sat.update_state_hist(self.t0, self.t_now, sol.y[:,-1,], q_target, self.central_body)
+        for con in self.constellations:
+            self.tic_constellation(con, t_now, t_next)
+
+        if self.kepler_sats:
+            self.tic_kepler(t_now, t_next)
+
+        for sat in self.stopped_sats:
+            sat.update_state_hist(t_next, sat.get_state(), sat.target_orient_store.last())
+
+        if not self.numeric_sats:
+            return
+
+        if self.multirate is not None:
+            self.tic_multirate(t_now, t_next)
+            return
+
+        if self.batch:
+            self.tic_batch(t_now, t_next)
+            return
+
+        q_targets, T_bodies, L_bodies = self.get_inputs(self.numeric_sats)
+        for sat, q_target, T_body, L_body in zip(self.numeric_sats, q_targets, T_bodies, L_bodies):
+            state = self.propagate(sat.dynamics, t_now, t_next, sat.get_state(), (T_body, L_body))
+
+            sat.update_state_hist(t_next, state, q_target)
+
+    def tic_batch(self, t_now, t_next):
+        q_targets, T_bodies, L_bodies = self.get_inputs(self.numeric_sats)
+        states      = np.array([sat.get_state() for sat in self.numeric_sats])
+
+        # Propagate every satellite as one stacked system
+        new_states  = self.propagate(self.batch_dynamics, t_now, t_next, states.ravel(), (T_bodies, L_bodies))
+
+        new_states  = new_states.reshape(len(self.numeric_sats), 13)
+        for sat, state, q_target in zip(self.numeric_sats, new_states, q_targets):
+            sat.update_state_hist(t_next, state, q_target)
+
+    def tic_multirate(self, t_now, t_next):
+        q_targets, T_bodies, L_bodies = self.get_inputs(self.numeric_sats)
+        states      = np.array([sat.get_state() for sat in self.numeric_sats])
+
+        # Orbits advance in large steps shared by all satellites, attitudes are sub-stepped
+        new_states          = np.empty_like(states)
+        new_states[:,0:6]   = self.multirate.orbit_states(t_now, t_next, states, T_bodies)
+        new_states[:,6:13]  = self.multirate.attitudes(t_now, t_next, states, L_bodies, self.batch)
+        for sat, state, q_target in zip(self.numeric_sats, new_states, q_targets):
+            sat.update_state_hist(t_next, state, q_target)
+
+    def tic_kepler(self, t_now, t_next):
+        # Translational states come from the analytic solution, only the attitude is integrated
+        orbits                          = self.kepler.states_at(t_next, self.dt)
+        q_targets, _, L_bodies          = self.get_inputs(self.kepler_sats)
+        for sat, orbit, q_target, L_body in zip(self.kepler_sats, orbits, q_targets, L_bodies):
+            if sat.hold_attitude:
+                attitude = sat.get_rotational_state()
+            else:
+                attitude = self.propagate(sat.attitude_dynamics, t_now, t_next, sat.get_rotational_state(), (L_body,))
+
+            sat.update_state_hist(t_next, np.hstack((orbit, attitude)), q_target)
+
+    def tic_constellation(self, con, t_now, t_next):
+        q_targets, T_bodies, L_bodies = con.get_inputs(self.central_body.mu)
+        states  = con.get_states()
+
+        if con.propagator == "kepler":
+            new_states          = np.empty_like(states)
+            new_states[:,0:6]   = con.kepler.states_at(t_next, self.dt)
+            if con.hold_attitude:
+                new_states[:,6:13] = states[:,6:13]
+            else:
+                rot_states          = np.ascontiguousarray(states[:,6:13]).ravel()
+                new_states[:,6:13]  = self.propagate(con.attitude_dynamics, t_now, t_next, rot_states,
+                                                     (L_bodies,)).reshape(-1, 7)
+        else:
+            new_states = self.propagate(con.dynamics, t_now, t_next, states.ravel(), (T_bodies, L_bodies))
+
+        new_states  = new_states.reshape(-1, 13)
+        if np.any(con.stopped):
+            new_states[con.stopped] = states[con.stopped]
+            q_targets[con.stopped]  = con.target_orient_store.last()[con.stopped]
+        con.update_state_hist(t_next, new_states, q_targets)
+
+    def propagate(self, kernel, t_now, t_next, y0, args):
+        '''
+        Integrates a state across one control interval
+        :param kernel: dynamics kernel writing the state derivative into a buffer, kernel(t, y, out, *args)
+        :param t_now: start of the interval
+        :param t_next: end of the interval
+        :param y0: state at t_now
+        :param args: extra arguments passed to the right hand side
+        :return: state at t_next
+        '''
+        if self.integrator is None:
+            def rhs(t, y, *args):
+                y_dot = np.empty(len(y))
+                kernel(t, y, y_dot, *args)
+                return y_dot
+
+            sol = solve_ivp(rhs, t_span=[t_now, t_next], y0=y0, args=args, method='RK45')
+            return sol.y[:,-1]
+        return self.integrator.integrate(kernel, t_now, t_next, y0, args)
 
     def save(self):
-        np.save(self.save_file, self)
-    
+        output.save(self, self.save_file)
+
+    def restore(self):
+        '''
+        Restores the satellite histories and the time index from the latest checkpoint
+        in the save directory, so run() continues from there
+        '''
+        checkpoint, histories, con_histories = output.read_checkpoint(self.save_file)
+        if checkpoint["tf"] != self.tf or checkpoint["dt"] != self.dt:
+            print("Checkpoint was written for a different time grid")
+            exit()
+
+        for sat, columns in zip(self.single_sats + self.constellations, histories + con_histories):
+            sat.restore_history(columns["time_history"], columns["state_history"],
+                                columns["target_orient_history"], len(self.time_array))
+
+        if self.events is not None:
+            self.events.restore(checkpoint.get("events", []), self)
+
+        if checkpoint["integrator_h"] and hasattr(self.integrator, "h"):
+            self.integrator.h = checkpoint["integrator_h"]
+
+        # Restored after the events, stopping a satellite starts a new orbit step
+        if self.multirate is not None and checkpoint.get("multirate") is not None:
+            self.multirate.set_segment(checkpoint["multirate"])
+
+        self.start_index    = checkpoint["time_index"]
+        self.t_now          = self.time_array[self.start_index]
+
     def run(self):
-        for i in tqdm(range(len(self.time_array)-1)):
+        # Runs without a save file (e.g. Monte Carlo cases) keep their results in memory
+        writer      = None
+        if self.save_file is not None:
+            writer  = output.Writer(self, self.save_file, resume=self.start_index > 0)
+        num_steps   = len(self.time_array)-1
+
+        for i in tqdm(range(self.start_index, num_steps), initial=self.start_index, total=num_steps,
+                      disable=not self.show_progress):
             self.t_now = self.time_array[i]
             self.tic(self.t_now, self.t_now + self.dt)
-        
-        self.save()
-            
+
+            if self.events is not None:
+                self.events.check(self, self.t_now, self.t_now + self.dt)
+                if np.all(self.stopped_mask()):
+                    # Nothing left to propagate, the histories end here
+                    break
+
+            if writer and self.checkpoint_steps and (i+1) % self.checkpoint_steps == 0 and i+1 < num_steps:
+                writer.checkpoint(i+1)
+
+        if writer:
+            writer.finalize()
+
+        if self.events is not None:
+            if self.show_progress:
+                self.events.report()
+            if self.save_file is not None:
+                output.save_events(self.events.log, self.save_file)
+
+        if self.screening is not None:
+            self.conjunctions = self.screening.run(self)
+            if self.show_progress:
+                self.screening.report(self.conjunctions)
+            if self.save_file is not None:
+                output.save_conjunctions(self.conjunctions, self.save_file)
+
+        if self.access is not None:
+            self.access_windows = self.access.run(self)
+            if self.show_progress:
+                self.access.report(self.access_windows)
+            if self.save_file is not None:
+                output.save_access(self.access_windows, self.save_file)
+
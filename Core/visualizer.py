@@ -1,69 +1,130 @@
+import os
 import utils.plot as stills
 import utils.animation as animate
 import utils.format as format
 
+EXPORT_FORMATS = ["html", "json"]
+
 class Visualizer():
-    def __init__(self, sim_data, anim_framerate):
+    def __init__(self, sim_data, anim_framerate, max_points=2000, mesh_cache=None, max_faces=0, anim_workers=1):
         self.sim_data       = sim_data
         self.planet         = sim_data.central_body
         self.satellites     = sim_data.satellites
         self.anim_framerate = anim_framerate
+        self.anim_workers   = anim_workers
+
+        # Plots written by export, see loader.load_vis
+        self.export_plots   = []
+        self.export_dir     = "output/plots"
+        self.export_formats = ["html"]
 
+        # Trajectories and ground tracks are decimated once and drawn from the kept points
         for i in range(len(self.satellites)):
             sat = self.satellites[i]
-            sat.vehicle_model = format.model(sat)
+            sat.vehicle_model   = format.model(sat, mesh_cache, max_faces)
+            sat.traj_keep       = stills.decimate(sat.state_history[:,0:3], max_points)
+            sat.track_keep      = stills.decimate(sat.lla_hist[:,0:2], max_points)
+            sat.plot_states     = {}
 
-    def run(self, plot):
+    def figures(self, plot):
+        '''
+        Builds the figures of one plot type
+        :param plot: plot type
+        :return: list of (name, figure), animations have one figure per satellite
+        '''
         sim_data        = self.sim_data
         planet          = sim_data.central_body
         satellites      = sim_data.satellites
+        figures         = []
         
         planet_letter   = planet.name[0].upper()
 
         for i in range(len(satellites)):
             sat = self.sim_data.satellites[i]
+            name = f"{plot}_{sat.name}"
 
             if str(f"{planet_letter}ci_anim").casefold() == plot.casefold():
                 print(f"Creating {planet_letter}CI Trajectory Animation")
-                eci = animate.pci(sat, planet, self.anim_framerate)
-                eci.show()
+                eci = animate.pci(sat, planet, self.anim_framerate, self.anim_workers)
+                figures.append((name, eci))
 
             if "att_inertial_anim" in plot:
                 print("Creating Attitude wrt. Inertial Animation")
-                att = animate.att_inertial(sat, self.anim_framerate)
-                att.show()
+                att = animate.att_inertial(sat, self.anim_framerate, self.anim_workers)
+                figures.append((name, att))
 
             if "att_lvlh_anim" in plot:
                 print("Creating Attitude wrt. LVLH Animation")
-                lvlh = animate.att_lvlh(sat, self.anim_framerate)
-                lvlh.show()
+                lvlh = animate.att_lvlh(sat, self.anim_framerate, self.anim_workers)
+                figures.append((name, lvlh))
 
             if "att_hill_anim" in plot:
                 print("Creating Attitude wrt. Hill Animation")
-                hill = animate.att_hill(sat, self.anim_framerate)
-                hill.show()
+                hill = animate.att_hill(sat, self.anim_framerate, self.anim_workers)
+                figures.append((name, hill))
 
             if "groundtrack_anim" in plot:
                 print("Creating Groundtrack Animation")
-                groundtrack = animate.groundtrack(sat, planet, self.anim_framerate)
-                groundtrack.show()
+                groundtrack = animate.groundtrack(sat, planet, self.anim_framerate, self.anim_workers)
+                figures.append((name, groundtrack))
 
             if str("ecef_anim").casefold() == plot.casefold():
                 print("Creating ECEF Trajectory Animation")
-                ecef = animate.ecef(sat, planet, self.anim_framerate)
-                ecef.show()
+                ecef = animate.ecef(sat, planet, self.anim_framerate, self.anim_workers)
+                figures.append((name, ecef))
 
         if plot == "groundtrack":
             print("Creating Groundtrack Plot")
             groundtrack = stills.ground_track(satellites, planet)
-            groundtrack.show()
+            figures.append((plot, groundtrack))
 
         if str(f"{planet_letter}ci").casefold() == plot.casefold():
             print(f"Creating {planet_letter}CI Trajectory Plot")
             eci = stills.pci(satellites, planet)
-            eci.show()
+            figures.append((plot, eci))
 
         if plot == "ecef":
             print("Creating ECEF Trajectory Plot")
             ecef = stills.ecef(satellites, planet)
-            ecef.show()
\ No newline at end of file
+            figures.append((plot, ecef))
+
+        if not figures:
+            print(f"Unknown plot {plot}")
+        return figures
+
+    def run(self, plot):
+        for _, fig in self.figures(plot):
+            fig.show()
+
+    def export(self, plots=None, directory=None, formats=None):
+        '''
+        Writes the figures of several plot types to files instead of showing them, so
+        no browser is needed. The vehicle models, decimated trajectories, derived
+        histories and plot states of the satellites are built once and shared by all
+        the plots. HTML files load plotly.js from one copy written next to them
+        :param plots: plot types, the export plots of vis.yaml by default
+        :param directory: output directory, the export directory of vis.yaml by default
+        :param formats: "html" and/or "json", the export formats of vis.yaml by default
+        :return: list of the written files
+        '''
+        plots       = self.export_plots if plots is None else plots
+        directory   = self.export_dir if directory is None else directory
+        formats     = self.export_formats if formats is None else formats
+        for file_format in formats:
+            if file_format not in EXPORT_FORMATS:
+                print(f"Unknown export format {file_format}")
+                exit()
+
+        os.makedirs(directory, exist_ok=True)
+        written     = []
+        for plot in plots:
+            for name, fig in self.figures(plot):
+                path = os.path.join(directory, name)
+                if "html" in formats:
+                    fig.write_html(path + ".html", include_plotlyjs="directory", auto_play=False)
+                    written.append(path + ".html")
+                if "json" in formats:
+                    fig.write_json(path + ".json")
+                    written.append(path + ".json")
+        print(f"Wrote {len(written)} files to {directory}")
+        return written
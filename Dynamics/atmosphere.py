@@ -0,0 +1,165 @@
+import math
+import numpy as np
+
+# Piecewise exponential atmosphere of Vallado, Fundamentals of Astrodynamics and
+# Applications, table 8-4. Each layer is [base altitude (m), base density (kg/m^3),
+# scale height (m)] and holds up to the base of the next one
+VALLADO_LAYERS = [[0e3,    1.225,     7.249e3],
+                  [25e3,   3.899e-2,  6.349e3],
+                  [30e3,   1.774e-2,  6.682e3],
+                  [40e3,   3.972e-3,  7.554e3],
+                  [50e3,   1.057e-3,  8.382e3],
+                  [60e3,   3.206e-4,  7.714e3],
+                  [70e3,   8.770e-5,  6.549e3],
+                  [80e3,   1.905e-5,  5.799e3],
+                  [90e3,   3.396e-6,  5.382e3],
+                  [100e3,  5.297e-7,  5.877e3],
+                  [110e3,  9.661e-8,  7.263e3],
+                  [120e3,  2.438e-8,  9.473e3],
+                  [130e3,  8.484e-9,  12.636e3],
+                  [140e3,  3.845e-9,  16.149e3],
+                  [150e3,  2.070e-9,  22.523e3],
+                  [180e3,  5.464e-10, 29.740e3],
+                  [200e3,  2.789e-10, 37.105e3],
+                  [250e3,  7.248e-11, 45.546e3],
+                  [300e3,  2.418e-11, 53.628e3],
+                  [350e3,  9.518e-12, 53.298e3],
+                  [400e3,  3.725e-12, 58.515e3],
+                  [450e3,  1.585e-12, 60.828e3],
+                  [500e3,  6.967e-13, 63.822e3],
+                  [600e3,  1.454e-13, 71.835e3],
+                  [700e3,  3.614e-14, 88.667e3],
+                  [800e3,  1.170e-14, 124.64e3],
+                  [900e3,  5.245e-15, 181.05e3],
+                  [1000e3, 3.019e-15, 268.00e3]]
+
+def exponential_density(alt, rho0, scale_height):
+    '''
+    :param alt: altitudes in m
+    :param rho0: density at zero altitude
+    :param scale_height: scale height in m
+    :return: densities of a single exponential atmosphere
+    '''
+    return rho0*np.exp(-np.asarray(alt, dtype=np.float64)/scale_height)
+
+def layered_density(alt, layers):
+    '''
+    :param alt: altitudes in m
+    :param layers: [base altitude, base density, scale height] of each layer, by increasing altitude
+    :return: densities of a piecewise exponential atmosphere, below the first layer its density is extended
+    '''
+    layers  = np.asarray(layers, dtype=np.float64)
+    alt     = np.asarray(alt, dtype=np.float64)
+    layer   = np.clip(np.searchsorted(layers[:,0], alt, side='right') - 1, 0, len(layers) - 1)
+    return layers[layer,1]*np.exp(-(alt - layers[layer,0])/layers[layer,2])
+
+class DensityTable():
+    '''
+    Atmospheric density tabulated on a uniform altitude grid. A lookup is an index
+    computation and a linear interpolation between two entries, so evaluating the
+    density costs the same for any atmosphere model and no exponentials or layer
+    searches are done in the dynamics. Below the table the lowest entry is used, and
+    the density falls linearly to zero over the step above the table
+    '''
+    def __init__(self, altitudes, densities):
+        '''
+        :param altitudes: (M,) equally spaced altitudes in m, starting at the lowest tabulated altitude
+        :param densities: (M,) densities at those altitudes
+        '''
+        altitudes       = np.asarray(altitudes, dtype=np.float64)
+        self.alt_min    = float(altitudes[0])
+        self.alt_max    = float(altitudes[-1])
+        self.step       = float(altitudes[1] - altitudes[0])
+        self.inv_step   = 1/self.step
+        self.top        = float(len(altitudes))
+
+        # A zero entry closes the table, so every index up to top has a next entry
+        self.rho        = np.append(np.asarray(densities, dtype=np.float64), 0.0)
+        self.slope      = np.append(np.diff(self.rho), 0.0)
+        self.rho_list   = self.rho.tolist()
+        self.slope_list = self.slope.tolist()
+
+    def density(self, alt):
+        '''
+        :param alt: altitude in m
+        :return: density, as a float
+        '''
+        s = (alt - self.alt_min)*self.inv_step
+        if s <= 0:
+            return self.rho_list[0]
+        if s >= self.top:
+            return 0.0
+        i = int(s)
+        return self.rho_list[i] + self.slope_list[i]*(s - i)
+
+    def density_batch(self, alt, out, index, scratch):
+        '''
+        :param alt: (N,) altitudes in m
+        :param out: (N,) output buffer
+        :param index: (N,) integer work buffer
+        :param scratch: (N,) work buffer
+        :return: out, holding the (N,) densities
+        '''
+        np.subtract(alt, self.alt_min, out=out)
+        out        *= self.inv_step
+        np.clip(out, 0, self.top, out=out)
+        np.floor(out, out=scratch)
+        index[:]    = scratch
+        out        -= scratch
+        np.take(self.slope, index, out=scratch)
+        out        *= scratch
+        np.take(self.rho, index, out=scratch)
+        out        += scratch
+        return out
+
+def exponential_table(rho0, scale_height, alt_max=1500e3, step=100):
+    return DensityTable(*_grid(alt_max, step, lambda alt: exponential_density(alt, rho0, scale_height)))
+
+def layered_table(layers, alt_max=1500e3, step=100):
+    return DensityTable(*_grid(alt_max, step, lambda alt: layered_density(alt, layers)))
+
+def _grid(alt_max, step, density):
+    altitudes = np.arange(0, math.ceil(alt_max/step) + 1)*float(step)
+    return altitudes, density(altitudes)
+
+class Atmosphere():
+    '''
+    Atmosphere of a central body for the drag perturbation: the density table and
+    the constants needed to find the altitude and the velocity relative to the air
+    '''
+    def __init__(self, table, central_body):
+        '''
+        :param table: density table
+        :param central_body: body the atmosphere co-rotates with
+        '''
+        self.table      = table
+        self.radius     = central_body.radius
+        self.flattening = 1 - central_body.polar_radius/central_body.radius
+        self.omega      = 2*math.pi/central_body.sidereal_day
+
+def build(central_body, model="exponential", layers=None, alt_max=1500e3, step=100):
+    '''
+    Tabulates the atmosphere of a central body
+    :param central_body: central body
+    :param model: "exponential" for the body's rho and scaleHeight, or "layered" for a piecewise exponential model
+    :param layers: layered: [base altitude, base density, scale height] of each layer, the Vallado table by default for Earth
+    :param alt_max: top of the table in m
+    :param step: altitude spacing of the table in m
+    :return: atmosphere
+    '''
+    if model == "exponential":
+        if central_body.scaleHeight is None:
+            print(f"No exponential atmosphere for {central_body.name}")
+            exit()
+        table = exponential_table(central_body.rho0, central_body.scaleHeight, alt_max, step)
+    elif model == "layered":
+        if layers is None:
+            if central_body.name != "Earth":
+                print(f"No atmosphere layers given for {central_body.name}")
+                exit()
+            layers = VALLADO_LAYERS
+        table = layered_table(layers, alt_max, step)
+    else:
+        print(f"Unknown atmosphere model {model}")
+        exit()
+    return Atmosphere(table, central_body)
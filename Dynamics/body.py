@@ -2,6 +2,7 @@ import numpy as np
 class Body:
     def __init__(self, name, planet_data):
         self.name   = name
+        self.planet_data = planet_data
 
         self.radius         = float(planet_data["radius"])
         self.polar_radius   = float(planet_data["polar_radius"])
@@ -27,3 +28,12 @@ class Body:
             self.rho0           = 0
             self.scaleHeight    = None
             print(f"Warning: Atmosphere not supported for {self.name}")
+
+        # Density table used by the drag perturbation, see Dynamics/atmosphere.py
+        self.atmosphere     = None
+
+        # Spherical harmonic field replacing point mass gravity and J2, see Dynamics/gravity.py
+        self.gravity_field  = None
+
+        # Perturbing bodies, see Dynamics/third_body.py
+        self.third_bodies   = None
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import numpy as np
+
+AU          = 149597870700.0
+SUN_MU      = 1.32712440018e20
+SUN_RADIUS  = 695700e3
+
+# Bumped whenever the analytic series change, so stale cached fits are not reused
+MODEL_VERSION = 1
+
+def sun_position(planet, days_since_j2000):
+    '''
+    Position of the Sun relative to the central body, in the central body's inertial
+    frame. Earth uses the low precision solar coordinates of the Astronomical Almanac
+    (about 0.01 deg). Other bodies are placed on a circular orbit from their year
+    length and obliquity, with the mean longitude measured from J2000
+    :param planet: central body
+    :param days_since_j2000: epoch in days since J2000, scalar or (N,) array
+    :return: [x, y, z] or (N,3) array of positions in m
+    '''
+    days = np.asarray(days_since_j2000, dtype=np.float64)
+    if planet.name == "Earth":
+        L       = np.radians(280.460 + 0.9856474*days)
+        g       = np.radians(357.528 + 0.9856003*days)
+        lon     = L + np.radians(1.915*np.sin(g) + 0.020*np.sin(2*g))
+        eps     = np.radians(23.439 - 0.0000004*days)
+        dist    = AU*(1.00014 - 0.01671*np.cos(g) - 0.00014*np.cos(2*g))
+    else:
+        # The Sun is seen opposite the body's heliocentric longitude
+        period  = planet.year_length*86400
+        lon     = 2*np.pi*np.fmod(days*86400/period, 1) + np.pi
+        eps     = np.radians(planet.obliquity)
+        dist    = (SUN_MU*(period/(2*np.pi))**2)**(1/3)
+
+    return np.stack([dist*np.cos(lon), dist*np.cos(eps)*np.sin(lon), dist*np.sin(eps)*np.sin(lon)], axis=-1)
+
+def moon_position(planet, days_since_j2000):
+    '''
+    Position of the Moon relative to the Earth in the Earth's inertial frame, from
+    the low precision lunar series of Montenbruck and Gill, Satellite Orbits (3.47),
+    good to a few arcminutes and about 500 km in distance
+    :param planet: central body, must be the Earth
+    :param days_since_j2000: epoch in days since J2000, scalar or (N,) array
+    :return: [x, y, z] or (N,3) array of positions in m
+    '''
+    if planet.name != "Earth":
+        print(f"The Moon ephemeris is only available about the Earth, not {planet.name}")
+        exit()
+
+    T       = np.asarray(days_since_j2000, dtype=np.float64)/36525
+    L0      = np.radians(218.31617 + 481267.88088*T - 1.3972*T)
+    l       = np.radians(134.96292 + 477198.86753*T)
+    lp      = np.radians(357.52543 + 35999.04944*T)
+    F       = np.radians(93.27283 + 483202.01873*T)
+    D       = np.radians(297.85027 + 445267.11135*T)
+    arcsec  = np.pi/(180*3600)
+
+    lon     = L0 + arcsec*(22640*np.sin(l) + 769*np.sin(2*l) - 4586*np.sin(l - 2*D) + 2370*np.sin(2*D)
+                           - 668*np.sin(lp) - 412*np.sin(2*F) - 212*np.sin(2*l - 2*D) - 206*np.sin(l + lp - 2*D)
+                           + 192*np.sin(l + 2*D) - 165*np.sin(lp - 2*D) + 148*np.sin(l - lp) - 125*np.sin(D)
+                           - 110*np.sin(l + lp) - 55*np.sin(2*F - 2*D))
+    lat     = arcsec*(18520*np.sin(F + lon - L0 + arcsec*(412*np.sin(2*F) + 541*np.sin(lp)))
+                      - 526*np.sin(F - 2*D) + 44*np.sin(l + F - 2*D) - 31*np.sin(-l + F - 2*D)
+                      - 25*np.sin(-2*l + F) - 23*np.sin(lp + F - 2*D) + 21*np.sin(-l + F) + 11*np.sin(-lp + F - 2*D))
+    dist    = 1e3*(385000 - 20905*np.cos(l) - 3699*np.cos(2*D - l) - 2956*np.cos(2*D) - 570*np.cos(2*l)
+                   + 246*np.cos(2*l - 2*D) - 205*np.cos(lp - 2*D) - 171*np.cos(l + 2*D) - 152*np.cos(l + lp - 2*D))
+
+    # Ecliptic to equatorial
+    eps     = np.radians(23.43929111)
+    x       = dist*np.cos(lat)*np.cos(lon)
+    y       = dist*np.cos(lat)*np.sin(lon)
+    z       = dist*np.sin(lat)
+    return np.stack([x, np.cos(eps)*y - np.sin(eps)*z, np.sin(eps)*y + np.cos(eps)*z], axis=-1)
+
+POSITIONS       = {"Sun" : sun_position,
+                   "Moon": moon_position}
+
+# Days per fitted segment and degree of its Chebyshev series
+SEGMENTS        = {"Sun" : [32.0, 10],
+                   "Moon": [4.0, 12]}
+
+class ChebyshevEphemeris():
+    '''
+    Position of a body over a time span, fitted once into equal Chebyshev segments
+    so each evaluation is a short recurrence and one small matrix product instead of
+    the trigonometric series. Segments are aligned to whole multiples of their
+    length from J2000, and fits are cached to disk per span
+    '''
+    def __init__(self, name, planet, start, end, cache_dir=None):
+        '''
+        :param name: body, a key of POSITIONS
+        :param planet: central body the positions are relative to
+        :param start: start of the span in days since J2000
+        :param end: end of the span in days since J2000
+        :param cache_dir: directory of the cached fits, None to always fit
+        '''
+        if name not in POSITIONS.keys():
+            print(f"No ephemeris for {name}")
+            exit()
+
+        self.name           = name
+        self.segment, degree = SEGMENTS[name]
+        self.degree         = degree
+
+        # One extra segment past the end covers integrator stages beyond the last step
+        first               = int(np.floor(start/self.segment))
+        last                = int(np.floor(end/self.segment)) + 1
+        self.start          = first*self.segment
+        self.num_segments   = last - first + 1
+        self.days_per_sec   = 1/86400
+        self.inv_segment    = 1/self.segment
+
+        cache_file  = None
+        if cache_dir is not None:
+            cache_file = os.path.join(cache_dir, f"{planet.name}_{name}_v{MODEL_VERSION}_{self.segment:g}d_"
+                                                 f"deg{degree}_{first}_{last}.npy")
+        if cache_file is not None and os.path.exists(cache_file):
+            self.coefs  = np.load(cache_file, allow_pickle=False)
+        else:
+            self.coefs  = self.fit(POSITIONS[name], planet)
+            if cache_file is not None:
+                # Written under this process's own name and moved into place, so Monte
+                # Carlo workers fitting the same span never read a partial file
+                os.makedirs(cache_dir, exist_ok=True)
+                with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as tmp_file:
+                    np.save(tmp_file, self.coefs)
+                os.replace(tmp_file.name, cache_file)
+        self.coef_list  = [segment for segment in self.coefs]
+
+    def fit(self, position, planet):
+        '''
+        Interpolates the analytic position at the Chebyshev nodes of every segment
+        :return: (S, degree+1, 3) Chebyshev coefficients per segment
+        '''
+        degree  = self.degree
+        k       = np.arange(degree + 1)
+        nodes   = np.cos(np.pi*(k + 0.5)/(degree + 1))
+        T       = np.cos(np.outer(k, np.arccos(nodes)))
+        days    = self.start + (np.arange(self.num_segments)[:,None] + 0.5*(nodes[None,:] + 1))*self.segment
+        values  = position(planet, days.ravel()).reshape(self.num_segments, degree + 1, 3)
+
+        # Discrete orthogonality of T_k at the nodes
+        coefs           = 2/(degree + 1)*np.einsum('kj,sjc->skc', T, values)
+        coefs[:,0]     /= 2
+        return coefs
+
+    def position(self, days):
+        '''
+        :param days: epoch in days since J2000, within the fitted span
+        :return: position as a (3,) array
+        '''
+        s       = (days - self.start)*self.inv_segment
+        index   = min(max(int(s), 0), self.num_segments - 1)
+        tau     = 2*(s - index) - 1
+
+        # T_k(tau) by the three term recurrence
+        T       = [1.0, tau]
+        for _ in range(self.degree - 1):
+            T.append(2*tau*T[-1] - T[-2])
+        return np.dot(T, self.coef_list[index])
@@ -0,0 +1,264 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# Positions evaluated together, larger stacks are split into blocks of this size so
+# the recursion buffers stay small
+BLOCK = 256
+
+def read_coefficients(path, degree, order):
+    '''
+    Reads fully normalized gravity field coefficients. ICGEM .gfc files (the format
+    EGM96 and EGM2008 are distributed in) take the gravitational parameter and
+    reference radius from their header. Other files are read as lines of
+    n m C S [sigma_C sigma_S], and return None for both
+    :param path: coefficient file
+    :param degree: largest degree kept
+    :param order: largest order kept
+    :return: (degree+1, degree+1) arrays C and S, gravitational parameter and reference radius
+    '''
+    C       = np.zeros((degree+1, degree+1))
+    S       = np.zeros((degree+1, degree+1))
+    mu      = None
+    radius  = None
+    max_deg = -1
+    with open(path, 'r') as coef_file:
+        lines = coef_file.read().splitlines()
+
+    if any(line.startswith("end_of_head") for line in lines):
+        head    = lines.index(next(line for line in lines if line.startswith("end_of_head")))
+        for line in lines[:head]:
+            fields = line.split()
+            if len(fields) >= 2 and fields[0] == "earth_gravity_constant":
+                mu      = float(fields[1].replace('D', 'E'))
+            elif len(fields) >= 2 and fields[0] == "radius":
+                radius  = float(fields[1].replace('D', 'E'))
+        lines   = [line.split(None, 1)[1] for line in lines[head+1:] if line.startswith("gfc")]
+
+    for line in lines:
+        fields = line.replace('D', 'E').split()
+        if len(fields) < 4 or fields[0].startswith('#'):
+            continue
+        n, m    = int(fields[0]), int(fields[1])
+        max_deg = max(max_deg, n)
+        if n <= degree and m <= order:
+            C[n,m]  = float(fields[2])
+            S[n,m]  = float(fields[3])
+
+    if max_deg < degree:
+        print(f"{path} only holds coefficients up to degree {max_deg}")
+        exit()
+
+    # The field is given relative to the center of mass
+    C[0,0]  = 1
+    C[1,:]  = 0
+    S[1,:]  = 0
+    return C, S, mu, radius
+
+def log_norm(n, m):
+    '''
+    :return: logarithm of the normalization factor sqrt((2-d_0m)(2n+1)(n-m)!/(n+m)!)
+    '''
+    return 0.5*(math.log(2 - (m == 0)) + math.log(2*n + 1) + math.lgamma(n - m + 1) - math.lgamma(n + m + 1))
+
+class SphericalHarmonics():
+    '''
+    Degree and order N gravity field evaluated with the fully normalized Cunningham
+    functions V_nm + i W_nm = (R/r)^(n+1) P_nm(sin(lat)) e^(i m lon). The recursion
+    runs on U_nm = P_nm(sin(lat)) e^(i m lon), whose sectoral terms are powers of
+    (x + i y)/r and whose other rows follow from the two before it, one degree at a
+    time for all orders and positions at once. The (R/r)^(n+1) factors are applied
+    per degree in the acceleration sums. The recursion coefficients and the
+    normalization ratios of the sums are computed once, and the recursion runs in
+    buffers kept per block size, so an evaluation allocates no arrays
+    '''
+    def __init__(self, C, S, mu, radius, central_body, degree, order):
+        '''
+        :param C: fully normalized cosine coefficients, at least (degree+1, order+1)
+        :param S: fully normalized sine coefficients
+        :param mu: gravitational parameter of the field
+        :param radius: reference radius of the field
+        :param central_body: body the field rotates with
+        :param degree: largest degree
+        :param order: largest order, at most degree
+        '''
+        self.degree     = degree
+        self.order      = min(order, degree)
+        self.mu         = mu
+        self.radius     = radius
+        self.scale      = mu/radius**2
+
+        # Planet fixed frame, see attitude_ref.get_pci_to_pcpf
+        self.omega      = 2*math.pi/central_body.sidereal_day
+        self.rot_offset = math.radians(central_body.rot_offset)
+        self.gamma0     = self.rot_offset
+
+        # The acceleration of degree n uses V and W of degree n+1 and order m+1
+        num_n           = degree + 2
+        num_m           = self.order + 2
+        self.num_n      = num_n
+        self.num_m      = num_m
+
+        # U_nm = alpha z/r U_n-1,m - beta U_n-2,m
+        self.alpha      = np.zeros((num_n, num_m))
+        self.beta       = np.zeros((num_n, num_m))
+        for n in range(1, num_n):
+            for m in range(min(n, num_m)):
+                self.alpha[n,m] = math.sqrt((2*n + 1)*(2*n - 1)/((n - m)*(n + m)))
+                if m < n - 1:
+                    self.beta[n,m] = math.sqrt((2*n + 1)*(n + m - 1)*(n - m - 1)/((2*n - 3)*(n + m)*(n - m)))
+        self.alpha      = self.alpha[:,:,None,None]
+        self.beta       = self.beta[:,:,None,None]
+
+        # U_mm = prod(gamma_1..gamma_m) ((x + i y)/r)^m
+        gamma           = [1.0, math.sqrt(3)] + [math.sqrt((2*m + 1)/(2*m)) for m in range(2, num_m)]
+        self.sectoral   = np.cumprod(gamma[:num_m])[:,None]
+
+        # Acceleration sums of Montenbruck and Gill (3.33), with the normalized V and W
+        # of degree n+1 scaled back by the ratios of the normalization factors.
+        # Shift 1 reads order m+1, shift -1 order m-1 and shift 0 order m
+        C, S    = np.asarray(C, dtype=np.float64), np.asarray(S, dtype=np.float64)
+        plus    = np.zeros((3, degree+1, num_m, 2))
+        minus   = np.zeros((3, degree+1, num_m, 2))
+        same    = np.zeros((3, degree+1, num_m, 2))
+        for n in range(degree+1):
+            for m in range(min(n, self.order)+1):
+                c, s    = C[n,m], S[n,m]
+                k1      = (1 if m == 0 else 0.5)*math.exp(log_norm(n, m) - log_norm(n+1, m+1))
+                k3      = (n - m + 1)*math.exp(log_norm(n, m) - log_norm(n+1, m))
+                plus[0,n,m+1]   = [-c*k1, -s*k1]
+                plus[1,n,m+1]   = [s*k1, -c*k1]
+                same[2,n,m]     = [-c*k3, -s*k3]
+                if m > 0:
+                    k2 = 0.5*(n - m + 2)*(n - m + 1)*math.exp(log_norm(n, m) - log_norm(n+1, m-1))
+                    minus[0,n,m-1]  = [c*k2, s*k2]
+                    minus[1,n,m-1]  = [s*k2, -c*k2]
+
+        # All three read V and W of degree n+1, so they sum into one (N+1, 3, M*2) set of
+        # coefficients that multiplies the (N+1, M*2, K) block of U one degree at a time
+        coefs           = (plus + minus + same)*self.scale
+        self.coefs      = np.ascontiguousarray(coefs.transpose(1, 0, 2, 3).reshape(degree+1, 3, num_m*2))
+        self.buffers    = {}
+
+    def set_epoch(self, days_since_j2000):
+        '''
+        :param days_since_j2000: epoch t = 0 of the run, in days since J2000
+        '''
+        self.gamma0 = self.omega*days_since_j2000*86400 + self.rot_offset
+
+    def allocate(self, size):
+        U           = np.zeros((self.num_n, self.num_m, 2, size))
+        s           = U.strides
+        return {"U"         : U,
+                "diagonal"  : as_strided(U, shape=(self.num_m, 2, size), strides=(s[0] + s[1], s[2], s[3])),
+                "powers"    : np.empty((self.num_m, size), dtype=np.complex128),
+                "term_a"    : np.empty((self.num_m, 2, size)),
+                "term_b"    : np.empty((self.num_m, 2, size)),
+                "radial"    : np.empty((self.num_n - 1, size)),
+                "partial"   : np.empty((self.num_n - 1, 3, size)),
+                "fixed"     : np.empty((3, size)),
+                "accel"     : np.empty((3, size)),
+                "r"         : np.empty(size),
+                "sin_lat"   : np.empty(size),
+                "scratch"   : np.empty(size)}
+
+    def fixed_accelerations(self, pos, buffers):
+        '''
+        :param pos: (3,K) planet fixed positions
+        :param buffers: buffers allocated for K positions
+        :return: (3,K) planet fixed accelerations, held in the buffers
+        '''
+        U, diagonal, powers = buffers["U"], buffers["diagonal"], buffers["powers"]
+        term_a, term_b      = buffers["term_a"], buffers["term_b"]
+        radial, partial     = buffers["radial"], buffers["partial"]
+        r, sin_lat, accel   = buffers["r"], buffers["sin_lat"], buffers["accel"]
+        scratch             = buffers["scratch"]
+        num_n, num_m        = self.num_n, self.num_m
+
+        np.einsum('ik,ik->k', pos, pos, out=r)
+        np.sqrt(r, out=r)
+        np.divide(pos[2], r, out=sin_lat)
+
+        # Sectoral terms from the powers of (x + i y)/r, starting at U_00 = 1
+        powers.real[:]  = pos[0]
+        powers.imag[:]  = pos[1]
+        powers         /= r
+        powers[0]       = 1
+        np.cumprod(powers, axis=0, out=powers)
+        powers         *= self.sectoral
+        diagonal[:,0]   = powers.real
+        diagonal[:,1]   = powers.imag
+
+        # Every lower order of degree n from degrees n-1 and n-2
+        alpha, beta     = self.alpha, self.beta
+        np.multiply(alpha[1,0], U[0,0], out=U[1,0])
+        U[1,0]         *= sin_lat
+        for n in range(2, num_n):
+            m   = min(n, num_m)
+            a   = term_a[:m]
+            b   = term_b[:m]
+            np.multiply(alpha[n,:m], U[n-1,:m], out=a)
+            a  *= sin_lat
+            np.multiply(beta[n,:m], U[n-2,:m], out=b)
+            np.subtract(a, b, out=U[n,:m])
+
+        # Sum over the orders of each degree, then scale degree n by (R/r)^(n+2)
+        np.matmul(self.coefs, U[1:].reshape(num_n - 1, num_m*2, -1), out=partial)
+        np.divide(self.radius, r, out=scratch)
+        radial[:]       = scratch
+        np.cumprod(radial, axis=0, out=radial)
+        radial         *= scratch
+        partial        *= radial[:,None,:]
+        np.sum(partial, axis=0, out=accel)
+        return accel
+
+    def __call__(self, t, pos, out):
+        '''
+        Gravitational acceleration of a stack of inertial positions
+        :param t: time since the epoch set with set_epoch
+        :param pos: (K,3) inertial positions
+        :param out: (K,3) output buffer, may be a strided view
+        '''
+        gamma   = self.gamma0 + self.omega*t
+        c, s    = math.cos(gamma), math.sin(gamma)
+        for start in range(0, len(pos), BLOCK):
+            block   = slice(start, min(start + BLOCK, len(pos)))
+            size    = block.stop - block.start
+            if size not in self.buffers.keys():
+                self.buffers[size] = self.allocate(size)
+            buffers = self.buffers[size]
+            fixed   = buffers["fixed"]
+            p       = pos[block]
+
+            scratch = buffers["scratch"]
+
+            # Into the planet fixed frame and back
+            np.multiply(p[:,0], c, out=fixed[0])
+            np.multiply(p[:,1], s, out=scratch)
+            fixed[0]   += scratch
+            np.multiply(p[:,1], c, out=fixed[1])
+            np.multiply(p[:,0], s, out=scratch)
+            fixed[1]   -= scratch
+            fixed[2]    = p[:,2]
+            accel       = self.fixed_accelerations(fixed, buffers)
+            np.multiply(accel[0], c, out=out[block,0])
+            np.multiply(accel[1], s, out=scratch)
+            out[block,0] -= scratch
+            np.multiply(accel[0], s, out=out[block,1])
+            np.multiply(accel[1], c, out=scratch)
+            out[block,1] += scratch
+            out[block,2] = accel[2]
+
+def load(path, degree, order, central_body):
+    '''
+    Builds the gravity field of a central body from a coefficient file
+    :param path: coefficient file, see read_coefficients
+    :param degree: largest degree
+    :param order: largest order
+    :param central_body: central body, its mu and radius are used when the file does not give them
+    :return: spherical harmonic gravity field
+    '''
+    C, S, mu, radius = read_coefficients(path, degree, order)
+    mu      = central_body.mu if mu is None else mu
+    radius  = central_body.radius if radius is None else radius
+    return SphericalHarmonics(C, S, mu, radius, central_body, degree, order)
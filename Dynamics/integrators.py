@@ -0,0 +1,258 @@
+import numpy as np
+
+# Fehlberg 7(8) coefficients
+RK78_C = np.array([0, 2/27, 1/9, 1/6, 5/12, 1/2, 5/6, 1/6, 2/3, 1/3, 1, 0, 1])
+RK78_A = [[],
+          [2/27],
+          [1/36, 1/12],
+          [1/24, 0, 1/8],
+          [5/12, 0, -25/16, 25/16],
+          [1/20, 0, 0, 1/4, 1/5],
+          [-25/108, 0, 0, 125/108, -65/27, 125/54],
+          [31/300, 0, 0, 0, 61/225, -2/9, 13/900],
+          [2, 0, 0, -53/6, 704/45, -107/9, 67/90, 3],
+          [-91/108, 0, 0, 23/108, -976/135, 311/54, -19/60, 17/6, -1/12],
+          [2383/4100, 0, 0, -341/164, 4496/1025, -301/82, 2133/4100, 45/82, 45/164, 18/41],
+          [3/205, 0, 0, 0, 0, -6/41, -3/205, -3/41, 3/41, 6/41, 0],
+          [-1777/4100, 0, 0, -341/164, 4496/1025, -289/82, 2193/4100, 51/82, 33/164, 12/41, 0, 1]]
+RK78_B = np.array([0, 0, 0, 0, 0, 34/105, 9/35, 9/35, 9/280, 9/280, 0, 41/840, 41/840])
+RK78_E = np.array([41/840, 0, 0, 0, 0, 0, 0, 0, 0, 0, 41/840, -41/840, -41/840])
+RK78_B_IDX = np.nonzero(RK78_B)[0]
+RK78_E_IDX = np.nonzero(RK78_E)[0]
+
+class Integrator():
+    '''
+    Base class for the fixed-buffer integrators. The right hand side is called as
+    fun(t, y, out, *args) and must write dy/dt into out
+    '''
+    num_stages = 1
+
+    def __init__(self, max_step):
+        self.max_step   = max_step
+        self.size       = 0
+        self.buffers    = {}
+
+    def allocate(self, size):
+        return {"y"     : np.empty(size),
+                "y_tmp" : np.empty(size),
+                "k"     : np.empty((self.num_stages, size))}
+
+    def resize(self, size):
+        # Buffers are kept per state size, so kernels of different sizes can share
+        # one integrator without reallocating on every call
+        if size == self.size:
+            return
+        if size not in self.buffers.keys():
+            self.buffers[size] = self.allocate(size)
+        self.__dict__.update(self.buffers[size])
+        self.size   = size
+
+    def integrate(self, fun, t0, t1, y0, args=()):
+        '''
+        Integrates from t0 to t1 in equal steps no larger than max_step
+        :param fun: in-place right hand side fun(t, y, out, *args)
+        :param t0: start time
+        :param t1: end time
+        :param y0: state at t0
+        :param args: extra arguments passed to fun
+        :return: state at t1, held in the integrator's buffer
+        '''
+        self.resize(len(y0))
+        num_steps   = max(1, int(np.ceil((t1 - t0)/self.max_step - 1e-9)))
+        h           = (t1 - t0)/num_steps
+        self.y[:]   = y0
+        for i in range(num_steps):
+            self.step(fun, t0 + i*h, h, args)
+        return self.y
+
+class RK4(Integrator):
+    '''
+    Classic fixed-step fourth order Runge-Kutta
+    '''
+    num_stages = 4
+
+    def step(self, fun, t, h, args):
+        y, y_tmp, k = self.y, self.y_tmp, self.k
+
+        fun(t, y, k[0], *args)
+        np.multiply(k[0], h/2, out=y_tmp)
+        np.add(y, y_tmp, out=y_tmp)
+        fun(t + h/2, y_tmp, k[1], *args)
+        np.multiply(k[1], h/2, out=y_tmp)
+        np.add(y, y_tmp, out=y_tmp)
+        fun(t + h/2, y_tmp, k[2], *args)
+        np.multiply(k[2], h, out=y_tmp)
+        np.add(y, y_tmp, out=y_tmp)
+        fun(t + h, y_tmp, k[3], *args)
+
+        # y += h/6*(k1 + 2*k2 + 2*k3 + k4)
+        np.add(k[1], k[2], out=y_tmp)
+        y_tmp *= 2
+        y_tmp += k[0]
+        y_tmp += k[3]
+        y_tmp *= h/6
+        y += y_tmp
+
+class RK78(Integrator):
+    '''
+    Runge-Kutta-Fehlberg 7(8) with embedded error control. The eighth order
+    solution is propagated and the step size carries over between calls
+    '''
+    num_stages = 13
+
+    def __init__(self, max_step, rtol=1e-10, atol=1e-6, min_step=None):
+        super().__init__(max_step)
+        self.rtol       = rtol
+        self.atol       = atol
+        self.min_step   = min_step if min_step is not None else 1e-8*max_step
+        self.h          = max_step
+
+    def allocate(self, size):
+        buffers             = super().allocate(size)
+        buffers["err"]      = np.empty(size)
+        buffers["scale"]    = np.empty(size)
+        return buffers
+
+    def integrate(self, fun, t0, t1, y0, args=()):
+        self.resize(len(y0))
+        self.y[:]   = y0
+        t           = t0
+        while t1 - t > 1e-12*max(1, abs(t1)):
+            h       = min(self.h, self.max_step, t1 - t)
+            error   = self.attempt(fun, t, h, args)
+            if not np.isfinite(error):
+                # NaN or inf from the dynamics, retry with the smallest allowed reduction
+                factor  = 0.1
+            elif error <= 1:
+                # Accept the step, the eighth order solution is in y_tmp
+                self.y[:]   = self.y_tmp
+                t           = t + h
+                factor      = 0.9*error**(-1/8) if error > 0 else 4
+            else:
+                factor  = 0.9*error**(-1/8)
+            self.h  = h*min(4, max(0.1, factor))
+
+            if factor < 1 and self.h < self.min_step and t1 - t > self.min_step:
+                raise RuntimeError(f"RK78 step size fell below {self.min_step:g} s at t = {t:g} s "
+                                   f"with error estimate {error:g}")
+        return self.y
+
+    def attempt(self, fun, t, h, args):
+        y, y_tmp, k, err = self.y, self.y_tmp, self.k, self.err
+
+        fun(t, y, k[0], *args)
+        for i in range(1, self.num_stages):
+            y_tmp[:] = y
+            for j, a_ij in enumerate(RK78_A[i]):
+                if a_ij != 0:
+                    np.multiply(k[j], h*a_ij, out=err)
+                    y_tmp += err
+            fun(t + RK78_C[i]*h, y_tmp, k[i], *args)
+
+        # Eighth order solution
+        y_tmp[:] = y
+        for i in RK78_B_IDX:
+            np.multiply(k[i], h*RK78_B[i], out=err)
+            y_tmp += err
+
+        # Embedded error estimate scaled by the tolerances
+        err.fill(0)
+        for i in RK78_E_IDX:
+            np.multiply(k[i], h*RK78_E[i], out=self.scale)
+            err += self.scale
+        np.abs(y, out=self.scale)
+        self.scale *= self.rtol
+        self.scale += self.atol
+        err /= self.scale
+        return np.max(np.abs(err, out=err))
+
+class Symplectic(Integrator):
+    '''
+    Kick-drift-kick (velocity Verlet) splitting of the stacked 13-element satellite
+    states. Position and quaternion are drifted, velocity and angular velocity are
+    kicked, which is symplectic for the translational motion. For kernels whose
+    kicked rates do not depend on the kicked coordinates (no velocity_dependent
+    flag set) the rates of the closing kick are reused by the opening kick of the
+    next step (first same as last), so a step costs two evaluations of the right
+    hand side instead of three
+    '''
+    num_stages = 1
+
+    # Drifted and kicked coordinates for each kernel state size
+    LAYOUTS = {13   : ([slice(0, 3), slice(6, 10)], [slice(3, 6), slice(10, 13)]),
+               7    : ([slice(0, 4)], [slice(4, 7)]),
+               6    : ([slice(0, 3)], [slice(3, 6)])}
+
+    def __init__(self, max_step):
+        super().__init__(max_step)
+        self.fsal_t = None
+
+    def allocate(self, size):
+        buffers         = super().allocate(size)
+        buffers["fsal"] = np.empty(size)
+        return buffers
+
+    def integrate(self, fun, t0, t1, y0, args=()):
+        # Rates cached by an earlier call were evaluated with other inputs
+        self.fsal_t = None
+        return super().integrate(fun, t0, t1, y0, args)
+
+    def step(self, fun, t, h, args):
+        y, y_tmp, f = self.y, self.y_tmp, self.k[0]
+        state_size  = getattr(fun, "state_size", 13)
+        drift, kick = self.LAYOUTS[state_size]
+        states      = y.reshape(-1, state_size)
+        rates       = f.reshape(-1, state_size)
+        scaled      = y_tmp.reshape(-1, state_size)
+        fsal        = self.fsal.reshape(-1, state_size)
+
+        # Half kick of the velocities. When the closing kick of the previous step was
+        # evaluated at this time and these positions its rates are still in f
+        if not self.reuse_rates(fun, t, states, fsal, drift):
+            fun(t, y, f, *args)
+        self.advance(states, rates, scaled, h/2, kick)
+
+        # Full drift of the positions with the half-step velocities
+        fun(t + h/2, y, f, *args)
+        self.advance(states, rates, scaled, h, drift)
+
+        # Half kick of the velocities at the new positions
+        fun(t + h, y, f, *args)
+        self.fsal_t     = t + h
+        self.fsal[:]    = y
+        self.advance(states, rates, scaled, h/2, kick)
+
+    def reuse_rates(self, fun, t, states, fsal, drift):
+        if getattr(fun, "velocity_dependent", True):
+            return False
+        if self.fsal_t is None or abs(self.fsal_t - t) > 1e-12*max(1, abs(t)):
+            return False
+        return all(np.array_equal(states[:,coords], fsal[:,coords]) for coords in drift)
+
+    def advance(self, states, rates, scaled, h, coord_slices):
+        for coords in coord_slices:
+            np.multiply(rates[:,coords], h, out=scaled[:,coords])
+            states[:,coords] += scaled[:,coords]
+
+def create(method, max_step, rtol=1e-10, atol=1e-6, min_step=None):
+    '''
+    Creates the integrator selected in the sim config
+    :param method: "RK45" for scipy's solve_ivp, or "RK4", "RK78" or "symplectic"
+    :param max_step: largest internal step in seconds
+    :param rtol: relative tolerance of the RK78 step control
+    :param atol: absolute tolerance of the RK78 step control
+    :param min_step: smallest RK78 step in seconds before it gives up, None for 1e-8*max_step
+    :return: integrator instance, or None to integrate with solve_ivp
+    '''
+    method = method.casefold()
+    if method == "rk45":
+        return None
+    elif method == "rk4":
+        return RK4(max_step)
+    elif method == "rk78":
+        return RK78(max_step, rtol, atol, min_step)
+    elif method == "symplectic":
+        return Symplectic(max_step)
+    else:
+        print(f"Unknown integrator {method}")
+        exit()
@@ -0,0 +1,222 @@
+import numpy as np
+
+# Satellite-time pairs solved per block by KeplerPropagator
+BLOCK_SIZE  = 2**14
+
+# Number of time steps solved ahead by KeplerPropagator.states_at
+CHUNK_STEPS = 1024
+
+def stumpff(z):
+    '''
+    Stumpff functions C(z) and S(z) of the universal-variable formulation
+    :param z: array of alpha*chi^2 values
+    :return: C(z), S(z)
+    '''
+    ell     = z > 1e-3
+    if np.all(ell):
+        # Closed orbits away from chi = 0 skip the masked evaluation
+        sqrt_z  = np.sqrt(z)
+        return (1 - np.cos(sqrt_z))/z, (sqrt_z - np.sin(sqrt_z))/(z*sqrt_z)
+
+    C       = np.empty_like(z)
+    S       = np.empty_like(z)
+    hyp     = z < -1e-3
+    small   = ~(ell | hyp)
+
+    sqrt_z      = np.sqrt(z[ell])
+    C[ell]      = (1 - np.cos(sqrt_z))/z[ell]
+    S[ell]      = (sqrt_z - np.sin(sqrt_z))/sqrt_z**3
+
+    sqrt_z      = np.sqrt(-z[hyp])
+    C[hyp]      = (np.cosh(sqrt_z) - 1)/(-z[hyp])
+    S[hyp]      = (np.sinh(sqrt_z) - sqrt_z)/sqrt_z**3
+
+    # Series near z = 0, where the closed forms cancel
+    z_s         = z[small]
+    C[small]    = 1/2 - z_s/24 + z_s**2/720
+    S[small]    = 1/6 - z_s/120 + z_s**2/5040
+    return C, S
+
+def secular_rates(r0, v0, central_body):
+    '''
+    Secular J2 drift of the right ascension of the ascending node and the argument
+    of perigee
+    :param r0: (N,3) positions
+    :param v0: (N,3) velocities
+    :param central_body: central body
+    :return: (N,) RAAN rates and (N,) argument of perigee rates in rad/s, zero for unbound orbits
+    '''
+    mu      = central_body.mu
+    h       = np.cross(r0, v0)
+    h_mag   = np.linalg.norm(h, axis=-1)
+    alpha   = 2/np.linalg.norm(r0, axis=-1) - np.einsum('ij,ij->i', v0, v0)/mu
+    bound   = alpha > 0
+
+    a       = np.where(bound, 1/np.where(bound, alpha, 1), np.inf)
+    n       = np.sqrt(mu/a**3)
+    p       = h_mag**2/mu
+    cos_i   = h[:,2]/h_mag
+    factor  = n*central_body.J2*(central_body.radius/p)**2
+
+    raan_dot = np.where(bound, -1.5*factor*cos_i, 0)
+    argp_dot = np.where(bound, 0.75*factor*(5*cos_i**2 - 1), 0)
+    return raan_dot, argp_dot
+
+def rotate_about(vec, axis, angle):
+    '''
+    Rodrigues rotation of vectors about per-row unit axes
+    :param vec: (N,M,3) vectors
+    :param axis: (N,3) or (3,) unit rotation axes
+    :param angle: (N,M) rotation angles in rad
+    :return: (N,M,3) rotated vectors
+    '''
+    axis    = np.broadcast_to(axis, vec.shape[:1] + (3,))[:,None,:]
+    cos_a   = np.cos(angle)[...,None]
+    sin_a   = np.sin(angle)[...,None]
+    k_dot_v = np.sum(axis*vec, axis=-1, keepdims=True)
+    return vec*cos_a + np.cross(axis, vec)*sin_a + axis*k_dot_v*(1 - cos_a)
+
+def propagate(r0, v0, dt, mu, tol=1e-12, max_iter=50, out=None):
+    '''
+    Two-body propagation with the universal-variable Kepler equation, solved with
+    Newton iterations over every satellite and output time at once
+    :param r0: (N,3) positions at the epoch
+    :param v0: (N,3) velocities at the epoch
+    :param dt: (M,) or (N,M) times since the epoch
+    :param mu: gravitational parameter of the central body
+    :param tol: convergence tolerance on the universal anomaly
+    :param max_iter: maximum number of Newton iterations
+    :param out: optional (N,M,6) array the states are written into
+    :return: (N,M,6) translational states
+    '''
+    r0          = np.atleast_2d(np.asarray(r0, dtype=np.float64))
+    v0          = np.atleast_2d(np.asarray(v0, dtype=np.float64))
+    dt          = np.broadcast_to(np.asarray(dt, dtype=np.float64), (len(r0), np.shape(dt)[-1])).copy()
+    sqrt_mu     = np.sqrt(mu)
+    if out is None:
+        out     = np.empty(dt.shape + (6,))
+
+    r0_mag      = np.linalg.norm(r0, axis=1)[:,None]
+    vr0         = np.einsum('ij,ij->i', r0, v0)[:,None]/r0_mag
+    alpha       = 2/r0_mag - np.einsum('ij,ij->i', v0, v0)[:,None]/mu
+    sigma0      = r0_mag*vr0/sqrt_mu
+    one_minus   = 1 - alpha*r0_mag
+
+    # Whole revolutions of closed orbits are removed so chi stays small
+    bound       = np.broadcast_to(alpha > 1e-12, dt.shape)
+    if np.any(bound):
+        period      = 2*np.pi/np.sqrt(mu*np.abs(alpha)**3)
+        dt[bound]   = np.fmod(dt, period)[bound]
+
+    # Starting guesses from Vallado, Algorithm 8
+    chi         = sqrt_mu*dt/r0_mag
+    chi[bound]  = (sqrt_mu*dt*alpha)[bound]
+    unbound     = np.broadcast_to(alpha < -1e-12, dt.shape)
+    if np.any(unbound):
+        a           = 1/np.where(alpha < -1e-12, alpha, -1)
+        sign_dt     = np.where(dt < 0, -1, 1)
+        arg         = -2*mu*alpha*dt/(r0_mag*vr0 + sign_dt*np.sqrt(-mu*a)*(1 - r0_mag*alpha))
+        chi_hyp     = sign_dt*np.sqrt(-a)*np.log(np.where(arg > 0, arg, 1))
+        chi[unbound & (dt != 0)] = chi_hyp[unbound & (dt != 0)]
+
+    sqrt_mu_dt  = sqrt_mu*dt
+    for _ in range(max_iter):
+        chi2    = chi*chi
+        z       = alpha*chi2
+        C, S    = stumpff(z)
+        F       = chi*(sigma0*chi*C + one_minus*chi2*S + r0_mag) - sqrt_mu_dt
+        dF      = sigma0*chi*(1 - z*S) + one_minus*chi2*C + r0_mag
+        delta   = F/dF
+        chi    -= delta
+        if np.all(np.abs(delta) <= tol*(1 + np.abs(chi))):
+            break
+
+    chi2    = chi*chi
+    z       = alpha*chi2
+    C, S    = stumpff(z)
+
+    # Lagrange coefficients, dF/dchi is the radius at the solution
+    r_mag   = sigma0*chi*(1 - z*S) + one_minus*chi2*C + r0_mag
+    f       = 1 - chi2/r0_mag*C
+    g       = dt - chi2*chi/sqrt_mu*S
+    f_dot   = sqrt_mu/(r_mag*r0_mag)*(z*S - 1)*chi
+    g_dot   = 1 - chi2/r_mag*C
+    for k in range(3):
+        np.multiply(f, r0[:,k:k+1], out=out[...,k])
+        out[...,k]     += g*v0[:,k:k+1]
+        np.multiply(f_dot, r0[:,k:k+1], out=out[...,k+3])
+        out[...,k+3]   += g_dot*v0[:,k:k+1]
+    return out
+
+class KeplerPropagator():
+    '''
+    Analytic translational propagation of a set of satellites from a common epoch,
+    optionally with the secular J2 drift of the node and perigee applied as rotations
+    of the two-body solution. The epoch state is used as mean elements, so the
+    short-period J2 terms are not modelled
+    '''
+    def __init__(self, states, central_body, j2_secular=False):
+        '''
+        :param states: (N,6) translational states at the epoch
+        :param central_body: central body
+        :param j2_secular: bool or (N,) bools, apply the J2 secular drift
+        '''
+        states          = np.atleast_2d(np.asarray(states, dtype=np.float64))
+        self.r0         = states[:,0:3].copy()
+        self.v0         = states[:,3:6].copy()
+        self.mu         = central_body.mu
+
+        raan_dot, argp_dot  = secular_rates(self.r0, self.v0, central_body)
+        j2_secular          = np.broadcast_to(j2_secular, len(states))
+        self.raan_dot       = np.where(j2_secular, raan_dot, 0)
+        self.argp_dot       = np.where(j2_secular, argp_dot, 0)
+        h                   = np.cross(self.r0, self.v0)
+        self.h_hat          = h/np.linalg.norm(h, axis=1)[:,None]
+        self.cache          = None
+        self.cache_first    = 0
+
+    def states_at(self, t, dt):
+        '''
+        States on a fixed time grid, solved CHUNK_STEPS steps at a time. Chunks are
+        aligned to the grid from the epoch, so a resumed run solves the same chunks
+        :param t: time since the epoch
+        :param dt: step of the time grid
+        :return: (N,6) translational states at t
+        '''
+        step    = int(round(t/dt))
+        first   = step - step % CHUNK_STEPS
+        if self.cache is None or self.cache_first != first:
+            self.cache_first    = first
+            self.cache          = self.propagate(dt*(first + np.arange(CHUNK_STEPS)))
+        return self.cache[:,step - first]
+
+    def propagate(self, times):
+        '''
+        :param times: (M,) times since the epoch
+        :return: (N,M,6) translational states
+        '''
+        times       = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        states      = np.empty((len(self.r0), len(times), 6))
+
+        # Solve in blocks of satellites so the temporaries stay small and each block
+        # writes a contiguous slab of the output
+        block       = max(1, BLOCK_SIZE//len(times))
+        for start in range(0, len(self.r0), block):
+            stop = min(start + block, len(self.r0))
+            propagate(self.r0[start:stop], self.v0[start:stop], times, self.mu, out=states[start:stop])
+
+        if np.any(self.raan_dot) or np.any(self.argp_dot):
+            # Perigee drift turns the orbit within its plane, node drift turns the plane about z
+            d_argp  = self.argp_dot[:,None]*times
+            d_raan  = self.raan_dot[:,None]*times
+            z_axis  = np.array([0.0, 0.0, 1.0])
+            for coords in [slice(0, 3), slice(3, 6)]:
+                states[...,coords] = rotate_about(rotate_about(states[...,coords], self.h_hat, d_argp),
+                                                  z_axis, d_raan)
+
+            # The rotating frame adds omega x r to the velocity, with the perigee drift
+            # about the orbit normal as it has been carried round by the node drift
+            h_hat   = rotate_about(np.broadcast_to(self.h_hat[:,None,:], states.shape[:2] + (3,)), z_axis, d_raan)
+            omega   = self.raan_dot[:,None,None]*z_axis + self.argp_dot[:,None,None]*h_hat
+            states[...,3:6] += np.cross(omega, states[...,0:3])
+        return states
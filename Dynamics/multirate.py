@@ -0,0 +1,146 @@
+import numpy as np
+
+import Dynamics.integrators as integrators
+import Dynamics.propagation as prop
+
+def hermite(t0, y0, a0, t1, y1, a1, t):
+    '''
+    Quintic Hermite interpolation of translational states from the positions,
+    velocities and accelerations at both ends of an interval
+    :param t0: start of the interval
+    :param y0: (N,6) states at t0
+    :param a0: (N,3) accelerations at t0
+    :param t1: end of the interval
+    :param y1: (N,6) states at t1
+    :param a1: (N,3) accelerations at t1
+    :param t: time within the interval
+    :return: (N,6) interpolated states
+    '''
+    h   = t1 - t0
+    s   = (t - t0)/h
+    s2  = s*s
+    s3  = s2*s
+    s4  = s3*s
+    s5  = s4*s
+
+    # Basis functions and their derivatives with respect to s
+    H   = [1 - 10*s3 + 15*s4 - 6*s5, s - 6*s3 + 8*s4 - 3*s5, 0.5*s2 - 1.5*s3 + 1.5*s4 - 0.5*s5,
+           0.5*s3 - s4 + 0.5*s5, -4*s3 + 7*s4 - 3*s5, 10*s3 - 15*s4 + 6*s5]
+    dH  = [-30*s2 + 60*s3 - 30*s4, 1 - 18*s2 + 32*s3 - 15*s4, s - 4.5*s2 + 6*s3 - 2.5*s4,
+           1.5*s2 - 4*s3 + 2.5*s4, -12*s2 + 28*s3 - 15*s4, 30*s2 - 60*s3 + 30*s4]
+
+    terms   = [y0[:,0:3], h*y0[:,3:6], h*h*a0, h*h*a1, h*y1[:,3:6], y1[:,0:3]]
+    state   = np.empty_like(y0)
+    state[:,0:3] = sum(H_i*term for H_i, term in zip(H, terms))
+    state[:,3:6] = sum(dH_i*term for dH_i, term in zip(dH, terms))/h
+    return state
+
+class MultiRate():
+    '''
+    Multi-rate propagation of the satellite states. The translational states of
+    all satellites are integrated together in steps of orbit_step, and read at
+    each control step from a quintic Hermite interpolant of the step. The attitudes
+    are sub-stepped at attitude_step within every control step.
+    Thrust is rotated with the attitude at the start of each orbit step and held
+    across it, the controller sees the interpolated orbit at every control step
+    '''
+    def __init__(self, orbit_step, attitude_step, orbit_method="RK4"):
+        self.orbit_step             = orbit_step
+        self.attitude_step          = attitude_step
+        self.orbit_integrator       = integrators.create(orbit_method, orbit_step)
+        self.attitude_integrator    = integrators.RK4(attitude_step)
+        if self.orbit_integrator is None:
+            print("The multi-rate orbit integrator must be RK4, RK78 or symplectic")
+            exit()
+        self.t_start                = None
+        self.t_end                  = None
+
+    def setup(self, satellites, central_body):
+        self.kernel      = prop.OrbitDot(central_body, [sat.ballistic for sat in satellites])
+        self.att_kernel  = prop.AttitudeDotBatch([sat.J for sat in satellites])
+        self.att_kernels = [sat.attitude_dynamics for sat in satellites]
+        self.inv_mass    = 1/np.array([sat.mass for sat in satellites], dtype=np.float64)
+        self.t_start     = None
+        self.t_end       = None
+
+    def get_segment(self):
+        '''
+        Orbit step in progress, written to checkpoints so a resumed run continues it
+        instead of starting a new step at the checkpoint time
+        :return: dictionary of plain lists, without the step before the first one
+        '''
+        segment = {"orbit_h": float(getattr(self.orbit_integrator, "h", 0))}
+        if self.t_end is None:
+            return segment
+        segment.update({"t_start"   : float(self.t_start),
+                        "t_end"     : float(self.t_end),
+                        "y_start"   : self.y_start.tolist(),
+                        "y_end"     : self.y_end.tolist(),
+                        "a_start"   : self.a_start.tolist(),
+                        "a_end"     : self.a_end.tolist(),
+                        "thrust"    : self.thrust.tolist()})
+        return segment
+
+    def set_segment(self, segment):
+        '''
+        Restores an orbit step read back from a checkpoint, see get_segment
+        '''
+        if segment["orbit_h"] and hasattr(self.orbit_integrator, "h"):
+            self.orbit_integrator.h = segment["orbit_h"]
+        if "t_end" not in segment.keys():
+            return
+        self.t_start    = segment["t_start"]
+        self.t_end      = segment["t_end"]
+        self.y_start    = np.array(segment["y_start"], dtype=np.float64)
+        self.y_end      = np.array(segment["y_end"], dtype=np.float64)
+        self.a_start    = np.array(segment["a_start"], dtype=np.float64)
+        self.a_end      = np.array(segment["a_end"], dtype=np.float64)
+        self.thrust     = np.array(segment["thrust"], dtype=np.float64)
+
+    def accelerations(self, t, states, accels):
+        y_dot = np.empty(states.size)
+        self.kernel(t, states.ravel(), y_dot, accels)
+        return y_dot.reshape(-1, 6)[:,3:6]
+
+    def orbit_states(self, t_now, t_next, states, T_bodies):
+        '''
+        Translational states at the end of a control step, starting a new orbit step
+        when t_next lies past the current one
+        :param t_now: start of the control step
+        :param t_next: end of the control step
+        :param states: (N,13) satellite states at t_now
+        :param T_bodies: (N,3) body frame thrust commands
+        :return: (N,6) translational states at t_next
+        '''
+        if self.t_end is None or t_next > self.t_end + 1e-9*self.orbit_step:
+            # Thrust is rotated with the attitude at the start of the orbit step
+            self.thrust     = prop.rotate_batch(states[:,6:10], T_bodies)*self.inv_mass[:,None]
+            self.t_start    = t_now
+            self.t_end      = t_now + max(self.orbit_step, t_next - t_now)
+            self.y_start    = np.array(states[:,0:6])
+            y_end           = self.orbit_integrator.integrate(self.kernel, self.t_start, self.t_end,
+                                                              self.y_start.ravel(), (self.thrust,))
+            self.y_end      = y_end.reshape(-1, 6).copy()
+            self.a_start    = self.accelerations(self.t_start, self.y_start, self.thrust)
+            self.a_end      = self.accelerations(self.t_end, self.y_end, self.thrust)
+
+        return hermite(self.t_start, self.y_start, self.a_start, self.t_end, self.y_end, self.a_end, t_next)
+
+    def attitudes(self, t_now, t_next, states, L_bodies, batch=False):
+        '''
+        Sub-steps the rotational states across a control step
+        :param t_now: start of the control step
+        :param t_next: end of the control step
+        :param states: (N,13) satellite states at t_now
+        :param L_bodies: (N,3) body frame torque commands
+        :param batch: integrate the attitudes as one stacked system instead of one satellite at a time
+        :return: (N,7) [q, omega] states at t_next
+        '''
+        rot_states = np.ascontiguousarray(states[:,6:13])
+        if batch:
+            return self.attitude_integrator.integrate(self.att_kernel, t_now, t_next, rot_states.ravel(),
+                                                      (L_bodies,)).reshape(-1, 7)
+
+        for rot_state, kernel, L_body in zip(rot_states, self.att_kernels, L_bodies):
+            rot_state[:] = self.attitude_integrator.integrate(kernel, t_now, t_next, rot_state, (L_body,))
+        return rot_states
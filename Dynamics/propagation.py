@@ -1,3 +1,4 @@
+import math
 import numpy as np
 import quaternion
 
@@ -46,4 +47,524 @@ def state_dot(t, state, mass, J, T_body, L_body, central_body):
     alpha   = np.linalg.inv(J) @ (L_body - np.cross(omega,  J @ omega))
 
     x_dot   = np.hstack((p_dot, v_dot, q_dot.w, q_dot.x, q_dot.y, q_dot.z, alpha))
-    return x_dot
\ No newline at end of file
+    return x_dot
+
+def gravity_batch(r, mu):
+    '''
+    Calculates the gravitational acceleration at a stack of points
+    :param r: (N,3) array of position vectors
+    :param mu: gravitational parameter of the central body
+    :return: (N,3) array of gravitational acceleration vectors
+    '''
+    r_mag = np.linalg.norm(r, axis=1)
+    return -mu*r/(r_mag**3)[:,None]
+
+def J2_perturbation_batch(r, mu, R, J2):
+    '''
+    Calculates the J2 perturbation acceleration at a stack of points
+    :param r: (N,3) array of position vectors
+    :param mu: gravitational parameter of the central body
+    :param R: radius of the central body
+    :param J2: J2 coefficient of the central body
+    :return: (N,3) array of J2 perturbation acceleration vectors
+    '''
+    r_mag   = np.linalg.norm(r, axis=1)
+    z_ratio = (r[:,2]/r_mag)**2
+    scale   = -3/2 * J2 * mu / (r_mag**2) * (R/r_mag)**2 / r_mag
+    J2_pert = np.empty_like(r)
+    J2_pert[:,0] = scale * (1 - 5*z_ratio)*r[:,0]
+    J2_pert[:,1] = scale * (1 - 5*z_ratio)*r[:,1]
+    J2_pert[:,2] = scale * (3 - 5*z_ratio)*r[:,2]
+    return J2_pert
+
+def drag_batch(r, v, ballistics, atmosphere):
+    '''
+    Calculates the drag acceleration of a stack of vehicles in an atmosphere that
+    co-rotates with the central body
+    :param r: (N,3) array of position vectors
+    :param v: (N,3) array of inertial velocity vectors
+    :param ballistics: (N,) array of ballistic coefficients Cd*A/m
+    :param atmosphere: atmosphere of the central body
+    :return: (N,3) array of drag acceleration vectors
+    '''
+    r_mag   = np.linalg.norm(r, axis=1)
+    alt     = r_mag - atmosphere.radius*(1 - atmosphere.flattening*(r[:,2]/r_mag)**2)
+    rho     = atmosphere.table.density_batch(alt, np.empty(len(r)), np.empty(len(r), dtype=np.intp),
+                                             np.empty(len(r)))
+    v_rel   = np.array(v, dtype=np.float64)
+    v_rel[:,0] += atmosphere.omega*r[:,1]
+    v_rel[:,1] -= atmosphere.omega*r[:,0]
+    return (-0.5*rho*ballistics*np.linalg.norm(v_rel, axis=1))[:,None]*v_rel
+
+def third_body_batch(r, terms):
+    '''
+    Calculates the perturbation of other bodies on a stack of points, the difference
+    between their attraction on each point and on the central body
+    :param r: (N,3) array of position vectors
+    :param terms: third body terms at the current time, see ThirdBodies.terms
+    :return: (N,3) array of perturbing accelerations
+    '''
+    accel = np.zeros_like(r)
+    for mu, sx, sy, sz, ix, iy, iz in terms:
+        d       = np.array([sx, sy, sz]) - r
+        d_mag   = np.linalg.norm(d, axis=1)
+        accel  += mu*d/(d_mag**3)[:,None] - np.array([ix, iy, iz])
+    return accel
+
+def rotate_batch(quat, vec):
+    '''
+    Rotates a stack of vectors by a stack of (not necessarily unit) quaternions,
+    matching quaternion.rotate_vectors for each pair
+    :param quat: (N,4) array of quaternions [w, x, y, z]
+    :param vec: (N,3) array of vectors
+    :return: (N,3) array of rotated vectors
+    '''
+    w       = quat[:,0:1]
+    u       = quat[:,1:4]
+    norm_sq = np.sum(quat**2, axis=1)[:,None]
+    u_x_v   = np.cross(u, vec)
+    return vec + 2*(w*u_x_v + np.cross(u, u_x_v))/norm_sq
+
+def state_dot_batch(t, states, masses, Js, T_bodies, L_bodies, central_body):
+    '''
+    Vectorized state_dot for a stack of satellites integrated as one system
+    :param t: current time
+    :param states: flattened (N*13) array of stacked satellite states
+    :param masses: (N,) array of satellite masses
+    :param Js: (N,3,3) array of satellite inertia tensors
+    :param T_bodies: (N,3) array of thrust commands
+    :param L_bodies: (N,3) array of torque commands
+    :param central_body: central body the satellites orbit
+    :return: flattened (N*13) array of state derivatives
+    '''
+    states  = states.reshape(-1, 13)
+    pos     = states[:,0:3]
+    vel     = states[:,3:6]
+    quat    = states[:,6:10]
+    omega   = states[:,10:13]
+
+    R = central_body.radius
+    mu = central_body.mu
+    J2 = central_body.J2
+
+    grav    = gravity_batch(pos, mu)
+    J2_pert = J2_perturbation_batch(pos, mu, R, J2)
+
+    T_body  = rotate_batch(quat, T_bodies)
+
+    x_dot           = np.empty_like(states)
+    x_dot[:,0:3]    = vel
+    x_dot[:,3:6]    = grav + J2_pert + T_body/masses[:,None]
+
+    # q_dot = -1/2 * (0, omega) * q
+    x_dot[:,6]      = 1/2 * np.sum(omega*quat[:,1:4], axis=1)
+    x_dot[:,7:10]   = -1/2 * (quat[:,0:1]*omega + np.cross(omega, quat[:,1:4]))
+
+    J_omega         = np.einsum('nij,nj->ni', Js, omega)
+    x_dot[:,10:13]  = np.linalg.solve(Js, (L_bodies - np.cross(omega, J_omega))[:,:,None])[:,:,0]
+    return x_dot.ravel()
+
+def cross_into(a, b, out, scratch):
+    '''
+    Row-wise cross product of two (N,3) arrays written into out without temporaries
+    :param a: (N,3) array
+    :param b: (N,3) array
+    :param out: (N,3) output buffer, must not alias a or b
+    :param scratch: (N,) work buffer
+    '''
+    for i, j, k in [(0, 1, 2), (1, 2, 0), (2, 0, 1)]:
+        np.multiply(a[:,j], b[:,k], out=out[:,i])
+        np.multiply(a[:,k], b[:,j], out=scratch)
+        out[:,i] -= scratch
+
+class StateDot():
+    '''
+    Per-vehicle dynamics kernel. The inertia inverse and the central body constants
+    are computed once, and each evaluation works on plain floats and writes the
+    state derivative into a caller-provided buffer
+    '''
+    state_size = 13
+
+    # The angular accelerations depend on the angular velocity through the gyroscopic
+    # term, so a symplectic step cannot reuse the rates of its closing kick
+    velocity_dependent = True
+
+    def __init__(self, mass, J, central_body, ballistic=0.0):
+        '''
+        :param mass: vehicle mass
+        :param J: vehicle inertia tensor
+        :param central_body: central body, drag is applied when it has an atmosphere
+        :param ballistic: ballistic coefficient Cd*A/m, 0 for no drag
+        '''
+        J               = np.asarray(J, dtype=np.float64)
+        self.inv_mass   = 1/float(mass)
+        self.J          = tuple(J.ravel().tolist())
+        self.J_inv      = tuple(np.linalg.inv(J).ravel().tolist())
+
+        self.mu         = central_body.mu
+        self.J2_coeff   = -3/2 * central_body.J2 * central_body.mu * central_body.radius**2
+
+        # A spherical harmonic field replaces the point mass and J2 terms
+        self.field      = central_body.gravity_field
+        if self.field is not None:
+            self.field_pos  = np.empty((1, 3))
+            self.field_acc  = np.empty((1, 3))
+
+        self.third_bodies = central_body.third_bodies
+
+        atmosphere      = central_body.atmosphere
+        self.drag       = atmosphere is not None and ballistic > 0
+        if self.drag:
+            self.density    = atmosphere.table.density
+            self.radius     = atmosphere.radius
+            self.flattening = atmosphere.flattening
+            self.omega      = atmosphere.omega
+            self.half_B     = 0.5*float(ballistic)
+
+    def __call__(self, t, state, out, T_body, L_body):
+        x, y, z, vx, vy, vz, qw, qx, qy, qz, wx, wy, wz = state.tolist()
+
+        # Point mass gravity and J2
+        r2      = x*x + y*y + z*z
+        r       = math.sqrt(r2)
+        if self.field is None:
+            grav    = -self.mu/(r2*r)
+            J2_pert = self.J2_coeff/(r2*r2*r)
+            z_ratio = 5*z*z/r2
+            ax      = (grav + J2_pert*(1 - z_ratio))*x
+            ay      = (grav + J2_pert*(1 - z_ratio))*y
+            az      = (grav + J2_pert*(3 - z_ratio))*z
+        else:
+            self.field_pos[0]   = x, y, z
+            self.field(t, self.field_pos, self.field_acc)
+            ax, ay, az          = self.field_acc[0].tolist()
+
+        # Drag in the air co-rotating with the body, at the altitude above the ellipsoid
+        if self.drag:
+            rho = self.density(r - self.radius*(1 - self.flattening*z*z/r2))
+            if rho > 0:
+                vrx     = vx + self.omega*y
+                vry     = vy - self.omega*x
+                drag    = -self.half_B*rho*math.sqrt(vrx*vrx + vry*vry + vz*vz)
+                ax     += drag*vrx
+                ay     += drag*vry
+                az     += drag*vz
+
+        # Attraction of the other bodies less their attraction on the central body
+        if self.third_bodies is not None:
+            for mu, sx, sy, sz, ix, iy, iz in self.third_bodies.terms(t):
+                dx      = sx - x
+                dy      = sy - y
+                dz      = sz - z
+                d2      = dx*dx + dy*dy + dz*dz
+                f       = mu/(d2*math.sqrt(d2))
+                ax     += f*dx - ix
+                ay     += f*dy - iy
+                az     += f*dz - iz
+
+        # Thrust rotated from the body frame by the (not necessarily unit) quaternion
+        Tx, Ty, Tz = T_body[0], T_body[1], T_body[2]
+        if Tx != 0 or Ty != 0 or Tz != 0:
+            scale   = 2/(qw*qw + qx*qx + qy*qy + qz*qz)
+            cx      = qy*Tz - qz*Ty
+            cy      = qz*Tx - qx*Tz
+            cz      = qx*Ty - qy*Tx
+            ax     += (Tx + scale*(qw*cx + qy*cz - qz*cy))*self.inv_mass
+            ay     += (Ty + scale*(qw*cy + qz*cx - qx*cz))*self.inv_mass
+            az     += (Tz + scale*(qw*cz + qx*cy - qy*cx))*self.inv_mass
+
+        # Euler's equations, alpha = J^-1 (L - omega x J omega)
+        J, J_inv    = self.J, self.J_inv
+        hx          = J[0]*wx + J[1]*wy + J[2]*wz
+        hy          = J[3]*wx + J[4]*wy + J[5]*wz
+        hz          = J[6]*wx + J[7]*wy + J[8]*wz
+        mx          = L_body[0] - (wy*hz - wz*hy)
+        my          = L_body[1] - (wz*hx - wx*hz)
+        mz          = L_body[2] - (wx*hy - wy*hx)
+
+        out[0]  = vx
+        out[1]  = vy
+        out[2]  = vz
+        out[3]  = ax
+        out[4]  = ay
+        out[5]  = az
+
+        # q_dot = -1/2 * (0, omega) * q
+        out[6]  = 0.5*(wx*qx + wy*qy + wz*qz)
+        out[7]  = -0.5*(qw*wx + wy*qz - wz*qy)
+        out[8]  = -0.5*(qw*wy + wz*qx - wx*qz)
+        out[9]  = -0.5*(qw*wz + wx*qy - wy*qx)
+
+        out[10] = J_inv[0]*mx + J_inv[1]*my + J_inv[2]*mz
+        out[11] = J_inv[3]*mx + J_inv[4]*my + J_inv[5]*mz
+        out[12] = J_inv[6]*mx + J_inv[7]*my + J_inv[8]*mz
+
+class OrbitDot():
+    '''
+    Translational dynamics kernel for stacked 6-element [r, v] states, with the
+    thrust given as inertial accelerations held over the call
+    '''
+    state_size = 6
+
+    def __init__(self, central_body, ballistics=None):
+        '''
+        :param central_body: central body, drag is applied when it has an atmosphere
+        :param ballistics: (N,) ballistic coefficients Cd*A/m, None for no drag
+        '''
+        self.mu         = central_body.mu
+        self.radius     = central_body.radius
+        self.J2         = central_body.J2
+        self.field      = central_body.gravity_field
+        self.third_bodies = central_body.third_bodies
+
+        self.atmosphere = central_body.atmosphere
+        self.ballistics = None
+        if self.atmosphere is not None and ballistics is not None and np.any(np.asarray(ballistics) > 0):
+            self.ballistics = np.asarray(ballistics, dtype=np.float64)
+
+        # Without drag the accelerations depend on time and position only
+        self.velocity_dependent = self.ballistics is not None
+
+    def __call__(self, t, states, out, accels):
+        states      = states.reshape(-1, 6)
+        x_dot       = out.reshape(-1, 6)
+        pos         = states[:,0:3]
+
+        x_dot[:,0:3] = states[:,3:6]
+        if self.field is None:
+            x_dot[:,3:6] = gravity_batch(pos, self.mu) + J2_perturbation_batch(pos, self.mu, self.radius, self.J2) + accels
+        else:
+            self.field(t, pos, x_dot[:,3:6])
+            x_dot[:,3:6] += accels
+        if self.ballistics is not None:
+            x_dot[:,3:6] += drag_batch(pos, states[:,3:6], self.ballistics, self.atmosphere)
+        if self.third_bodies is not None:
+            x_dot[:,3:6] += third_body_batch(pos, self.third_bodies.terms(t))
+
+class AttitudeDot():
+    '''
+    Rotational dynamics kernel for the 7-element [q, omega] state, used when the
+    translational state is propagated analytically
+    '''
+    state_size = 7
+
+    velocity_dependent = True    # gyroscopic term, see StateDot
+
+    def __init__(self, J):
+        J               = np.asarray(J, dtype=np.float64)
+        self.J          = tuple(J.ravel().tolist())
+        self.J_inv      = tuple(np.linalg.inv(J).ravel().tolist())
+
+    def __call__(self, t, state, out, L_body):
+        qw, qx, qy, qz, wx, wy, wz = state.tolist()
+
+        # Euler's equations, alpha = J^-1 (L - omega x J omega)
+        J, J_inv    = self.J, self.J_inv
+        hx          = J[0]*wx + J[1]*wy + J[2]*wz
+        hy          = J[3]*wx + J[4]*wy + J[5]*wz
+        hz          = J[6]*wx + J[7]*wy + J[8]*wz
+        mx          = L_body[0] - (wy*hz - wz*hy)
+        my          = L_body[1] - (wz*hx - wx*hz)
+        mz          = L_body[2] - (wx*hy - wy*hx)
+
+        # q_dot = -1/2 * (0, omega) * q
+        out[0]  = 0.5*(wx*qx + wy*qy + wz*qz)
+        out[1]  = -0.5*(qw*wx + wy*qz - wz*qy)
+        out[2]  = -0.5*(qw*wy + wz*qx - wx*qz)
+        out[3]  = -0.5*(qw*wz + wx*qy - wy*qx)
+
+        out[4]  = J_inv[0]*mx + J_inv[1]*my + J_inv[2]*mz
+        out[5]  = J_inv[3]*mx + J_inv[4]*my + J_inv[5]*mz
+        out[6]  = J_inv[6]*mx + J_inv[7]*my + J_inv[8]*mz
+
+class AttitudeDotBatch():
+    '''
+    Rotational dynamics kernel for a stack of 7-element [q, omega] states, with the
+    same preallocated buffers as StateDotBatch
+    '''
+    state_size = 7
+
+    velocity_dependent = True    # gyroscopic term, see StateDot
+
+    def __init__(self, Js):
+        Js              = np.asarray(Js, dtype=np.float64)
+        self.num_sats   = len(Js)
+        self.J          = Js
+        self.J_inv      = np.linalg.inv(Js)
+        self.scratch    = np.empty(self.num_sats)
+        self.vec_a      = np.empty((self.num_sats, 3))
+        self.vec_b      = np.empty((self.num_sats, 3))
+
+    def __call__(self, t, states, out, L_bodies):
+        states  = states.reshape(self.num_sats, 7)
+        x_dot   = out.reshape(self.num_sats, 7)
+        quat    = states[:,0:4]
+        omega   = states[:,4:7]
+        vec_a, vec_b, scratch = self.vec_a, self.vec_b, self.scratch
+
+        # q_dot = -1/2 * (0, omega) * q
+        np.einsum('ij,ij->i', omega, quat[:,1:4], out=x_dot[:,0])
+        x_dot[:,0] *= 0.5
+        cross_into(omega, quat[:,1:4], vec_a, scratch)
+        np.multiply(quat[:,0:1], omega, out=x_dot[:,1:4])
+        x_dot[:,1:4] += vec_a
+        x_dot[:,1:4] *= -0.5
+
+        # Euler's equations, alpha = J^-1 (L - omega x J omega)
+        np.einsum('nij,nj->ni', self.J, omega, out=vec_a)
+        cross_into(omega, vec_a, vec_b, scratch)
+        np.subtract(L_bodies, vec_b, out=vec_b)
+        np.einsum('nij,nj->ni', self.J_inv, vec_b, out=x_dot[:,4:7])
+
+class StateDotBatch():
+    '''
+    Dynamics kernel for a stack of satellites integrated as one system. Inertia
+    inverses are computed once and every intermediate lives in a preallocated
+    buffer, so an evaluation allocates no arrays
+    '''
+    state_size = 13
+
+    velocity_dependent = True    # gyroscopic term, see StateDot
+
+    def __init__(self, masses, Js, central_body, ballistics=None):
+        '''
+        :param masses: (N,) vehicle masses
+        :param Js: (N,3,3) vehicle inertia tensors
+        :param central_body: central body, drag is applied when it has an atmosphere
+        :param ballistics: (N,) ballistic coefficients Cd*A/m, None for no drag
+        '''
+        Js              = np.asarray(Js, dtype=np.float64)
+        self.num_sats   = len(Js)
+        self.inv_mass   = 1/np.asarray(masses, dtype=np.float64)
+        self.J          = Js
+        self.J_inv      = np.linalg.inv(Js)
+
+        self.mu         = central_body.mu
+        self.J2_coeff   = -3/2 * central_body.J2 * central_body.mu * central_body.radius**2
+        self.field      = central_body.gravity_field
+        self.third_bodies = central_body.third_bodies
+
+        atmosphere      = central_body.atmosphere
+        self.drag       = atmosphere is not None and ballistics is not None and np.any(np.asarray(ballistics) > 0)
+        if self.drag:
+            self.table      = atmosphere.table
+            self.radius     = atmosphere.radius
+            self.flattening = atmosphere.flattening
+            self.omega      = atmosphere.omega
+            self.neg_half_B = -0.5*np.asarray(ballistics, dtype=np.float64)
+            self.rho        = np.empty(self.num_sats)
+            self.index      = np.empty(self.num_sats, dtype=np.intp)
+
+        num_sats        = self.num_sats
+        self.r2         = np.empty(num_sats)
+        self.r          = np.empty(num_sats)
+        self.grav       = np.empty(num_sats)
+        self.J2_pert    = np.empty(num_sats)
+        self.z_ratio    = np.empty(num_sats)
+        self.scalar     = np.empty(num_sats)
+        self.scratch    = np.empty(num_sats)
+        self.vec_a      = np.empty((num_sats, 3))
+        self.vec_b      = np.empty((num_sats, 3))
+        self.vec_c      = np.empty((num_sats, 3))
+
+    def __call__(self, t, states, out, T_bodies, L_bodies):
+        states  = states.reshape(self.num_sats, 13)
+        x_dot   = out.reshape(self.num_sats, 13)
+        pos     = states[:,0:3]
+        quat    = states[:,6:10]
+        omega   = states[:,10:13]
+        accel   = x_dot[:,3:6]
+        r2, r, grav, J2_pert, z_ratio, scalar = self.r2, self.r, self.grav, self.J2_pert, self.z_ratio, self.scalar
+        vec_a, vec_b, vec_c, scratch = self.vec_a, self.vec_b, self.vec_c, self.scratch
+
+        x_dot[:,0:3] = states[:,3:6]
+
+        # Point mass gravity and J2
+        np.einsum('ij,ij->i', pos, pos, out=r2)
+        np.sqrt(r2, out=r)
+        np.multiply(pos[:,2], pos[:,2], out=z_ratio)
+        z_ratio *= 5
+        z_ratio /= r2
+        if self.field is None:
+            np.multiply(r2, r, out=grav)
+            np.divide(-self.mu, grav, out=grav)
+            np.multiply(r2, r2, out=J2_pert)
+            J2_pert *= r
+            np.divide(self.J2_coeff, J2_pert, out=J2_pert)
+
+            np.subtract(1, z_ratio, out=scalar)
+            scalar *= J2_pert
+            scalar += grav
+            np.multiply(pos[:,0], scalar, out=accel[:,0])
+            np.multiply(pos[:,1], scalar, out=accel[:,1])
+            np.subtract(3, z_ratio, out=scalar)
+            scalar *= J2_pert
+            scalar += grav
+            np.multiply(pos[:,2], scalar, out=accel[:,2])
+        else:
+            # A spherical harmonic field replaces the point mass and J2 terms
+            self.field(t, pos, accel)
+
+        # Drag in the air co-rotating with the body, at the altitude above the ellipsoid.
+        # z_ratio holds 5 z^2/r^2
+        if self.drag:
+            vel, rho = states[:,3:6], self.rho
+            np.multiply(z_ratio, -self.flattening/5, out=scalar)
+            scalar += 1
+            scalar *= -self.radius
+            scalar += r
+            self.table.density_batch(scalar, rho, self.index, scratch)
+            rho *= self.neg_half_B
+
+            np.multiply(pos[:,1], self.omega, out=vec_a[:,0])
+            vec_a[:,0] += vel[:,0]
+            np.multiply(pos[:,0], -self.omega, out=vec_a[:,1])
+            vec_a[:,1] += vel[:,1]
+            vec_a[:,2] = vel[:,2]
+            np.einsum('ij,ij->i', vec_a, vec_a, out=scalar)
+            np.sqrt(scalar, out=scalar)
+            scalar *= rho
+            vec_a *= scalar[:,None]
+            accel += vec_a
+
+        # Attraction of the other bodies less their attraction on the central body
+        if self.third_bodies is not None:
+            for mu, sx, sy, sz, ix, iy, iz in self.third_bodies.terms(t):
+                np.subtract(sx, pos[:,0], out=vec_a[:,0])
+                np.subtract(sy, pos[:,1], out=vec_a[:,1])
+                np.subtract(sz, pos[:,2], out=vec_a[:,2])
+                np.einsum('ij,ij->i', vec_a, vec_a, out=scalar)
+                np.sqrt(scalar, out=scratch)
+                scalar *= scratch
+                np.divide(mu, scalar, out=scalar)
+                vec_a *= scalar[:,None]
+                vec_a[:,0] -= ix
+                vec_a[:,1] -= iy
+                vec_a[:,2] -= iz
+                accel += vec_a
+
+        # Thrust rotated from the body frame, T + 2(w (u x T) + u x (u x T))/|q|^2
+        np.einsum('ij,ij->i', quat, quat, out=scalar)
+        np.divide(2, scalar, out=scalar)
+        cross_into(quat[:,1:4], T_bodies, vec_a, scratch)
+        cross_into(quat[:,1:4], vec_a, vec_b, scratch)
+        np.multiply(quat[:,0:1], vec_a, out=vec_c)
+        vec_c += vec_b
+        vec_c *= scalar[:,None]
+        vec_c += T_bodies
+        vec_c *= self.inv_mass[:,None]
+        accel += vec_c
+
+        # q_dot = -1/2 * (0, omega) * q
+        np.einsum('ij,ij->i', omega, quat[:,1:4], out=x_dot[:,6])
+        x_dot[:,6] *= 0.5
+        cross_into(omega, quat[:,1:4], vec_a, scratch)
+        np.multiply(quat[:,0:1], omega, out=x_dot[:,7:10])
+        x_dot[:,7:10] += vec_a
+        x_dot[:,7:10] *= -0.5
+
+        # Euler's equations, alpha = J^-1 (L - omega x J omega)
+        np.einsum('nij,nj->ni', self.J, omega, out=vec_a)
+        cross_into(omega, vec_a, vec_b, scratch)
+        np.subtract(L_bodies, vec_b, out=vec_b)
+        np.einsum('nij,nj->ni', self.J_inv, vec_b, out=x_dot[:,10:13])
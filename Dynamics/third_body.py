@@ -0,0 +1,48 @@
+import math
+
+import Dynamics.ephemeris as ephemeris
+
+class ThirdBodies():
+    '''
+    Point mass perturbations of bodies other than the central one. Their positions
+    come from Chebyshev fits of the analytic ephemerides over the run, and are
+    evaluated once per time however many satellites or kernels ask for them
+    '''
+    def __init__(self, names, planet, planet_conf, epoch, duration, cache_dir=None):
+        '''
+        :param names: perturbing bodies, keys of ephemeris.POSITIONS
+        :param planet: central body
+        :param planet_conf: planets.yaml contents, for the gravitational parameters
+        :param epoch: start of the run in days since J2000
+        :param duration: length of the run in seconds
+        :param cache_dir: directory of the cached ephemeris fits, None to always fit
+        '''
+        for name in names:
+            if name == planet.name:
+                print(f"{name} is the central body")
+                exit()
+
+        self.names          = list(names)
+        self.mus            = [float(planet_conf[name]["mu"]) for name in names]
+        self.ephemerides    = [ephemeris.ChebyshevEphemeris(name, planet, epoch, epoch + duration/86400, cache_dir)
+                               for name in names]
+        self.epoch          = epoch
+        self.t_last         = None
+        self.terms_last     = None
+
+    def terms(self, t):
+        '''
+        :param t: time since the start of the run
+        :return: list with (mu, sx, sy, sz, ix, iy, iz) per body, its position and the
+                 acceleration it gives the central body
+        '''
+        if t != self.t_last:
+            days    = self.epoch + t/86400
+            terms   = []
+            for mu, body_ephemeris in zip(self.mus, self.ephemerides):
+                sx, sy, sz  = body_ephemeris.position(days).tolist()
+                s2          = sx*sx + sy*sy + sz*sz
+                f           = mu/(s2*math.sqrt(s2))
+                terms.append((mu, sx, sy, sz, f*sx, f*sy, f*sz))
+            self.t_last, self.terms_last = t, terms
+        return self.terms_last
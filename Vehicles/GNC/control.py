@@ -1,25 +1,37 @@
 import quaternion
 import numpy as np
 
+def get_torque_cmds(rot_states, q_targets, k_p, k_d):
+    '''
+    PD attitude control law for a stack of satellites
+    :param rot_states: (N,7) rotational states [q, omega]
+    :param q_targets: (N,4) target quaternions [w, x, y, z]
+    :param k_p: proportional gain, scalar or (N,) array
+    :param k_d: derivative gain, scalar or (N,) array
+    :return: (N,3) torque commands
+    '''
+    q_now   = rot_states[:,0:4]
+    omega   = rot_states[:,4:7]
+    k_p     = np.reshape(k_p, (-1, 1))
+    k_d     = np.reshape(k_d, (-1, 1))
+
+    # Vector part of the quaternion error dq = q_now*q_target^-1
+    q_inv   = q_targets*np.array([1, -1, -1, -1])/np.sum(q_targets**2, axis=1)[:,None]
+    dq_vec  = (q_now[:,0:1]*q_inv[:,1:4] + q_inv[:,0:1]*q_now[:,1:4]
+               + np.cross(q_now[:,1:4], q_inv[:,1:4]))
+
+    # Compute the control input
+    return -k_p*dq_vec - k_d*omega
+
 class Controller():
     def __init__(self, orient_gains):
         self.orient_kp      = orient_gains[0]
         self.orient_kd     = orient_gains[1]
 
     def get_torque_cmd(self, rot_state, q_target):
-        q_now   = quaternion.as_quat_array(rot_state[0:4])
-        omega   = rot_state[4:7]
-
-        # Get the control gains
-        k_p = self.orient_kp
-        k_d = self.orient_kd
-
-        # Compute the quaternion error
-        dq  =   q_now*q_target.inverse()
-
-        # Compute the control input
-        u   =   -k_p*np.array([dq.x, dq.y, dq.z]) - k_d*omega
-        return u
+        rot_state   = np.asarray(rot_state, dtype=np.float64)[None,:]
+        q_target    = quaternion.as_float_array(q_target)[None,:]
+        return get_torque_cmds(rot_state, q_target, self.orient_kp, self.orient_kd)[0]
     
     def get_thrust_command(self, state):
         return np.array([0, 0, 0])
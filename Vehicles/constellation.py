@@ -0,0 +1,252 @@
+import yaml
+import numpy as np
+import quaternion
+
+import Dynamics.kepler as kepler
+import Dynamics.propagation as prop
+import utils.attitude_ref as att_ref
+import utils.history as history
+import Vehicles.GNC.control as ctrl
+import Vehicles.GNC.sensors as nav
+import Vehicles.satellite as satellite
+
+def walker(total, planes, phasing, a, inc, pattern="delta", raan0=0):
+    '''
+    Keplerian elements of a Walker constellation inc: total/planes/phasing
+    :param total: number of satellites
+    :param planes: number of equally spaced orbital planes
+    :param phasing: relative phasing F between adjacent planes, 0 <= F < planes
+    :param a: semimajor axis
+    :param inc: inclination in degrees
+    :param pattern: "delta" spreads the nodes over 360 degrees, "star" over 180 degrees
+    :param raan0: right ascension of the ascending node of the first plane in degrees
+    :return: (total,6) elements [a, e, i, lan, argp, TA] with angles in degrees, plane by plane
+    '''
+    if total % planes != 0:
+        print(f"Walker constellation needs the {total} satellites split evenly over {planes} planes")
+        exit()
+    if pattern not in ["delta", "star"]:
+        print(f"Unknown Walker pattern {pattern}")
+        exit()
+
+    per_plane   = total // planes
+    node_spread = 360 if pattern == "delta" else 180
+    plane       = np.repeat(np.arange(planes), per_plane)
+    slot        = np.tile(np.arange(per_plane), planes)
+
+    kep         = np.zeros((total, 6))
+    kep[:,0]    = a
+    kep[:,2]    = inc
+    kep[:,3]    = (raan0 + plane*node_spread/planes) % 360
+    kep[:,5]    = (slot*360/per_plane + plane*phasing*360/total) % 360
+    return kep
+
+def member_names(name, total, planes):
+    per_plane = total // planes
+    return [f"{name}_{plane:02d}_{slot:02d}" for plane in range(planes) for slot in range(per_plane)]
+
+class Constellation():
+    '''
+    Satellites of one vehicle type stored as a struct of arrays. The vehicle
+    properties are read once and shared, and each history row is an (N,...) block
+    holding every satellite at one time. Per-satellite views are in members
+    '''
+    def __init__(self, name, t0, states, central_body, sc_yaml, names):
+        # Get the shared properties from the spacecraft yaml
+        sat_props   = yaml.safe_load(open(sc_yaml, 'r'))
+
+        self.name           = name
+        self.vehicle_name   = sat_props["name"]
+        self.num_sats       = len(states)
+
+        # Populate the mass/inertia properties
+        self.mass           = float(sat_props["mass"])
+        self.J              = np.diag(sat_props["inertia"])
+        self.masses         = np.full(self.num_sats, self.mass)
+        self.Js             = np.broadcast_to(self.J, (self.num_sats, 3, 3))
+
+        # Ballistic coefficient Cd*A/m, vehicles without drag properties feel no drag
+        self.ballistic      = 0.0
+        if "drag" in sat_props.keys():
+            drag_props      = sat_props["drag"]
+            self.ballistic  = float(drag_props["Cd"])*float(drag_props["area"])/self.mass
+        self.ballistics     = np.full(self.num_sats, self.ballistic)
+
+        self.dynamics           = prop.StateDotBatch(self.masses, self.Js, central_body, self.ballistics)
+        self.attitude_dynamics  = prop.AttitudeDotBatch(self.Js)
+
+        # Set the visualization properties
+        self.model              = sat_props["model"]
+        self.colorscale         = sat_props["colorscale"]
+        self.model_axis_order   = sat_props["model_axis_order"]
+        self.lights             = np.array([sat_props["nav_red"],
+                                            sat_props["nav_green"]])
+
+        # Create the shared controller and star tracker
+        control_params      = sat_props["control"]
+        self.controller     = ctrl.Controller([control_params["orient_control_kp"],
+                                               control_params["orient_control_kd"]])
+        star_tracker_props  = sat_props["star_tracker"]
+        body_to_boresight   = quaternion.from_float_array(star_tracker_props["body_to_boresight"])
+        self.star_tracker   = nav.StarTracker(body_to_boresight.conjugate())
+
+        # Initialize the history stores, one (N,...) block per time
+        states                      = np.asarray(states, dtype=np.float64)
+        self.t0                     = t0
+        self.central_body           = central_body
+        self.init_states            = states
+        self.state_store            = history.History(states)
+        self.target_orient_store    = history.History(states[:,6:10])
+        self.time_store             = history.History(0.0)
+
+        self.propagator     = "numeric"
+        self.j2_secular     = False
+        self.hold_attitude  = False
+
+        # Members stopped by a terminal event keep their state
+        self.stopped        = np.zeros(self.num_sats, dtype=bool)
+
+        self.members = [ConstellationMember(self, i, member_name) for i, member_name in enumerate(names)]
+
+    def set_propagator(self, method, j2_secular=False, hold_attitude=False):
+        '''
+        Selects how the translational states are advanced, see Satellite.set_propagator
+        '''
+        self.propagator     = method
+        self.j2_secular     = j2_secular
+        self.hold_attitude  = hold_attitude
+        if method == "kepler":
+            # The epoch is the first recorded block, so resumed runs reproduce the same orbits
+            self.kepler     = kepler.KeplerPropagator(self.state_store.data[0,:,0:6], self.central_body, j2_secular)
+
+    def set_init_states(self, states):
+        '''
+        Replaces the initial states of every member before the run starts
+        :param states: (N,13) initial states
+        '''
+        states                      = np.asarray(states, dtype=np.float64)
+        self.init_states            = states
+        self.state_store            = history.History(states)
+        self.target_orient_store    = history.History(states[:,6:10])
+        for member in self.members:
+            member.init_state       = states[member.idx]
+            member.attach()
+        if self.propagator == "kepler":
+            self.set_propagator(self.propagator, self.j2_secular, self.hold_attitude)
+
+    def set_inertias(self, Js):
+        '''
+        Gives every member its own inertia tensor
+        :param Js: (N,3,3) inertia tensors
+        '''
+        self.Js                 = np.asarray(Js, dtype=np.float64)
+        self.dynamics           = prop.StateDotBatch(self.masses, self.Js, self.central_body, self.ballistics)
+        self.attitude_dynamics  = prop.AttitudeDotBatch(self.Js)
+        for member in self.members:
+            member.J            = self.Js[member.idx]
+
+    def set_gains(self, orient_kp, orient_kd):
+        '''
+        Gives every member its own attitude controller gains
+        :param orient_kp: (N,) proportional gains
+        :param orient_kd: (N,) derivative gains
+        '''
+        self.controller.orient_kp   = np.asarray(orient_kp, dtype=np.float64)
+        self.controller.orient_kd   = np.asarray(orient_kd, dtype=np.float64)
+        for member in self.members:
+            member.controller       = ctrl.Controller([self.controller.orient_kp[member.idx],
+                                                       self.controller.orient_kd[member.idx]])
+
+    def reserve_history(self, num_states):
+        for store in [self.state_store, self.target_orient_store, self.time_store]:
+            store.reserve(num_states)
+
+    def restore_history(self, time_hist, state_hist, target_orient_hist, num_states):
+        '''
+        Replaces the recorded histories with ones read back from a checkpoint
+        :param time_hist: (T,) recorded times
+        :param state_hist: (T,N,13) recorded states
+        :param target_orient_hist: (T,N,4) recorded target quaternions
+        :param num_states: number of states the full run will record
+        '''
+        self.time_store             = history.from_array(time_hist)
+        self.state_store            = history.from_array(state_hist)
+        self.target_orient_store    = history.from_array(target_orient_hist)
+        for member in self.members:
+            member.attach()
+        self.reserve_history(num_states)
+
+    @property
+    def state_history(self):
+        return self.state_store.data
+
+    @property
+    def target_orient_history(self):
+        return self.target_orient_store.data
+
+    @property
+    def time_history(self):
+        return self.time_store.data
+
+    def get_states(self):
+        return self.state_store.last()
+
+    def get_target_orients(self, mu):
+        return att_ref.get_inertial_to_lvlh(self.get_states()[:,0:6], self.target_orient_store.last())
+
+    def get_inputs(self, mu):
+        '''
+        Guidance and control inputs of every satellite
+        :param mu: gravitational parameter of the central body
+        :return: (N,4) target quaternions, (N,3) thrust and (N,3) torque commands
+        '''
+        states      = self.get_states()
+        q_targets   = self.get_target_orients(mu)
+        T_bodies    = np.zeros((self.num_sats, 3))
+        L_bodies    = ctrl.get_torque_cmds(states[:,6:13], q_targets, self.controller.orient_kp,
+                                           self.controller.orient_kd)
+        return q_targets, T_bodies, L_bodies
+
+    def update_state_hist(self, t, states, target_orients):
+        self.time_store.append(t)
+        self.state_store.append(states)
+        self.target_orient_store.append(target_orients)
+
+class ConstellationMember(satellite.Satellite):
+    '''
+    View of one satellite of a constellation. The histories are columns of the
+    constellation's stores, so the Satellite accessors and derived histories work
+    unchanged while the constellation steps every member at once
+    '''
+    def __init__(self, constellation, idx, name):
+        self.constellation      = constellation
+        self.idx                = idx
+        self.name               = name
+
+        self.mass               = constellation.mass
+        self.J                  = constellation.J
+        self.model              = constellation.model
+        self.colorscale         = constellation.colorscale
+        self.model_axis_order   = constellation.model_axis_order
+        self.lights             = constellation.lights
+        self.controller         = constellation.controller
+        self.star_tracker       = constellation.star_tracker
+
+        self.t0                 = constellation.t0
+        self.central_body       = constellation.central_body
+        self.init_state         = constellation.init_states[idx]
+        self.attach()
+
+    def attach(self):
+        constellation               = self.constellation
+        self.state_store            = constellation.state_store.column(self.idx)
+        self.target_orient_store    = constellation.target_orient_store.column(self.idx)
+        self.time_store             = constellation.time_store
+        self.derived_stores         = {}
+
+    @property
+    def propagator(self):
+        return self.constellation.propagator
+
+    def reserve_history(self, num_states):
+        self.constellation.reserve_history(num_states)
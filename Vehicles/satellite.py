@@ -3,14 +3,14 @@ import numpy as np
 import quaternion
 
 import utils.convert as convert
+import Dynamics.propagation as prop
 import utils.attitude_ref as att_ref
+import utils.history as history
 import Vehicles.GNC.control as ctrl
 import Vehicles.GNC.sensors as nav
 
 class Satellite():
     def __init__(self, t0, state, central_body, sc_yaml):
-        mu                      = central_body.mu
-        
         # Get properties from the spacecraft yaml
         sat_props   = yaml.safe_load(open(sc_yaml, 'r'))
 
@@ -21,6 +21,20 @@ class Satellite():
         self.mass                   = float(sat_props["mass"])
         self.J                      = np.diag(sat_props["inertia"])
 
+        # Ballistic coefficient Cd*A/m, vehicles without drag properties feel no drag
+        self.ballistic              = 0.0
+        if "drag" in sat_props.keys():
+            drag_props              = sat_props["drag"]
+            self.ballistic          = float(drag_props["Cd"])*float(drag_props["area"])/self.mass
+
+        self.dynamics               = prop.StateDot(self.mass, self.J, central_body, self.ballistic)
+        self.attitude_dynamics      = prop.AttitudeDot(self.J)
+
+        # Numerically integrated by default, see set_propagator
+        self.propagator             = "numeric"
+        self.j2_secular             = False
+        self.hold_attitude          = False
+
         # Set the visualization properties
         self.model              = sat_props["model"]
         self.colorscale         = sat_props["colorscale"]
@@ -40,38 +54,161 @@ class Satellite():
         body_to_boresight   = quaternion.from_float_array(star_tracker_props["body_to_boresight"])
         self.star_tracker   = nav.StarTracker(body_to_boresight.conjugate())
 
-        # Initialize the history arrays
+        # Initialize the history stores. Frame-derived histories (LVLH, Hill, PCPF, LLA)
+        # are computed from the state history on first access
+        self.t0                     = t0
+        self.central_body           = central_body
         self.init_state             = state
-        self.state_history          = np.array([self.init_state])
-        self.target_orient_history  = np.array([state[6:10]])
+        self.state_store            = history.History(self.init_state)
+        self.target_orient_store    = history.History(state[6:10])
+        self.time_store             = history.History(0.0)
+        self.derived_stores         = {}
+
+    def set_inertia(self, J):
+        self.J                  = np.asarray(J, dtype=np.float64)
+        self.dynamics           = prop.StateDot(self.mass, self.J, self.central_body, self.ballistic)
+        self.attitude_dynamics  = prop.AttitudeDot(self.J)
+
+    def set_propagator(self, method, j2_secular=False, hold_attitude=False):
+        '''
+        Selects how the translational state is advanced
+        :param method: "numeric" to integrate the full dynamics, or "kepler" for analytic two-body motion
+        :param j2_secular: with "kepler", add the secular J2 drift of the node and perigee
+        :param hold_attitude: with "kepler", hold the rotational state instead of integrating it
+        '''
+        self.propagator     = method
+        self.j2_secular     = j2_secular
+        self.hold_attitude  = hold_attitude
+
+    def __setstate__(self, state):
+        # Simulations pickled before the history stores held plain arrays
+        for name, store in [("state_history", "state_store"), 
+                            ("target_orient_history", "target_orient_store")]:
+            if name in state.keys():
+                state[store]    = history.from_array(state.pop(name))
+
+        derived_stores = state.setdefault("derived_stores", {})
+        for name, derived in [("lvlh_to_body_hist", "lvlh_to_body"), 
+                              ("hill_to_body_hist", "hill_to_body"),
+                              ("pcpf_hist", "pcpf"), 
+                              ("lla_hist", "lla")]:
+            if name in state.keys():
+                derived_stores[derived] = history.from_array(state.pop(name))
+        self.__dict__.update(state)
+
+    def reserve_history(self, num_states):
+        '''
+        Preallocates the history stores for a run of known length
+        :param num_states: number of states the run will record
+        '''
+        for store in [self.state_store, self.target_orient_store, self.time_store]:
+            store.reserve(num_states)
+
+    def restore_history(self, time_hist, state_hist, target_orient_hist, num_states):
+        '''
+        Replaces the recorded histories with ones read back from a checkpoint
+        :param time_hist: (N,) recorded times
+        :param state_hist: (N,13) recorded states
+        :param target_orient_hist: (N,4) recorded target quaternions
+        :param num_states: number of states the full run will record
+        '''
+        self.time_store             = history.from_array(time_hist)
+        self.state_store            = history.from_array(state_hist)
+        self.target_orient_store    = history.from_array(target_orient_hist)
+        self.derived_stores         = {}
+        self.reserve_history(num_states)
+
+    @property
+    def state_history(self):
+        return self.state_store.data
+
+    @property
+    def target_orient_history(self):
+        return self.target_orient_store.data
+
+    @property
+    def time_history(self):
+        return self.time_store.data
 
-        self.lvlh_to_body_hist      = np.array([quaternion.as_float_array(self.get_lvlh_to_body(mu))])
-        self.hill_to_body_hist      = np.array([quaternion.as_float_array(self.get_hill_to_body(mu))])
+    @property
+    def lvlh_to_body_hist(self):
+        return self.derived_hist("lvlh_to_body", self.compute_lvlh_to_body)
 
-        t0                          = convert.daysSinceJ2000(t0)
-        self.pcpf_hist              = np.array([self.get_pcpf_state(central_body, t0)])
-        self.lla_hist               = np.array([self.get_lla(central_body, t0)])
+    @property
+    def hill_to_body_hist(self):
+        return self.derived_hist("hill_to_body", self.compute_hill_to_body)
+
+    @property
+    def pcpf_hist(self):
+        return self.derived_hist("pcpf", self.compute_pcpf)
+
+    @property
+    def lla_hist(self):
+        return self.derived_hist("lla", self.compute_lla)
+
+    def derived_hist(self, name, compute):
+        '''
+        Returns a history derived from the state history, computing only the rows
+        recorded since the last access in one vectorized pass
+        :param name: key of the derived history
+        :param compute: function mapping a (start, stop) row range to the derived rows
+        :return: view of the derived history
+        '''
+        store   = self.derived_stores.get(name)
+        start   = 0 if store is None else len(store)
+        stop    = len(self.state_store)
+        if start < stop:
+            rows = compute(start, stop)
+            if store is None:
+                store                       = history.History(rows[0], capacity=len(self.state_store.buffer))
+                self.derived_stores[name]   = store
+                rows                        = rows[1:]
+            store.extend(rows)
+        return store.data
+
+    def days_since_j2000(self, start, stop):
+        return convert.daysSinceJ2000(self.t0) + convert.convertSecToDays(self.time_history[start:stop])
+
+    def compute_lvlh_to_body(self, start, stop):
+        states                  = self.state_history[start:stop]
+        q_lvlh_to_inertial, _   = att_ref.get_lvlh_to_pci(states[:,0:6], self.central_body.mu)
+        q_lvlh_to_body          = quaternion.as_quat_array(states[:,6:10]) * q_lvlh_to_inertial
+        return quaternion.as_float_array(q_lvlh_to_body)
+
+    def compute_hill_to_body(self, start, stop):
+        states                  = self.state_history[start:stop]
+        q_hill_to_inertial, _   = att_ref.get_hill_to_pci(states[:,0:6], self.central_body.mu)
+        q_hill_to_body          = quaternion.as_quat_array(states[:,6:10]) * q_hill_to_inertial
+        return quaternion.as_float_array(q_hill_to_body)
+
+    def compute_pcpf(self, start, stop):
+        states  = self.state_history[start:stop]
+        return att_ref.pci2pcpf(states[:,0:6], self.central_body, self.days_since_j2000(start, stop))
+
+    def compute_lla(self, start, stop):
+        pcpf    = self.pcpf_hist[start:stop]
+        return att_ref.pcpf2lla(pcpf, self.central_body)
 
     def get_state(self):
-        return self.state_history[-1,:]
+        return self.state_store.last()
     
     def get_linear_state(self):
-        return self.state_history[-1,0:6]
+        return self.state_store.last()[0:6]
     
     def get_pos(self):
-        return self.state_history[-1,0:3]
+        return self.state_store.last()[0:3]
     
     def get_vel(self):
-        return self.state_history[-1,3:6]
+        return self.state_store.last()[3:6]
     
     def get_rotational_state(self):
-        return self.state_history[-1,6:13]
+        return self.state_store.last()[6:13]
     
     def get_quat(self):
-        return quaternion.as_quat_array(self.state_history[-1,6:10])
+        return quaternion.as_quat_array(self.state_store.last()[6:10])
     
     def get_ang_vel(self):
-        return self.state_history[-1,10:13]
+        return self.state_store.last()[10:13]
     
     def get_pcpf_state(self, planet, days_epoch):
         pci_state       = self.get_linear_state()
@@ -85,27 +222,12 @@ class Satellite():
         return lla_state
     
     def update_state_history(self, state):
-        self.state_history  = np.vstack((self.state_history, state))
+        self.state_store.append(state)
     
     def update_target_state_hist(self, target_orient):
-        self.target_orient_history  = np.vstack((self.target_orient_history, 
-                                                 quaternion.as_float_array(target_orient)))   
-        
-    def update_lvlh_to_body_hist(self, lvlh_to_body):
-        self.lvlh_to_body_hist  = np.vstack((self.lvlh_to_body_hist, 
-                                             quaternion.as_float_array(lvlh_to_body)))
-        
-    def update_hill_to_body_hist(self, hill_to_body):
-        self.hill_to_body_hist  = np.vstack((self.hill_to_body_hist, 
-                                             quaternion.as_float_array(hill_to_body)))
-        
-    def update_pcpf_hist(self, planet, days_epoch):
-        self.pcpf_hist  = np.vstack((self.pcpf_hist, 
-                                     self.get_pcpf_state(planet, days_epoch)))
-        
-    def update_lla_hist(self, planet, days_epoch):
-        self.lla_hist   = np.vstack((self.lla_hist, 
-                                     self.get_lla(planet, days_epoch)))
+        if isinstance(target_orient, quaternion.quaternion):
+            target_orient = quaternion.as_float_array(target_orient)
+        self.target_orient_store.append(target_orient)
         
     def get_lvlh_to_body(self, mu):
         quat                = self.get_quat()
@@ -132,19 +254,14 @@ class Satellite():
         return q_inertial_to_hill
 
     def get_target_orient(self, mu):
-        sat_target_orient               = self.get_inertial_to_lvlh(mu)
-        return sat_target_orient
+        # Kept in the hemisphere of the previous target, see att_ref.get_inertial_to_lvlh
+        sat_target_orient   = att_ref.get_inertial_to_lvlh(self.get_linear_state(), self.target_orient_store.last())
+        return quaternion.from_float_array(sat_target_orient)
     
-    def update_state_hist(self, t0, t_now, state, sat_target_orient, central_body):
-        mu              = central_body.mu
-        days_epoch      = convert.daysSinceJ2000(t0, t_now)
-
+    def update_state_hist(self, t, state, sat_target_orient):
+        self.time_store.append(t)
         self.update_state_history(state)
         self.update_target_state_hist(sat_target_orient)
-        self.update_lvlh_to_body_hist(self.get_lvlh_to_body(mu))
-        self.update_hill_to_body_hist(self.get_hill_to_body(mu))
-        self.update_pcpf_hist(central_body, days_epoch)
-        self.update_lla_hist(central_body, days_epoch)
         
     def get_inputs(self, mu):
         state               = self.get_linear_state()
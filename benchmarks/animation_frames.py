@@ -0,0 +1,82 @@
+'''
+Frames built per second by the att_lvlh_anim and eci_anim animations against
+the number of worker processes building the frames, for one Kepler
+propagated Dragon over one orbit. Every parallel figure is checked to be
+identical to the one built in this process. Figures are built, not shown.
+Run from the repository root with
+    python -m benchmarks.animation_frames
+'''
+import os
+import time
+import datetime
+import hashlib
+import json
+import yaml
+import numpy as np
+import plotly
+
+import Core.simulator as sim
+import Core.visualizer as vis
+import Dynamics.body as body
+import Vehicles.satellite as sat
+import utils.animation as animate
+import utils.OEConvert as OEConvert
+
+VEHICLE     = "Config/Vehicles/dragon.yaml"
+T0          = datetime.datetime(2024, 4, 8, 18, 18, 0)
+TF          = 5580
+NUM_FRAMES  = [200, 1000]
+MAX_FACES   = [0, 5000]
+WORKERS     = sorted({1, 2, 4, os.cpu_count()})
+
+def run(central_body):
+    kep         = [central_body.radius + 420e3, 0.001, 51.6, 30, 0, 0]
+    state       = np.hstack((OEConvert.position(kep, central_body.mu), OEConvert.velocity(kep, central_body.mu),
+                             [1, 0, 0, 0], [0, 0, 0]))
+    satellite   = sat.Satellite(T0, state, central_body, VEHICLE)
+    satellite.set_propagator("kepler", j2_secular=False, hold_attitude=True)
+    simulator   = sim.Simulator(central_body, T0, TF, 1, [satellite], None)
+    simulator.show_progress = False
+    simulator.run()
+    return simulator
+
+def digest(figure):
+    '''
+    Hash of the figure, serialized a frame at a time to keep memory down
+    '''
+    result = hashlib.sha1(json.dumps(figure.to_plotly_json()["data"], cls=plotly.utils.PlotlyJSONEncoder).encode())
+    for frame in figure.frames:
+        result.update(json.dumps(frame.to_plotly_json(), cls=plotly.utils.PlotlyJSONEncoder).encode())
+    return result.hexdigest()
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    simulator       = run(central_body)
+    num_states      = len(simulator.satellites[0].state_history)
+
+    cases = [("att_lvlh_anim", lambda satellite, rate, workers: animate.att_lvlh(satellite, rate, workers)),
+             ("eci_anim", lambda satellite, rate, workers: animate.pci(satellite, central_body, rate, workers))]
+
+    print(f"{'animation':>14} {'faces':>6} {'frames':>7} {'workers':>8} {'time [s]':>9} {'frames/s':>9}")
+    for max_faces in MAX_FACES:
+        for num_frames in NUM_FRAMES:
+            visualizer  = vis.Visualizer(simulator, num_states//num_frames, max_faces=max_faces)
+            satellite   = visualizer.satellites[0]
+            faces       = len(satellite.vehicle_model[1])
+            for name, build in cases:
+                serial  = None
+                for workers in WORKERS:
+                    start   = time.perf_counter()
+                    figure  = build(satellite, visualizer.anim_framerate, workers)
+                    elapsed = time.perf_counter() - start
+
+                    result  = digest(figure)
+                    serial  = result if serial is None else serial
+                    assert result == serial, f"{name} with {workers} workers differs from the serial figure"
+                    print(f"{name:>14} {faces:>6} {len(figure.frames):>7} {workers:>8} {elapsed:>9.2f} "
+                          f"{len(figure.frames)/elapsed:>9.0f}")
+
+if __name__ == "__main__":
+    main()
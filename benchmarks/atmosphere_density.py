@@ -0,0 +1,79 @@
+'''
+Density lookups per second of the tabulated atmosphere against evaluating the
+exponential and layered models directly, for single altitudes as seen by the
+StateDot kernel and for stacks of altitudes as seen by StateDotBatch. The
+table error is measured away from the layer boundaries, where the layered
+model itself is discontinuous.
+Run from the repository root with
+    python -m benchmarks.atmosphere_density
+'''
+import bisect
+import math
+import time
+import yaml
+import numpy as np
+
+import Dynamics.atmosphere as atmosphere
+import Dynamics.body as body
+
+NUM_LOOKUPS = 200000
+NUM_ALTS    = 1000
+ALT_RANGE   = [100e3, 1000e3]
+
+def lookups_per_sec(fun, alts, repeats=1):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for alt in alts:
+            fun(alt)
+    return repeats*len(alts)/(time.perf_counter() - start)
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    rng             = np.random.default_rng(0)
+    alts            = rng.uniform(*ALT_RANGE, NUM_LOOKUPS)
+    alt_list        = alts.tolist()
+
+    rho0, scale_height  = central_body.rho0, central_body.scaleHeight
+    layers              = atmosphere.VALLADO_LAYERS
+    bases               = [layer[0] for layer in layers]
+
+    def exponential(alt):
+        return rho0*math.exp(-alt/scale_height)
+
+    def layered(alt):
+        base, rho, height = layers[max(bisect.bisect_right(bases, alt) - 1, 0)]
+        return rho*math.exp(-(alt - base)/height)
+
+    models = [("exponential", exponential, atmosphere.build(central_body, "exponential"),
+               lambda h: atmosphere.exponential_density(h, rho0, scale_height)),
+              ("layered", layered, atmosphere.build(central_body, "layered"),
+               lambda h: atmosphere.layered_density(h, layers))]
+
+    print(f"{'model':>12} {'direct [1/s]':>13} {'table [1/s]':>12} {'speedup':>8} "
+          f"{'batch direct':>13} {'batch table':>12} {'speedup':>8} {'max rel err':>12}")
+    for name, direct, atmos, direct_batch in models:
+        table       = atmos.table
+        t_direct    = lookups_per_sec(direct, alt_list)
+        t_table     = lookups_per_sec(table.density, alt_list)
+
+        stack       = alts[0:NUM_ALTS]
+        out         = np.empty(NUM_ALTS)
+        index       = np.empty(NUM_ALTS, dtype=np.intp)
+        scratch     = np.empty(NUM_ALTS)
+        repeats     = NUM_LOOKUPS//NUM_ALTS
+        b_direct    = lookups_per_sec(direct_batch, [stack], repeats)
+        b_table     = lookups_per_sec(lambda h: table.density_batch(h, out, index, scratch), [stack], repeats)
+
+        # Skip the grid intervals that hold a layer boundary
+        away        = np.all(np.abs(alts[:,None] - np.array(bases)[None,:]) > table.step, axis=1)
+        expected    = direct_batch(alts[away])
+        found       = table.density_batch(alts[away], np.empty(away.sum()), np.empty(away.sum(), dtype=np.intp),
+                                          np.empty(away.sum()))
+        max_err     = np.max(np.abs(found/expected - 1))
+        print(f"{name:>12} {t_direct:>13.0f} {t_table:>12.0f} {t_table/t_direct:>8.1f} "
+              f"{b_direct*NUM_ALTS:>13.0f} {b_table*NUM_ALTS:>12.0f} {b_table/b_direct:>8.1f} {max_err:>12.2e}")
+
+if __name__ == "__main__":
+    main()
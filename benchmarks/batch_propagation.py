@@ -0,0 +1,59 @@
+'''
+Wall time of the per-satellite and batched propagation paths of Simulator.tic
+against the number of satellites. Run from the repository root with
+    python -m benchmarks.batch_propagation
+'''
+import time
+import datetime
+import yaml
+import numpy as np
+
+import Core.simulator as sim
+import Dynamics.body as body
+import Vehicles.satellite as sat
+import utils.OEConvert as OEConvert
+
+VEHICLE     = "Config/Vehicles/dragon.yaml"
+T0          = datetime.datetime(2024, 4, 8, 18, 18, 0)
+NUM_STEPS   = 10
+SAT_COUNTS  = [1, 10, 50, 100, 200]
+
+def make_satellites(num_sats, central_body, rng):
+    sats = []
+    for _ in range(num_sats):
+        kep     = [central_body.radius + rng.uniform(400e3, 1200e3), rng.uniform(0, 0.02),
+                   rng.uniform(0, 98), rng.uniform(0, 360), rng.uniform(0, 360), rng.uniform(0, 360)]
+        quat    = rng.normal(size=4)
+        quat    = quat/np.linalg.norm(quat)
+        omega   = rng.normal(scale=0.01, size=3)
+        state   = np.hstack((OEConvert.position(kep, central_body.mu),
+                             OEConvert.velocity(kep, central_body.mu), quat, omega))
+        sats.append(sat.Satellite(T0, state, central_body, VEHICLE))
+    return sats
+
+def run(num_sats, batch, central_body):
+    rng         = np.random.default_rng(0)
+    sats        = make_satellites(num_sats, central_body, rng)
+    simulator   = sim.Simulator(central_body, T0, NUM_STEPS, 1, sats, None, batch)
+
+    start = time.perf_counter()
+    for i in range(NUM_STEPS):
+        simulator.t_now = simulator.time_array[i]
+        simulator.tic(simulator.t_now, simulator.t_now + simulator.dt)
+    elapsed = time.perf_counter() - start
+    return elapsed, np.array([s.get_state() for s in sats])
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body = body.Body("Earth", planet_conf["Earth"])
+
+    print(f"{'sats':>6} {'serial [s]':>12} {'batched [s]':>12} {'speedup':>8} {'max pos err [m]':>16}")
+    for num_sats in SAT_COUNTS:
+        t_serial, serial    = run(num_sats, False, central_body)
+        t_batch, batched    = run(num_sats, True, central_body)
+        pos_err             = np.max(np.linalg.norm(serial[:,0:3] - batched[:,0:3], axis=1))
+        print(f"{num_sats:>6} {t_serial:>12.3f} {t_batch:>12.3f} {t_serial/t_batch:>8.1f} {pos_err:>16.3e}")
+
+if __name__ == "__main__":
+    main()
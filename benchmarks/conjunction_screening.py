@@ -0,0 +1,78 @@
+'''
+Wall time of the close-approach screening against an all-pairs distance check
+at every sample, for a growing number of random low Earth orbits propagated
+over one hour. The all-pairs check only finds the sampled minima, the screened
+events are refined between samples, so every all-pairs event must also be found
+by the screening with an equal or smaller miss distance.
+Run from the repository root with
+    python -m benchmarks.conjunction_screening
+'''
+import time
+import yaml
+import numpy as np
+from scipy.spatial.distance import pdist
+
+import Core.conjunction as conjunction
+import Dynamics.body as body
+import Dynamics.kepler as kepler
+from benchmarks.kepler_propagation import make_states
+
+DURATION        = 3600
+SAMPLE_STEP     = 10
+SCREEN_STEP     = 60
+THRESHOLD       = 20e3
+SAT_COUNTS      = [100, 1000, 3000, 10000]
+MAX_BRUTE_SATS  = 3000
+
+def brute_force(states, threshold):
+    '''
+    Pairs whose sampled separation has a local minimum below the threshold
+    :return: set of (i, j, sample index)
+    '''
+    num_sats    = states.shape[1]
+    i, j        = np.triu_indices(num_sats, 1)
+    events      = set()
+    d_prev      = None
+    d_now       = pdist(states[0,:,0:3])
+    for n in range(len(states)):
+        d_next  = pdist(states[n+1,:,0:3]) if n+1 < len(states) else None
+        is_min  = d_now < threshold
+        if d_prev is not None:
+            is_min &= d_now <= d_prev
+        if d_next is not None:
+            is_min &= d_now <= d_next
+        for k in np.flatnonzero(is_min):
+            events.add((i[k], j[k], n))
+        d_prev, d_now = d_now, d_next
+    return events
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    times           = np.arange(0, DURATION + SAMPLE_STEP, SAMPLE_STEP, dtype=np.float64)
+
+    print(f"{'sats':>6} {'screen [s]':>11} {'all pairs [s]':>14} {'speedup':>8} {'events':>7} {'missed':>7}")
+    for num_sats in SAT_COUNTS:
+        states      = make_states(num_sats, central_body, np.random.default_rng(0))
+        states      = kepler.KeplerPropagator(states, central_body).propagate(times).transpose(1, 0, 2).copy()
+
+        start       = time.perf_counter()
+        result      = conjunction.screen(times, states, THRESHOLD, SCREEN_STEP, central_body.mu)
+        t_screen    = time.perf_counter() - start
+        num_events  = len(result["tca"])
+
+        if num_sats > MAX_BRUTE_SATS:
+            print(f"{num_sats:>6} {t_screen:>11.3f} {'-':>14} {'-':>8} {num_events:>7} {'-':>7}")
+            continue
+
+        start       = time.perf_counter()
+        events      = brute_force(states, THRESHOLD)
+        t_brute     = time.perf_counter() - start
+
+        found       = {(i, j) for i, j in result["pairs"]}
+        missed      = sum((i, j) not in found for i, j, _ in events)
+        print(f"{num_sats:>6} {t_screen:>11.3f} {t_brute:>14.3f} {t_brute/t_screen:>8.1f} {num_events:>7} {missed:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+'''
+Vectorized frame transforms in utils/attitude_ref against a Python loop of
+single-state calls. Every vectorized result is checked against the loop.
+Run from the repository root with
+    python -m benchmarks.frame_transforms
+'''
+import time
+import yaml
+import numpy as np
+import quaternion
+
+import Dynamics.body as body
+import utils.attitude_ref as att_ref
+
+NUM_SAMPLES = 20000
+
+def timed(fun):
+    start   = time.perf_counter()
+    result  = fun()
+    return time.perf_counter() - start, result
+
+def compare(name, vectorized, scalar, as_array=np.asarray):
+    t_vec, vec_result   = timed(vectorized)
+    t_loop, loop_result = timed(scalar)
+    assert np.allclose(as_array(vec_result), as_array(loop_result), rtol=1e-10, atol=1e-6), name
+    print(f"{name:<18} {t_loop:>10.4f} {t_vec:>10.4f} {t_loop/t_vec:>9.0f}x")
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    planet  = body.Body("Earth", planet_conf["Earth"])
+    rng     = np.random.default_rng(0)
+    mu      = planet.mu
+
+    pos     = rng.normal(size=(NUM_SAMPLES, 3))
+    pos     = rng.uniform(6800e3, 8000e3, size=(NUM_SAMPLES, 1))*pos/np.linalg.norm(pos, axis=1)[:,None]
+    vel     = np.cross(rng.normal(size=(NUM_SAMPLES, 3)), pos)
+    vel     = 7.5e3*vel/np.linalg.norm(vel, axis=1)[:,None]
+    states  = np.hstack((pos, vel))
+    days    = 8864 + np.arange(NUM_SAMPLES)/86400
+    lla     = np.column_stack((rng.uniform(-89, 89, NUM_SAMPLES), rng.uniform(-180, 180, NUM_SAMPLES),
+                               rng.uniform(0, 1000e3, NUM_SAMPLES)))
+    pcpf    = att_ref.pci2pcpf(states, planet, days)
+    quats   = lambda q: quaternion.as_float_array(np.asarray([q_i for q_i, _ in q] if isinstance(q, list) else q[0]))
+
+    print(f"{NUM_SAMPLES} samples")
+    print(f"{'transform':<18} {'loop [s]':>10} {'array [s]':>10} {'speedup':>10}")
+    compare("pci2pcpf", lambda: att_ref.pci2pcpf(states, planet, days),
+            lambda: [att_ref.pci2pcpf(s, planet, d) for s, d in zip(states, days)])
+    compare("pcpf2pci", lambda: att_ref.pcpf2pci(pcpf, planet, days),
+            lambda: [att_ref.pcpf2pci(s, planet, d) for s, d in zip(pcpf, days)])
+    compare("pcpf2lla", lambda: att_ref.pcpf2lla(pcpf, planet),
+            lambda: [att_ref.pcpf2lla(s, planet) for s in pcpf])
+    compare("lla2pcpf", lambda: att_ref.lla2pcpf(lla, planet),
+            lambda: [att_ref.lla2pcpf(s, planet) for s in lla])
+    compare("get_hill_to_pci", lambda: att_ref.get_hill_to_pci(states, mu),
+            lambda: [att_ref.get_hill_to_pci(s, mu) for s in states], quats)
+    compare("get_lvlh_to_pci", lambda: att_ref.get_lvlh_to_pci(states, mu),
+            lambda: [att_ref.get_lvlh_to_pci(s, mu) for s in states], quats)
+
+if __name__ == "__main__":
+    main()
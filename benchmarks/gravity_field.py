@@ -0,0 +1,78 @@
+'''
+Cost of the spherical harmonic gravity field against its degree, for one
+position at a time as seen by the StateDot kernel and for stacks of positions
+as seen by StateDotBatch, next to the point mass and J2 terms it replaces. The
+coefficients past degree 4 are random, scaled by Kaula's rule 1e-5/n^2, since
+the cost does not depend on their values. The setup column is the one-off
+cost of the recursion coefficients and normalization ratios.
+Run from the repository root with
+    python -m benchmarks.gravity_field
+'''
+import time
+import yaml
+import numpy as np
+
+import Dynamics.body as body
+import Dynamics.gravity as gravity
+import Dynamics.propagation as prop
+
+COEF_FILE   = "Config/Gravity/EGM96_4.gfc"
+DEGREES     = [2, 8, 20, 70]
+STACK_SIZES = [100, 1000]
+NUM_EVALS   = 200
+
+def kaula_coefficients(degree, rng):
+    C, S, mu, radius = gravity.read_coefficients(COEF_FILE, 4, 4)
+    C_full  = np.tril(rng.normal(size=(degree+1, degree+1)))
+    S_full  = np.tril(rng.normal(size=(degree+1, degree+1)))
+    scale   = 1e-5/np.maximum(np.arange(degree+1), 1)**2
+    C_full *= scale[:,None]
+    S_full *= scale[:,None]
+    S_full[:,0] = 0
+    low     = min(degree, 4) + 1
+    C_full[:low,:low] = C[:low,:low]
+    S_full[:low,:low] = S[:low,:low]
+    return C_full, S_full, mu, radius
+
+def seconds_per_call(fun, num_evals):
+    fun()
+    start = time.perf_counter()
+    for _ in range(num_evals):
+        fun()
+    return (time.perf_counter() - start)/num_evals
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    rng             = np.random.default_rng(0)
+
+    positions       = rng.normal(size=(max(STACK_SIZES), 3))
+    positions      *= (central_body.radius + rng.uniform(300e3, 2000e3, len(positions)))[:,None] \
+                      /np.linalg.norm(positions, axis=1)[:,None]
+    out             = np.empty_like(positions)
+
+    def point_mass_J2(pos):
+        return (prop.gravity_batch(pos, central_body.mu)
+                + prop.J2_perturbation_batch(pos, central_body.mu, central_body.radius, central_body.J2))
+
+    single  = seconds_per_call(lambda: point_mass_J2(positions[0:1]), NUM_EVALS)
+    stacks  = [seconds_per_call(lambda: point_mass_J2(positions[:size]), NUM_EVALS)/size for size in STACK_SIZES]
+    print(f"{'degree':>8} {'setup [ms]':>11} {'single [us]':>12}"
+          + "".join(f" {f'{size} [us/pos]':>15}" for size in STACK_SIZES))
+    print(f"{'J2':>8} {'-':>11} {single*1e6:>12.1f}" + "".join(f" {stack*1e6:>15.2f}" for stack in stacks))
+
+    for degree in DEGREES:
+        C, S, mu, radius = kaula_coefficients(degree, rng)
+        start   = time.perf_counter()
+        field   = gravity.SphericalHarmonics(C, S, mu, radius, central_body, degree, degree)
+        setup   = time.perf_counter() - start
+
+        single  = seconds_per_call(lambda: field(0.0, positions[0:1], out[0:1]), NUM_EVALS)
+        stacks  = [seconds_per_call(lambda: field(0.0, positions[:size], out[:size]), max(NUM_EVALS*10//size, 2))/size
+                   for size in STACK_SIZES]
+        print(f"{degree:>8} {setup*1e3:>11.2f} {single*1e6:>12.1f}"
+              + "".join(f" {stack*1e6:>15.2f}" for stack in stacks))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+'''
+Wall time of the ground station access computation for a growing number of
+randomly placed stations, for one satellite over one day. Rise and set times
+found from coarsely sampled runs are compared with those from a 1 s run.
+Run from the repository root with
+    python -m benchmarks.ground_access
+'''
+import time
+import datetime
+import yaml
+import numpy as np
+
+import Core.access as access
+import Core.simulator as sim
+import Dynamics.body as body
+import Vehicles.satellite as sat
+import utils.OEConvert as OEConvert
+
+VEHICLE         = "Config/Vehicles/dragon.yaml"
+T0              = datetime.datetime(2024, 4, 8, 18, 18, 0)
+TF              = 86400
+MASK            = 10
+STATION_COUNTS  = [10, 100, 500, 1000]
+SAMPLE_STEPS    = [10, 60]
+REFERENCE_STEP  = 1
+
+def make_stations(num_stations, rng):
+    lat     = np.degrees(np.arcsin(rng.uniform(-1, 1, num_stations)))
+    lon     = rng.uniform(-180, 180, num_stations)
+    alt     = rng.uniform(0, 2000, num_stations)
+    return {f"station_{i:04d}": [float(lat[i]), float(lon[i]), float(alt[i])] for i in range(num_stations)}
+
+def run(central_body, dt):
+    kep         = [central_body.radius + 550e3, 0.001, 53, 30, 0, 0]
+    state       = np.hstack((OEConvert.position(kep, central_body.mu), OEConvert.velocity(kep, central_body.mu),
+                             [1, 0, 0, 0], [0, 0, 0]))
+    satellite   = sat.Satellite(T0, state, central_body, VEHICLE)
+    satellite.set_propagator("kepler", j2_secular=False, hold_attitude=True)
+    simulator   = sim.Simulator(central_body, T0, TF, dt, [satellite], None)
+    simulator.show_progress = False
+    simulator.run()
+    return simulator
+
+def edge_errors(windows, reference):
+    '''
+    Rise and set differences of the windows matched to a reference window of the
+    same station, and the number of windows left unmatched. Windows grazing the
+    mask can appear in one run and not the other
+    '''
+    by_station  = {}
+    for window in reference:
+        by_station.setdefault(window["station"], []).append(window)
+
+    errors      = []
+    for window in windows:
+        matches = [ref for ref in by_station.get(window["station"], []) if ref["rise"] < window["set"]
+                   and window["rise"] < ref["set"]]
+        if len(matches) == 1:
+            errors.append(max(abs(window["rise"] - matches[0]["rise"]), abs(window["set"] - matches[0]["set"])))
+    return np.array(errors), len(windows) + len(reference) - 2*len(errors)
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    runs            = {dt: run(central_body, dt) for dt in [REFERENCE_STEP] + SAMPLE_STEPS}
+
+    print(f"{'stations':>8} {'step [s]':>9} {'time [s]':>9} {'windows':>8} {'max edge err [s]':>17} {'unmatched':>10}")
+    for num_stations in STATION_COUNTS:
+        ground_access   = access.Access(make_stations(num_stations, np.random.default_rng(0)), MASK)
+        reference       = ground_access.run(runs[REFERENCE_STEP])
+        for dt in SAMPLE_STEPS:
+            start       = time.perf_counter()
+            windows     = ground_access.run(runs[dt])
+            elapsed     = time.perf_counter() - start
+
+            errors, unmatched = edge_errors(windows, reference)
+            print(f"{num_stations:>8} {dt:>9} {elapsed:>9.3f} {len(windows):>8} {np.max(errors):>17.2e} {unmatched:>10}")
+
+if __name__ == "__main__":
+    main()
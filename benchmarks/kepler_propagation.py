@@ -0,0 +1,64 @@
+'''
+Wall time of the analytic Kepler propagation against solve_ivp for a growing
+number of satellites, each propagated over one day on a 60 s output grid.
+Run from the repository root with
+    python -m benchmarks.kepler_propagation
+'''
+import time
+import yaml
+import numpy as np
+from scipy.integrate import solve_ivp
+
+import Dynamics.body as body
+import Dynamics.kepler as kepler
+import Dynamics.propagation as prop
+import utils.OEConvert as OEConvert
+
+DURATION        = 86400
+OUTPUT_STEP     = 60
+SAT_COUNTS      = [1, 10, 100, 1000, 10000]
+MAX_IVP_SATS    = 100
+
+def make_states(num_sats, central_body, rng):
+    kep = np.stack([central_body.radius + rng.uniform(400e3, 1200e3, num_sats), rng.uniform(0, 0.02, num_sats),
+                    rng.uniform(0, 98, num_sats), rng.uniform(0, 360, num_sats),
+                    rng.uniform(0, 360, num_sats), rng.uniform(0, 360, num_sats)], axis=-1)
+    return np.hstack((OEConvert.position(kep, central_body.mu), OEConvert.velocity(kep, central_body.mu)))
+
+def run_ivp(states, times, mu):
+    def two_body(t, y):
+        return np.hstack((y[3:6], prop.gravity(y[0:3], mu)))
+
+    result = []
+    for state in states:
+        sol = solve_ivp(two_body, t_span=[times[0], times[-1]], y0=state, t_eval=times, method='RK45',
+                        rtol=1e-10, atol=1e-6)
+        result.append(sol.y.T)
+    return np.array(result)
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    times           = np.arange(0, DURATION + OUTPUT_STEP, OUTPUT_STEP)
+
+    print(f"{'sats':>6} {'kepler [s]':>12} {'solve_ivp [s]':>14} {'speedup':>8} {'max pos err [m]':>16}")
+    for num_sats in SAT_COUNTS:
+        states      = make_states(num_sats, central_body, np.random.default_rng(0))
+
+        start       = time.perf_counter()
+        analytic    = kepler.KeplerPropagator(states, central_body).propagate(times)
+        t_kepler    = time.perf_counter() - start
+
+        if num_sats > MAX_IVP_SATS:
+            print(f"{num_sats:>6} {t_kepler:>12.3f} {'-':>14} {'-':>8} {'-':>16}")
+            continue
+
+        start       = time.perf_counter()
+        numeric     = run_ivp(states, times, central_body.mu)
+        t_ivp       = time.perf_counter() - start
+        pos_err     = np.max(np.linalg.norm(analytic[...,0:3] - numeric[...,0:3], axis=-1))
+        print(f"{num_sats:>6} {t_kepler:>12.3f} {t_ivp:>14.3f} {t_ivp/t_kepler:>8.0f} {pos_err:>16.3e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+'''
+Accuracy and wall time of the multi-rate orbit/attitude integration against the
+coupled 13-state integration, for tumbling satellites under attitude control.
+Errors are measured against a tight-tolerance coupled RK78 run. Small fleets
+are stepped one satellite at a time, large ones as stacked systems.
+Run from the repository root with
+    python -m benchmarks.multirate
+'''
+import time
+import datetime
+import yaml
+import numpy as np
+import quaternion
+
+import Core.simulator as sim
+import Dynamics.body as body
+import Dynamics.integrators as integrators
+import Dynamics.multirate as multirate
+import Vehicles.satellite as sat
+import utils.OEConvert as OEConvert
+
+VEHICLE     = "Config/Vehicles/dragon.yaml"
+T0          = datetime.datetime(2024, 4, 8, 18, 18, 0)
+TF          = 900
+DT          = 1
+
+# Number of satellites and whether they are propagated as one stacked system
+FLEETS      = [(4, False), (64, True)]
+
+# Name, integrator, multi-rate settings (orbit_step, attitude_step, orbit_method)
+CASES = [("coupled RK45 (solve_ivp)",       None,                               None),
+         ("coupled RK78",                   integrators.RK78(DT, 1e-8, 1e-6),   None),
+         ("coupled RK4 0.5 s",              integrators.RK4(0.5),               None),
+         ("coupled RK4 0.1 s",              integrators.RK4(0.1),               None),
+         ("multirate RK4 30 s / 0.5 s",     None,                               (30, 0.5, "RK4")),
+         ("multirate RK4 30 s / 0.1 s",     None,                               (30, 0.1, "RK4")),
+         ("multirate RK78 60 s / 0.1 s",    None,                               (60, 0.1, "RK78"))]
+
+def make_satellites(num_sats, central_body):
+    rng     = np.random.default_rng(0)
+    sats    = []
+    for _ in range(num_sats):
+        kep     = [central_body.radius + rng.uniform(400e3, 800e3), rng.uniform(0, 0.01),
+                   rng.uniform(0, 98), rng.uniform(0, 360), rng.uniform(0, 360), rng.uniform(0, 360)]
+        quat    = rng.normal(size=4)
+        quat    = quat/np.linalg.norm(quat)
+        omega   = rng.normal(scale=0.05, size=3)
+        state   = np.hstack((OEConvert.position(kep, central_body.mu),
+                             OEConvert.velocity(kep, central_body.mu), quat, omega))
+        sats.append(sat.Satellite(T0, state, central_body, VEHICLE))
+    return sats
+
+def run(central_body, num_sats, batch, integrator, rates):
+    rates       = multirate.MultiRate(*rates) if rates is not None else None
+    simulator   = sim.Simulator(central_body, T0, TF, DT, make_satellites(num_sats, central_body), None, batch,
+                                integrator=integrator, multirate=rates)
+    simulator.show_progress = False
+
+    start = time.perf_counter()
+    simulator.run()
+    elapsed = time.perf_counter() - start
+    return elapsed, np.array([s.state_history for s in simulator.satellites])
+
+def attitude_error(q_a, q_b):
+    dq = quaternion.as_float_array(quaternion.as_quat_array(q_a) * np.conjugate(quaternion.as_quat_array(q_b)))
+    return np.degrees(2*np.arctan2(np.linalg.norm(dq[...,1:4], axis=-1), np.abs(dq[...,0])))
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+
+    for num_sats, batch in FLEETS:
+        _, reference = run(central_body, num_sats, False, integrators.RK78(DT, 1e-12, 1e-9), None)
+
+        print(f"\n{num_sats} satellites, {'batched' if batch else 'one at a time'}")
+        print(f"{'case':<30} {'time [s]':>9} {'max pos err [m]':>16} {'max att err [deg]':>18}")
+        for name, integrator, rates in CASES:
+            if batch and integrator is None and rates is None:
+                # solve_ivp on the stacked system is limited by its slowest satellite
+                continue
+            elapsed, states = run(central_body, num_sats, batch, integrator, rates)
+            pos_err         = np.max(np.linalg.norm(states[...,0:3] - reference[...,0:3], axis=-1))
+            att_err         = np.max(attitude_error(states[...,6:10], reference[...,6:10]))
+            print(f"{name:<30} {elapsed:>9.2f} {pos_err:>16.3e} {att_err:>18.3e}")
+
+if __name__ == "__main__":
+    main()
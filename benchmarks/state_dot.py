@@ -0,0 +1,73 @@
+'''
+Evaluations per second of the state derivative: the original state_dot, the
+per-vehicle StateDot kernel and the StateDotBatch kernel. Run from the
+repository root with
+    python -m benchmarks.state_dot
+'''
+import time
+import yaml
+import numpy as np
+
+import Dynamics.body as body
+import Dynamics.propagation as prop
+
+NUM_EVALS   = 20000
+NUM_SATS    = 200
+
+def random_states(num_sats, rng):
+    pos     = rng.normal(size=(num_sats, 3))
+    pos     = 7000e3*pos/np.linalg.norm(pos, axis=1)[:,None]
+    vel     = rng.normal(scale=5e3, size=(num_sats, 3))
+    quat    = rng.normal(size=(num_sats, 4))
+    quat    = quat/np.linalg.norm(quat, axis=1)[:,None]
+    omega   = rng.normal(scale=0.01, size=(num_sats, 3))
+    return np.hstack((pos, vel, quat, omega))
+
+def evals_per_sec(fun, num_evals):
+    start = time.perf_counter()
+    for _ in range(num_evals):
+        fun()
+    return num_evals/(time.perf_counter() - start)
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    rng             = np.random.default_rng(0)
+
+    mass    = 100.0
+    J       = np.diag([100.0, 50.0, 25.0])
+    states  = random_states(NUM_SATS, rng)
+    T_body  = rng.normal(size=(NUM_SATS, 3))
+    L_body  = rng.normal(size=(NUM_SATS, 3))
+    Js      = np.repeat(J[None,:,:], NUM_SATS, axis=0)
+    masses  = np.full(NUM_SATS, mass)
+
+    # Both kernels have to agree with the original right hand side
+    kernel      = prop.StateDot(mass, J, central_body)
+    batch       = prop.StateDotBatch(masses, Js, central_body)
+    out         = np.empty(13)
+    batch_out   = np.empty(13*NUM_SATS)
+    batch(0, states.ravel(), batch_out, T_body, L_body)
+    batch_out   = batch_out.reshape(NUM_SATS, 13)
+    for i in range(NUM_SATS):
+        expected = prop.state_dot(0, states[i], mass, J, T_body[i], L_body[i], central_body)
+        kernel(0, states[i], out, T_body[i], L_body[i])
+        assert np.allclose(out, expected, rtol=1e-12, atol=1e-15)
+        assert np.allclose(batch_out[i], expected, rtol=1e-12, atol=1e-15)
+
+    state       = states[0]
+    old_rate    = evals_per_sec(lambda: prop.state_dot(0, state, mass, J, T_body[0], L_body[0], central_body), NUM_EVALS)
+    new_rate    = evals_per_sec(lambda: kernel(0, state, out, T_body[0], L_body[0]), NUM_EVALS)
+    print(f"state_dot           {old_rate:>12.0f} evals/s")
+    print(f"StateDot            {new_rate:>12.0f} evals/s  ({new_rate/old_rate:.1f}x)")
+
+    flat        = states.ravel()
+    flat_out    = np.empty_like(flat)
+    vec_rate    = evals_per_sec(lambda: prop.state_dot_batch(0, flat, masses, Js, T_body, L_body, central_body), NUM_EVALS//10)
+    batch_rate  = evals_per_sec(lambda: batch(0, flat, flat_out, T_body, L_body), NUM_EVALS//10)
+    print(f"state_dot_batch     {vec_rate*NUM_SATS:>12.0f} sat-evals/s ({NUM_SATS} sats)")
+    print(f"StateDotBatch       {batch_rate*NUM_SATS:>12.0f} sat-evals/s  ({batch_rate/vec_rate:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+'''
+Cost of one Sun or Moon position from the Chebyshev fit against evaluating the
+analytic series it was fitted to, as done once per time by the third body
+terms, and the largest difference between the two over the span. The fit
+column is the one-off cost of fitting the span, the cached column the cost of
+reading the same fit back from disk.
+Run from the repository root with
+    python -m benchmarks.third_body
+'''
+import shutil
+import tempfile
+import time
+import yaml
+import numpy as np
+
+import Dynamics.body as body
+import Dynamics.ephemeris as ephemeris
+
+EPOCH       = 8864.0    # days since J2000
+SPAN        = 30.0      # days
+NUM_EVALS   = 20000
+
+def seconds_per_call(fun, days):
+    start = time.perf_counter()
+    for day in days:
+        fun(day)
+    return (time.perf_counter() - start)/len(days)
+
+def main():
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    central_body    = body.Body("Earth", planet_conf["Earth"])
+    rng             = np.random.default_rng(0)
+    days            = rng.uniform(EPOCH, EPOCH + SPAN, NUM_EVALS)
+    day_list        = days.tolist()
+    cache_dir       = tempfile.mkdtemp()
+
+    print(f"{'body':>6} {'fit [ms]':>9} {'cached [ms]':>12} {'series [us]':>12} {'chebyshev [us]':>15} "
+          f"{'speedup':>8} {'max err [m]':>12}")
+    try:
+        for name, position in ephemeris.POSITIONS.items():
+            start       = time.perf_counter()
+            fitted      = ephemeris.ChebyshevEphemeris(name, central_body, EPOCH, EPOCH + SPAN, cache_dir)
+            t_fit       = time.perf_counter() - start
+            start       = time.perf_counter()
+            ephemeris.ChebyshevEphemeris(name, central_body, EPOCH, EPOCH + SPAN, cache_dir)
+            t_cached    = time.perf_counter() - start
+
+            t_series    = seconds_per_call(lambda day: position(central_body, day), day_list)
+            t_cheb      = seconds_per_call(fitted.position, day_list)
+            found       = np.array([fitted.position(day) for day in day_list])
+            max_err     = np.max(np.linalg.norm(found - position(central_body, days), axis=1))
+            print(f"{name:>6} {t_fit*1e3:>9.2f} {t_cached*1e3:>12.2f} {t_series*1e6:>12.1f} {t_cheb*1e6:>15.1f} "
+                  f"{t_series/t_cheb:>8.1f} {max_err:>12.2e}")
+    finally:
+        shutil.rmtree(cache_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import Core.montecarlo as montecarlo
+
+if __name__ == "__main__":
+    mc      = montecarlo.MonteCarlo("Config/dispersion.yaml")
+    results = mc.run()
+    mc.report(results)
\ No newline at end of file
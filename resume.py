@@ -0,0 +1,4 @@
+import utils.loader as loader
+
+simulator = loader.resume_sim("Config/sim.yaml")
+simulator.run()
\ No newline at end of file
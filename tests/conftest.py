@@ -0,0 +1,22 @@
+'''
+Shared fixtures. The modules read their configuration through paths relative to
+the repository root, so every test runs from there.
+'''
+import os
+import yaml
+import pytest
+
+import Dynamics.body as body
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    return ROOT
+
+@pytest.fixture
+def earth(repo_root):
+    with open("Config/planets.yaml", 'r') as planet_file:
+        planet_conf = yaml.safe_load(planet_file)
+    return body.Body("Earth", planet_conf["Earth"])
@@ -0,0 +1,114 @@
+'''
+Stacked states and epochs through utils/attitude_ref against the same
+transforms called one state at a time.
+'''
+import numpy as np
+import quaternion
+import pytest
+
+import utils.attitude_ref as att_ref
+
+NUM_SAMPLES = 200
+
+@pytest.fixture
+def samples(earth):
+    rng     = np.random.default_rng(0)
+    pos     = rng.normal(size=(NUM_SAMPLES, 3))
+    pos     = rng.uniform(6800e3, 8000e3, size=(NUM_SAMPLES, 1))*pos/np.linalg.norm(pos, axis=1)[:,None]
+    vel     = np.cross(rng.normal(size=(NUM_SAMPLES, 3)), pos)
+    vel     = 7.5e3*vel/np.linalg.norm(vel, axis=1)[:,None]
+    states  = np.hstack((pos, vel))
+    days    = 8864 + rng.uniform(0, 30, NUM_SAMPLES)
+    lla     = np.column_stack((rng.uniform(-89, 89, NUM_SAMPLES), rng.uniform(-180, 180, NUM_SAMPLES),
+                               rng.uniform(0, 1000e3, NUM_SAMPLES)))
+    return states, days, lla
+
+def as_floats(q):
+    return quaternion.as_float_array(q)
+
+def same_rotation(q_a, q_b):
+    '''
+    Quaternions q and -q are the same rotation
+    '''
+    dot = np.abs(np.sum(as_floats(q_a)*as_floats(q_b), axis=-1))
+    return np.allclose(dot, 1, atol=1e-12)
+
+def test_pci2pcpf_stacked(earth, samples):
+    states, days, _ = samples
+    stacked         = att_ref.pci2pcpf(states, earth, days)
+    single          = np.array([att_ref.pci2pcpf(s, earth, d) for s, d in zip(states, days)])
+    assert stacked.shape == states.shape
+    np.testing.assert_allclose(stacked, single, rtol=1e-12, atol=1e-6)
+
+def test_pcpf2pci_stacked(earth, samples):
+    states, days, _ = samples
+    stacked         = att_ref.pcpf2pci(states, earth, days)
+    single          = np.array([att_ref.pcpf2pci(s, earth, d) for s, d in zip(states, days)])
+    assert stacked.shape == states.shape
+    np.testing.assert_allclose(stacked, single, rtol=1e-12, atol=1e-6)
+
+def test_pcpf2lla_stacked(earth, samples):
+    states, _, _    = samples
+    stacked         = att_ref.pcpf2lla(states, earth)
+    single          = np.array([att_ref.pcpf2lla(s, earth) for s in states])
+    assert stacked.shape == (NUM_SAMPLES, 3)
+    np.testing.assert_allclose(stacked, single, rtol=1e-12, atol=1e-6)
+
+def test_lla2pcpf_stacked(earth, samples):
+    _, _, lla   = samples
+    stacked     = att_ref.lla2pcpf(lla, earth)
+    single      = np.array([att_ref.lla2pcpf(s, earth) for s in lla])
+    assert stacked.shape == (NUM_SAMPLES, 3)
+    np.testing.assert_allclose(stacked, single, rtol=1e-12, atol=1e-6)
+
+@pytest.mark.parametrize("transform", [att_ref.get_hill_to_pci, att_ref.get_lvlh_to_pci])
+def test_frame_to_pci_stacked(earth, samples, transform):
+    states, _, _            = samples
+    q_stacked, w_stacked    = transform(states, earth.mu)
+    assert q_stacked.shape == (NUM_SAMPLES,)
+    assert w_stacked.shape == (NUM_SAMPLES, 3)
+    for state, q, w in zip(states, q_stacked, w_stacked):
+        q_single, w_single = transform(state, earth.mu)
+        assert same_rotation(q, q_single)
+        np.testing.assert_allclose(w, w_single, rtol=1e-12)
+
+def test_single_state_shapes(earth, samples):
+    states, days, lla   = samples
+    state, day          = states[0], days[0]
+
+    assert att_ref.pci2pcpf(state, earth, day).shape == (6,)
+    assert att_ref.pcpf2pci(state, earth, day).shape == (6,)
+    assert att_ref.pcpf2lla(state, earth).shape == (3,)
+    assert att_ref.lla2pcpf(lla[0], earth).shape == (3,)
+
+    q_pcpf, omega = att_ref.get_pci_to_pcpf(earth, day)
+    assert isinstance(q_pcpf, quaternion.quaternion)
+    assert omega.shape == (3,)
+    for transform in (att_ref.get_hill_to_pci, att_ref.get_lvlh_to_pci):
+        q_frame, omega = transform(state, earth.mu)
+        assert isinstance(q_frame, quaternion.quaternion)
+        assert omega.shape == (3,)
+
+def test_lla_round_trip(earth, samples):
+    '''
+    The closed form geodetic solution is good to about a millimetre in position
+    and a few centimetres of latitude near the poles
+    '''
+    states, _, lla  = samples
+    np.testing.assert_allclose(att_ref.lla2pcpf(att_ref.pcpf2lla(states, earth), earth), states[:,0:3],
+                               rtol=0, atol=1e-2)
+    back            = att_ref.pcpf2lla(att_ref.lla2pcpf(lla, earth), earth)
+    np.testing.assert_allclose(back[:,0:2], lla[:,0:2], rtol=0, atol=1e-6)
+    np.testing.assert_allclose(back[:,2], lla[:,2], rtol=0, atol=1e-6)
+
+def test_pci_pcpf_round_trip(earth, samples):
+    states, days, _ = samples
+    back            = att_ref.pcpf2pci(att_ref.pci2pcpf(states, earth, days), earth, days)
+    np.testing.assert_allclose(back, states, rtol=1e-12, atol=1e-6)
+    assert np.allclose(att_ref.pcpf2pci(att_ref.pci2pcpf(states[0], earth, days[0]), earth, days[0]), states[0])
+
+def test_inertial_to_lvlh_inverts_lvlh_to_pci(earth, samples):
+    states, _, _    = samples
+    q_lvlh_to_pci, _ = att_ref.get_lvlh_to_pci(states, earth.mu)
+    q_target        = quaternion.as_quat_array(att_ref.get_inertial_to_lvlh(states))
+    assert same_rotation(q_target, np.conjugate(q_lvlh_to_pci))
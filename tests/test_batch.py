@@ -0,0 +1,43 @@
+'''
+Satellites propagated as one stacked system against the per-satellite path.
+'''
+import datetime
+import numpy as np
+import pytest
+
+import Core.simulator as sim
+import Dynamics.integrators as integrators
+import Vehicles.satellite as sat
+import utils.OEConvert as OEConvert
+
+VEHICLE     = "Config/Vehicles/dragon.yaml"
+T0          = datetime.datetime(2024, 4, 8, 18, 18, 0)
+TF          = 60
+NUM_SATS    = 5
+
+def run(central_body, batch, integrator):
+    rng     = np.random.default_rng(0)
+    sats    = []
+    for _ in range(NUM_SATS):
+        kep     = [central_body.radius + rng.uniform(400e3, 1200e3), rng.uniform(0, 0.02),
+                   rng.uniform(0, 98), rng.uniform(0, 360), rng.uniform(0, 360), rng.uniform(0, 360)]
+        quat    = rng.normal(size=4)
+        quat    = quat/np.linalg.norm(quat)
+        state   = np.hstack((OEConvert.keplerian_to_cartesian(kep, central_body.mu), quat,
+                             rng.normal(scale=0.01, size=3)))
+        sats.append(sat.Satellite(T0, state, central_body, VEHICLE))
+
+    simulator = sim.Simulator(central_body, T0, TF, 1, sats, None, batch, integrator)
+    simulator.show_progress = False
+    simulator.run()
+    return np.array([s.state_history for s in sats])
+
+@pytest.mark.parametrize("method", ["RK45", "RK4", "RK78"])
+def test_batch_matches_per_satellite(earth, method):
+    # The adaptive methods choose their steps from the stacked error, so they only agree to rounding
+    serial  = run(earth, False, integrators.create(method, 1))
+    batched = run(earth, True, integrators.create(method, 1))
+    assert serial.shape == batched.shape
+    np.testing.assert_allclose(batched[...,0:3], serial[...,0:3], rtol=0, atol=1e-6)
+    np.testing.assert_allclose(batched[...,3:6], serial[...,3:6], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(batched[...,6:13], serial[...,6:13], rtol=0, atol=1e-8)
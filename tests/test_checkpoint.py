@@ -0,0 +1,108 @@
+'''
+Runs interrupted after a checkpoint and resumed against the same run made in
+one go, and the saved columns read back through output.load.
+'''
+import datetime
+import numpy as np
+import pytest
+
+import Core.output as output
+import utils.loader as loader
+
+T0  = datetime.datetime(2024, 4, 8, 18, 18, 0)
+
+class Interrupted(Exception):
+    pass
+
+def sim_config(save_loc, checkpoint=0, **sim_props):
+    satellite = {"vehicle_conf"         : "Config/Vehicles/dragon.yaml",
+                 "q_body_to_inertial"   : [1, 0, 0, 0],
+                 "omega_body"           : [0.01, -0.02, 0.005]}
+    return {"sim"           : {"central_body"   : "Earth",
+                               "t0"             : T0,
+                               "tf"             : 120,
+                               "dt"             : 1,
+                               "save_loc"       : str(save_loc),
+                               "save_file"      : "sim",
+                               "checkpoint"     : checkpoint,
+                               "integrator"     : {"method": "RK4", "step": 1},
+                               **sim_props},
+            "satellites"    : {"numeric"    : {**satellite,
+                                               "keplerian": {"alt": 423000, "ecc": 0.001, "inc": 51.6,
+                                                             "lan": 10, "argp": 20, "TA": 30}},
+                               "kepler"     : {**satellite,
+                                               "cartesian": {"r": [7000e3, 0, 0], "v": [0, 5000, 5500]},
+                                               "propagator": {"method": "kepler", "j2": True}}},
+            "constellations": {"shell"      : {"vehicle_conf": "Config/Vehicles/dragon.yaml", "total": 4,
+                                               "planes": 2, "phasing": 1, "alt": 550000, "inc": 53}}}
+
+def run(config):
+    simulator = loader.build_sim(config, verbose=False)
+    simulator.run()
+    return output.load(simulator.save_file)
+
+def interrupt_and_resume(config, t_stop):
+    '''
+    Stops a run at t_stop, after its last checkpoint, then resumes it in a new simulator
+    '''
+    simulator   = loader.build_sim(config, verbose=False)
+    tic         = simulator.tic
+    def tic_until(t_now, t_next):
+        if t_now >= t_stop:
+            raise Interrupted
+        tic(t_now, t_next)
+    simulator.tic = tic_until
+    with pytest.raises(Interrupted):
+        simulator.run()
+
+    resumed     = loader.build_sim(config, verbose=False)
+    resumed.restore()
+    assert 0 < resumed.start_index <= t_stop
+    resumed.run()
+    return output.load(resumed.save_file)
+
+def assert_same_columns(found, expected):
+    assert [sat.name for sat in found.satellites] == [sat.name for sat in expected.satellites]
+    for found_sat, expected_sat in zip(found.satellites, expected.satellites):
+        for column in output.COLUMNS.keys():
+            np.testing.assert_array_equal(getattr(found_sat, column), getattr(expected_sat, column),
+                                          err_msg=f"{found_sat.name} {column}")
+
+@pytest.mark.parametrize("sim_props", [{},
+                                       {"batch": True},
+                                       {"integrator": {"method": "RK78", "step": 10}},
+                                       {"multirate": {"enabled": True, "orbit_step": 30, "attitude_step": 0.5}}],
+                         ids=["single", "batch", "rk78", "multirate"])
+def test_resume_matches_straight_run(tmp_path, sim_props):
+    # Resumes from the 100 s checkpoint, inside the 90-120 s multi-rate orbit step
+    straight    = run(sim_config(tmp_path/"straight", **sim_props))
+    resumed     = interrupt_and_resume(sim_config(tmp_path/"resumed", checkpoint=50, **sim_props), 110)
+    assert_same_columns(resumed, straight)
+
+def test_load_round_trip(tmp_path):
+    config      = sim_config(tmp_path)
+    simulator   = loader.build_sim(config, verbose=False)
+    simulator.run()
+    saved       = output.load(simulator.save_file)
+
+    assert saved.tf == simulator.tf and saved.dt == simulator.dt
+    assert saved.central_body.name == simulator.central_body.name
+    assert len(saved.satellites) == len(simulator.satellites)
+    for saved_sat, sat in zip(saved.satellites, simulator.satellites):
+        assert saved_sat.name == sat.name
+        assert saved_sat.mass == sat.mass
+        np.testing.assert_array_equal(saved_sat.J, sat.J)
+        for column in output.COLUMNS.keys():
+            data = getattr(saved_sat, column)
+            # Columns are memory mapped rather than read into memory
+            assert isinstance(data, np.memmap)
+            np.testing.assert_array_equal(data, getattr(sat, column), err_msg=f"{sat.name} {column}")
+
+def test_load_refuses_pickles(tmp_path):
+    simulator   = loader.build_sim(sim_config(tmp_path), verbose=False)
+    simulator.run()
+    saved       = output.load(simulator.save_file)
+    path        = saved.satellites[0].path
+    np.save(f"{path}/state.npy", np.array([{"not": "an array"}], dtype=object), allow_pickle=True)
+    with pytest.raises(ValueError):
+        output.load(simulator.save_file).satellites[0].state_history
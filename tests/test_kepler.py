@@ -0,0 +1,23 @@
+'''
+Analytic Kepler propagation against its own positions differenced in time.
+'''
+import numpy as np
+import pytest
+
+import Dynamics.kepler as kepler
+import utils.OEConvert as OEConvert
+
+@pytest.mark.parametrize("j2_secular", [False, True])
+def test_velocity_matches_position_derivative(earth, j2_secular):
+    kep         = [[earth.radius + 400e3, 0.001, 51.6, 30, 40, 0],
+                   [earth.radius + 800e3, 0.05, 98.0, 200, 10, 90]]
+    states      = OEConvert.keplerian_to_cartesian(kep, earth.mu)
+    propagator  = kepler.KeplerPropagator(states, earth, j2_secular)
+
+    h           = 0.01
+    times       = np.linspace(0, 86400, 50)
+    found       = propagator.propagate(times)
+    ahead       = propagator.propagate(times + h)
+    behind      = propagator.propagate(times - h)
+    difference  = (ahead[...,0:3] - behind[...,0:3])/(2*h)
+    np.testing.assert_allclose(found[...,3:6], difference, rtol=0, atol=1e-3)
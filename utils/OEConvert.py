@@ -1,39 +1,79 @@
 import numpy as np
 import utils.format as disp
 
-def cartesian_to_keplerian(state, mu):
-    a       = semimajor_axis(state, mu)
-    e       = np.linalg.norm(eccentricity(state, mu))
-    i       = inclination(state)
-    lan    = LAN(state)
-    omega   = argument_of_periapse(state, mu)
-    f       = true_anomaly(state, mu)
-    return np.array([a, e, i, lan, omega, f])
-
-def keplerian_to_cartesian(kep, mu):
-    disp.kep_elem("Input", kepDeg2Rad(kep))
+def cartesian_to_keplerian(state, mu, tol=1e-10):
+    '''
+    Converts cartesian states to osculating Keplerian elements
+    :param state: state [x, y, z, vx, vy, vz] or (N,6) array of states
+    :param mu: gravitational parameter of the central body
+    :param tol: eccentricity/inclination below which an orbit is treated as circular/equatorial
+    :return: [a, e, i, lan, argp, f] with angles in radians, or an (N,6) array of them.
+             Circular orbits get argp = 0 with f measured from the node, equatorial orbits get
+             lan = 0 with argp measured from the x axis, hyperbolic orbits get a < 0
+    '''
+    state   = np.asarray(state, dtype=np.float64)
+    r       = state[...,0:3]
+    v       = state[...,3:6]
+    r_mag   = np.linalg.norm(r, axis=-1)
+    v_mag   = np.linalg.norm(v, axis=-1)
+    r_dot_v = np.sum(r*v, axis=-1)
+
+    h       = np.cross(r, v)
+    h_mag   = np.linalg.norm(h, axis=-1)
+    node    = np.stack([-h[...,1], h[...,0], np.zeros_like(h_mag)], axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        e_vec   = (v_mag**2/mu - 1/r_mag)[...,None]*r - (r_dot_v/mu)[...,None]*v
+        e       = np.linalg.norm(e_vec, axis=-1)
+        a       = 1/(2/r_mag - v_mag**2/mu)
+        h_hat   = h/h_mag[...,None]
+        i       = np.arccos(np.clip(h_hat[...,2], -1, 1))
+
+        circular    = e < tol
+        equatorial  = np.linalg.norm(node, axis=-1) < tol*h_mag
+
+        # Line of nodes, or the x axis for equatorial orbits
+        lan     = np.where(equatorial, 0, np.mod(np.arctan2(node[...,1], node[...,0]), 2*np.pi))
+        n_hat   = np.stack([np.cos(lan), np.sin(lan), np.zeros_like(lan)], axis=-1)
+
+        # Periapsis measured from the node about the angular momentum
+        argp    = np.arctan2(np.sum(np.cross(n_hat, e_vec)*h_hat, axis=-1), np.sum(n_hat*e_vec, axis=-1))
+        argp    = np.where(circular, 0, np.mod(argp, 2*np.pi))
+
+        # Position measured from periapsis, or from the node for circular orbits
+        p_hat   = np.where(circular[...,None], n_hat, e_vec/e[...,None])
+        f       = np.arctan2(np.sum(np.cross(p_hat, r)*h_hat, axis=-1), np.sum(p_hat*r, axis=-1))
+        f       = np.mod(f, 2*np.pi)
+
+    return np.stack([a, e, i, lan, argp, f], axis=-1)
+
+def keplerian_to_cartesian(kep, mu, verbose=False):
+    '''
+    Converts Keplerian elements to cartesian states
+    :param kep: [a, e, i, lan, argp, f] with angles in degrees, or an (N,6) array of them
+    :param mu: gravitational parameter of the central body
+    :param verbose: print the input elements and the converted state
+    :return: state [x, y, z, vx, vy, vz] or (N,6) array of states
+    '''
+    kep         = np.asarray(kep, dtype=np.float64)
     pos         = position(kep, mu)
     vel         = velocity(kep, mu)
+    state_vec   = np.concatenate((pos, vel), axis=-1)
 
-    state_vec   = np.array([pos[0], pos[1], pos[2], vel[0], vel[1], vel[2]])
-    disp.state_vec("Converted", state_vec)
+    if verbose:
+        for kep_i, state_i in zip(kep.reshape(-1, 6), state_vec.reshape(-1, 6)):
+            disp.kep_elem("Input", kepDeg2Rad(kep_i))
+            disp.state_vec("Converted", state_i)
 
     return state_vec
-    # input = kepDeg2Rad(kep)
-    # check = cartesian_to_keplerian(state_vec, mu)
-    # if np.allclose(input, check, rtol=1e-04, atol=1e-05):
-    #     return state_vec
-    # else:
-    #     print("WARNING: Keplerian elements do not match")
-    #     disp.kep_elem("Input", input)
-    #     disp.kep_elem("Output", check)
-    #     return state_vec
-        # exit(1)
 
 def semimajor_axis(state, mu):
-    r = np.linalg.norm(state[0:3])
-    v = np.linalg.norm(state[3:6])
+    r = np.linalg.norm(state[...,0:3], axis=-1)
+    v = np.linalg.norm(state[...,3:6], axis=-1)
 
+    if np.ndim(r) > 0:
+        with np.errstate(divide='ignore'):
+            return np.where(r == 0, 0, 1/(2/r - v**2/mu))
     if r == 0:
         return 0
     a = 1/(2/r - v**2/mu)
@@ -113,10 +153,8 @@ def true_anomaly(state, mu):
     return f
 
 def angular_momentum_from_OE(a, e, mu):
-    if e >=0 and e < 1:
-        return np.sqrt(mu*a*(1-e**2))
-    elif e < 0:
-        return np.sqrt(mu*a*(e**2-1))
+    # |a(1-e^2)| is the semi-latus rectum for ellipses and for hyperbolas given with either sign of a
+    return np.sqrt(np.abs(mu*a*(1-e**2)))
     
 def sso_inclination(a, e, planet):
     mu          = planet.mu
@@ -138,39 +176,45 @@ def synch_orbit(planet):
     return a
 
 def position(kep, mu):
-    a       = kep[0]
-    e       = kep[1]
-    i       = np.radians(kep[2])
-    lan    = np.radians(kep[3])
-    omega   = np.radians(kep[4])
-    f       = np.radians(kep[5])
-
-    r       = a*(1-e**2)/(1+e*np.cos(f))
+    kep     = np.asarray(kep, dtype=np.float64)
+    a       = kep[...,0]
+    e       = kep[...,1]
+    i       = np.radians(kep[...,2])
+    lan     = np.radians(kep[...,3])
+    omega   = np.radians(kep[...,4])
+    f       = np.radians(kep[...,5])
+
+    r       = np.abs(a*(1-e**2))/(1+e*np.cos(f))
     theta   = omega + f
-    pos     = r * np.array([np.cos(theta)*np.cos(lan) - np.cos(i)*np.sin(lan)*np.sin(theta),
-                            np.cos(theta)*np.sin(lan) + np.cos(i)*np.cos(lan)*np.sin(theta),
-                            np.sin(i)*np.sin(theta)])
+    pos     = r[...,None] * np.stack([np.cos(theta)*np.cos(lan) - np.cos(i)*np.sin(lan)*np.sin(theta),
+                                      np.cos(theta)*np.sin(lan) + np.cos(i)*np.cos(lan)*np.sin(theta),
+                                      np.sin(i)*np.sin(theta)], axis=-1)
     return pos
 
 def velocity(kep, mu):
-    a       = kep[0]
-    e       = kep[1]
-    inc     = np.radians(kep[2])
-    lan    = np.radians(kep[3])
-    omega   = np.radians(kep[4])
-    f       = np.radians(kep[5])
+    kep     = np.asarray(kep, dtype=np.float64)
+    a       = kep[...,0]
+    e       = kep[...,1]
+    inc     = np.radians(kep[...,2])
+    lan     = np.radians(kep[...,3])
+    omega   = np.radians(kep[...,4])
+    f       = np.radians(kep[...,5])
 
     theta   = omega + f
 
     h       = angular_momentum_from_OE(a, e, mu)
-    vel_vec = mu/h*np.array([-(np.cos(lan)*(np.sin(theta) + e*np.sin(omega)) + np.sin(lan)*(np.cos(theta)+ e*np.cos(omega))*np.cos(inc)),
-                             -(np.sin(lan)*(np.sin(theta) + e*np.sin(omega)) - np.cos(lan)*(np.cos(theta) + e*np.cos(omega))*np.cos(inc)),
-                             (np.cos(theta) + e*np.cos(omega))*np.sin(inc)])
+    vel_vec = (mu/h)[...,None]*np.stack([-(np.cos(lan)*(np.sin(theta) + e*np.sin(omega)) + np.sin(lan)*(np.cos(theta)+ e*np.cos(omega))*np.cos(inc)),
+                                         -(np.sin(lan)*(np.sin(theta) + e*np.sin(omega)) - np.cos(lan)*(np.cos(theta) + e*np.cos(omega))*np.cos(inc)),
+                                         (np.cos(theta) + e*np.cos(omega))*np.sin(inc)], axis=-1)
                          
     return vel_vec
 
 def kepRad2Deg(kep):
-    return np.array([kep[0], kep[1], np.degrees(kep[2]), np.degrees(kep[3]), np.degrees(kep[4]), np.degrees(kep[5])])
+    kep             = np.array(kep, dtype=np.float64)
+    kep[...,2:6]    = np.degrees(kep[...,2:6])
+    return kep
 
 def kepDeg2Rad(kep):
-    return np.array([kep[0], kep[1], np.radians(kep[2]), np.radians(kep[3]), np.radians(kep[4]), np.radians(kep[5])]) 
\ No newline at end of file
+    kep             = np.array(kep, dtype=np.float64)
+    kep[...,2:6]    = np.radians(kep[...,2:6])
+    return kep
@@ -1,18 +1,99 @@
 # Import necessary libraries
+import os
 import numpy as np
+import quaternion
 import plotly.graph_objects as go
 
-from tqdm import tqdm
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
 
 import utils.plot as still
 import utils.format as format
 
-def create_groundtrack_animation(fig, satellite, planet, update_rate):
+def parallel_frames(frames_fun, arrays, indices, args, workers=1):
+    '''
+    Builds the animation frames split into contiguous blocks, one per process. Each
+    worker computes the geometry and the frame dicts of its block, and the blocks are
+    joined back in frame order, so the result is the one of a single call in this
+    process and plotly validates the frames once when they are added to the figure.
+    The arrays are copied once into shared memory that the workers map instead of
+    being pickled to each of them
+    :param frames_fun: module level function, called as frames_fun(*arrays, indices, *args)
+    :param arrays: arrays the frames are taken from
+    :param indices: (F,) state index of each frame
+    :param args: remaining arguments of frames_fun
+    :param workers: processes, 0 for one per cpu and 1 to run in this process
+    :return: list of F frame dicts
+    '''
+    workers = workers if workers > 0 else os.cpu_count()
+    workers = min(workers, len(indices))
+    if workers <= 1:
+        return frames_fun(*arrays, indices, *args)
+
+    blocks  = []
+    try:
+        for array in arrays:
+            block   = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+        specs   = [(block.name, array.shape, array.dtype.str) for block, array in zip(blocks, arrays)]
+        chunks  = np.array_split(indices, workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts   = list(executor.map(shared_frames, [frames_fun]*workers, [specs]*workers, chunks,
+                                        [args]*workers))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return [frame for part in parts for frame in part]
+
+def shared_frames(frames_fun, specs, indices, args):
+    '''
+    Worker side of parallel_frames
+    :param specs: (name, shape, dtype) of each shared array
+    '''
+    blocks  = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    arrays  = [np.ndarray(shape, dtype, buffer=block.buf) for block, (_, shape, dtype) in zip(blocks, specs)]
+    result  = frames_fun(*arrays, indices, *args)
+
+    # The views have to go before the blocks can be closed
+    del arrays
+    for block in blocks:
+        block.close()
+    return result
+
+def ground_geometry(lla_hist, indices, radius):
+    '''
+    Visibility circles and icon positions of every ground track frame at once
+    :param lla_hist: (N,3) latitudes and longitudes in deg and altitudes
+    :param indices: (F,) state index of each frame
+    :param radius: radius of the central body
+    :return: dict of (F,...) arrays
+    '''
+    lla         = lla_hist[indices]
+    arc_len     = radius*np.arccos(radius/(radius + lla[:,2]))
+    lat, lon    = still.ground_circle(arc_len[:,None], radius, lla[:,0:1], lla[:,1:2])
+    return {"circle_lat": lat,
+            "circle_lon": lon,
+            "lat"       : lla[:,0],
+            "lon"       : lla[:,1]}
+
+def ground_frames(lla_hist, indices, radius):
+    '''
+    Ground track frames, moving only the visibility circle and the icon. The
+    decimated track is drawn once as a base trace
+    :return: list of frame dicts
+    '''
+    geometry = ground_geometry(lla_hist, indices, radius)
+    return [dict(data=[dict(type="scattergeo", lat=geometry["circle_lat"][f], lon=geometry["circle_lon"][f]),
+                       dict(type="scattergeo", lat=[geometry["lat"][f]], lon=[geometry["lon"][f]])],
+                 traces=[0, 2])
+            for f in range(len(indices))]
+
+def create_groundtrack_animation(fig, satellite, planet, update_rate, workers=1):
     total_states = len(satellite.state_history)
-    # Get the data for each frame
-    fig.update(frames=[go.Frame(data=[*still.ground_track_frame(satellite, planet, i*update_rate)], 
-                                traces=[0, 1, 2, 3]) 
-                                for i in tqdm(range(1, round(total_states/update_rate)))])
+    indices     = np.arange(1, round(total_states/update_rate))*update_rate
+    fig.update(frames=parallel_frames(ground_frames, [satellite.lla_hist], indices, (planet.radius,), workers))
     
     fig.update_layout(title=dict(text="Ground Track"),
                       font=dict(family="Courier New, monospace",
@@ -22,7 +103,59 @@ def create_groundtrack_animation(fig, satellite, planet, update_rate):
                                                 args=[None, {"frame": {"duration": 1, "redraw": True}}])])])
     return fig
 
-def create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, draw_thrusters, update_rate):
+def frame_geometry(plot_states, vertices, indices, scale):
+    '''
+    Geometry of every 3d animation frame at once: the rotation matrices of all frames
+    are stacked, and the axes, cones and vehicle vertices follow from them in single
+    array operations instead of one frame at a time
+    :param plot_states: (N,11) positions, body and target quaternions, see format.states_for_plot
+    :param vertices: (V,3) vehicle vertices, see format.model
+    :param indices: (F,) state index of each frame
+    :param scale: size of the drawn axes and vehicle
+    :return: dict of (F,...) arrays, row k of the axes is the end of axis k
+    '''
+    states      = plot_states[indices]
+    pos         = states[:,0:3]
+    rot         = quaternion.as_rotation_matrix(quaternion.from_float_array(states[:,3:7]))
+    rot_targ    = quaternion.as_rotation_matrix(quaternion.from_float_array(states[:,7:11]))
+
+    return {"pos"       : pos,
+            "axes"      : pos[:,None,:] + rot*scale,
+            "targ_axes" : pos[:,None,:] + rot_targ*scale,
+            "cones"     : rot_targ*scale*.3,
+            "vertices"  : np.matmul(vertices*scale, rot) + pos[:,None,:]}
+
+def frame_traces(geometry, f):
+    '''
+    Trace updates of one frame, traces 1 to 12 of plot.get_3d_frame_data. Only the
+    coordinates that change are given, the styles and mesh faces are kept from the
+    traces of the first frame, and the trajectory is its decimated base trace
+    :param geometry: frame geometry, see frame_geometry
+    :param f: frame number
+    :return: list of trace dicts
+    '''
+    pos         = geometry["pos"][f]
+    vertices    = geometry["vertices"][f]
+    traces      = [dict(type="scatter3d", x=[pos[0], end[0]], y=[pos[1], end[1]], z=[pos[2], end[2]])
+                   for end in geometry["targ_axes"][f]]
+    traces.extend(dict(type="cone", x=[end[0]], y=[end[1]], z=[end[2]], u=[vec[0]], v=[vec[1]], w=[vec[2]])
+                  for end, vec in zip(geometry["targ_axes"][f], geometry["cones"][f]))
+    traces.extend(dict(type="scatter3d", x=[pos[0], end[0]], y=[pos[1], end[1]], z=[pos[2], end[2]])
+                  for end in geometry["axes"][f])
+    traces.append(dict(type="mesh3d", x=vertices[:,0], y=vertices[:,1], z=vertices[:,2]))
+    traces.extend(dict(type="scatter3d", x=[light[0]], y=[light[1]], z=[light[2]]) for light in vertices[-2:])
+    return traces
+
+def frames_3d(plot_states, vertices, indices, scale):
+    '''
+    3d animation frames, updating traces 1 to 12 of plot.get_3d_frame_data
+    :return: list of frame dicts
+    '''
+    geometry = frame_geometry(plot_states, vertices, indices, scale)
+    return [dict(data=frame_traces(geometry, f), traces=[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+            for f in range(len(indices))]
+
+def create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, draw_thrusters, update_rate, workers=1):
     # Unpack the plot format
     title       = plotformat[0]
     scale       = plotformat[1]
@@ -30,11 +163,10 @@ def create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, draw_thr
     yaxis       = plotformat[3]
     zaxis       = plotformat[4]
 
-    # Get the data for each frame
-    fig.update(frames=[go.Frame(data=[*still.get_3d_frame_data(sat_state_plot, i*update_rate,
-                                                      vehicle_model, scale, draw_thrusters)], 
-                                traces=[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]) 
-                                for i in tqdm(range(1, round(len(sat_state_plot)/update_rate)))])
+    # Only the changing coordinates go in the frames, the trajectory is the shared base
+    # trace and is not repeated
+    indices     = np.arange(1, round(len(sat_state_plot)/update_rate))*update_rate
+    fig.update(frames=parallel_frames(frames_3d, [sat_state_plot, vehicle_model[0]], indices, (scale,), workers))
     
     fig.update_layout(title=dict(text=title),
                       font=dict(family="Courier New, monospace",
@@ -47,72 +179,64 @@ def create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, draw_thr
                         showlegend=False)
     return fig
 
-def att_hill(satellite, update_rate):
+def att_hill(satellite, update_rate, workers=1):
     scale       = 1
     xaxis       = dict(range=[-1.2, 1.2])
     yaxis       = dict(range=[-1.2, 1.2])
     zaxis       = dict(range=[-1.2, 1.2])
     plotformat  = ["Attitude wrt. Hill Frame", scale, xaxis, yaxis, zaxis]
 
-    sat_pos                 = np.zeros_like(satellite.state_history[:,0:3])
-    sat_orient              = satellite.hill_to_body_hist
-    quat_targ_history       = np.zeros((len(satellite.state_history), 4))
-    quat_targ_history[:,0]  = 1
-    vehicle_model           = satellite.vehicle_model
-
-    sat_state_plot  = format.states_for_plot(sat_pos, sat_orient, quat_targ_history)
+    vehicle_model   = satellite.vehicle_model
+    sat_state_plot  = format.plot_states(satellite, "hill")
     plot_thrusters  = True
 
-    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters)
+    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters,
+                                          satellite.traj_keep)
     fig         = go.Figure(data=frame_data)
     
-    animation   = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate)
+    animation   = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate,
+                                      workers)
     return animation
 
-def att_lvlh(satellite, update_rate):
+def att_lvlh(satellite, update_rate, workers=1):
     scale       = 1
     xaxis       = dict(range=[-1.2, 1.2])
     yaxis       = dict(range=[-1.2, 1.2])
     zaxis       = dict(range=[-1.2, 1.2])
     plotformat  = ["Attitude wrt. LVLH", scale, xaxis, yaxis, zaxis]
 
-    sat_pos                 = np.zeros_like(satellite.state_history[:,0:3])
-    sat_orient              = satellite.lvlh_to_body_hist
-    quat_targ_history       = np.zeros((len(satellite.state_history), 4))
-    quat_targ_history[:,0]  = 1
-    vehicle_model           = satellite.vehicle_model
-
-    sat_state_plot  = format.states_for_plot(sat_pos, sat_orient, quat_targ_history)
+    vehicle_model   = satellite.vehicle_model
+    sat_state_plot  = format.plot_states(satellite, "lvlh")
     plot_thrusters  = True
 
-    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters)
+    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters,
+                                          satellite.traj_keep)
     fig         = go.Figure(data=frame_data)
 
-    animation   = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate)
+    animation   = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate,
+                                      workers)
     return animation
 
-def att_inertial(satellite, update_rate):
+def att_inertial(satellite, update_rate, workers=1):
     scale       = 1
     xaxis       = dict(range=[-1.2, 1.2])
     yaxis       = dict(range=[-1.2, 1.2])
     zaxis       = dict(range=[-1.2, 1.2])
     plotformat  = ["Attitude wrt. Inertial", scale, xaxis, yaxis, zaxis]
 
-    sat_pos             = np.zeros_like(satellite.state_history[:,0:3])
-    sat_orient          = satellite.state_history[:,6:10]
-    quat_targ_history   = satellite.target_orient_history
-    vehicle_model       = satellite.vehicle_model
-
-    sat_state_plot  = format.states_for_plot(sat_pos, sat_orient, quat_targ_history)
+    vehicle_model   = satellite.vehicle_model
+    sat_state_plot  = format.plot_states(satellite, "attitude")
     plot_thrusters  = True
 
-    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters)
+    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters,
+                                          satellite.traj_keep)
     fig         = go.Figure(data=frame_data)
 
-    animation   = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate)
+    animation   = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate,
+                                      workers)
     return animation
 
-def pci(satellite, planet, update_rate):
+def pci(satellite, planet, update_rate, workers=1):
     scale   = 350000.0
 
     max_range = np.max(np.abs(satellite.state_history[:,0:3]))
@@ -125,26 +249,24 @@ def pci(satellite, planet, update_rate):
     zaxis   = dict(range=[min_axis, max_axis])
     plotformat = [f"{planet.name[0]}CI Trajectory", scale, xaxis, yaxis, zaxis]
 
-    sat_pos             = satellite.state_history[:,0:3]
-    sat_orient          = satellite.state_history[:,6:10]
-    quat_targ_history   = satellite.target_orient_history
-    vehicle_model       = satellite.vehicle_model
-
-    sat_state_plot  = format.states_for_plot(sat_pos, sat_orient, quat_targ_history)
+    vehicle_model   = satellite.vehicle_model
+    sat_state_plot  = format.plot_states(satellite, "inertial")
     plot_thrusters  = False
 
-    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters)
+    frame_data  = still.get_3d_frame_data(sat_state_plot, 0, vehicle_model, scale, plot_thrusters,
+                                          satellite.traj_keep)
     frame_data.append(still.draw_planet(planet))
     fig         = go.Figure(data=frame_data)
 
-    animation = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate)
+    animation = create_3d_animation(fig, plotformat, sat_state_plot, vehicle_model, plot_thrusters, update_rate,
+                                    workers)
     return animation
 
-def groundtrack(satellite, planet, update_rate):
-    frame_data  = still.ground_track_frame(satellite, planet, 0)
+def groundtrack(satellite, planet, update_rate, workers=1):
+    frame_data  = still.ground_track_frame(satellite, planet, 0, satellite.track_keep)
     animation   = go.Figure(data=frame_data)
 
-    animation   = create_groundtrack_animation(animation, satellite, planet, update_rate)
+    animation   = create_groundtrack_animation(animation, satellite, planet, update_rate, workers)
     animation.update_geos(projection_type="equirectangular",
                     showland=True, 
                     coastlinewidth=2,
@@ -159,7 +281,7 @@ def groundtrack(satellite, planet, update_rate):
                     resolution=50)
     return animation
 
-def ecef(satellite, planet, update_rate):
-    animation = groundtrack(satellite, planet, update_rate)
+def ecef(satellite, planet, update_rate, workers=1):
+    animation = groundtrack(satellite, planet, update_rate, workers)
     animation.update_geos(projection_type="orthographic")
     return animation
\ No newline at end of file
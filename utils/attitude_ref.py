@@ -33,85 +33,144 @@ def dir_inertial_to_radec(vector_inertial):
 
 
 def pci2pcpf(pci_state, planet, days_since_j2000):
-        q_inertial_to_pcpf, omega_pcpf = get_pci_to_pcpf(planet, days_since_j2000)
-        pcpf_state      = np.zeros(6)
-        pcpf_state[0:3] = quaternion.rotate_vectors(q_inertial_to_pcpf, pci_state[0:3])
-        pcpf_state[3:6] = quaternion.rotate_vectors(q_inertial_to_pcpf, pci_state[3:6]) \
-                            + np.cross(omega_pcpf, pcpf_state[0:3])
-        return pcpf_state
+    '''
+    Converts planet centered inertial states to planet centered planet fixed
+    :param pci_state: state [x, y, z, vx, vy, vz] or (N,6) array of states
+    :param planet: central body
+    :param days_since_j2000: epoch in days since J2000, scalar or (N,) array
+    :return: pcpf state(s) with the same shape as pci_state
+    '''
+    q_inertial_to_pcpf, omega_pcpf = get_pci_to_pcpf(planet, days_since_j2000)
+    R_inertial_to_pcpf  = quaternion.as_rotation_matrix(q_inertial_to_pcpf)
+    pcpf_state          = np.zeros(np.shape(pci_state))
+    pcpf_state[...,0:3] = np.einsum('...ij,...j->...i', R_inertial_to_pcpf, pci_state[...,0:3])
+    pcpf_state[...,3:6] = np.einsum('...ij,...j->...i', R_inertial_to_pcpf, pci_state[...,3:6]) \
+                            + np.cross(omega_pcpf, pcpf_state[...,0:3])
+    return pcpf_state
 
 def pcpf2pci(pcpf_state, planet, days_since_j2000):
+    '''
+    Converts planet centered planet fixed states to planet centered inertial
+    :param pcpf_state: state [x, y, z, vx, vy, vz] or (N,6) array of states
+    :param planet: central body
+    :param days_since_j2000: epoch in days since J2000, scalar or (N,) array
+    :return: pci state(s) with the same shape as pcpf_state
+    '''
     q_pcpf_to_inertial, omega_pcpf = get_pcpf_to_pci(planet, days_since_j2000)
-    pci_state       = np.zeros(6)
-    pci_state[0:3]  = quaternion.rotate_vectors(q_pcpf_to_inertial, pcpf_state[0:3])
-    pci_state[3:6]  = quaternion.rotate_vectors(q_pcpf_to_inertial, pcpf_state[3:6]) \
-                        + np.cross(omega_pcpf, pci_state[0:3])
+    R_pcpf_to_inertial  = quaternion.as_rotation_matrix(q_pcpf_to_inertial)
+    pci_state           = np.zeros(np.shape(pcpf_state))
+    pci_state[...,0:3]  = np.einsum('...ij,...j->...i', R_pcpf_to_inertial, pcpf_state[...,0:3])
+    pci_state[...,3:6]  = np.einsum('...ij,...j->...i', R_pcpf_to_inertial, pcpf_state[...,3:6]) \
+                            + np.cross(omega_pcpf, pci_state[...,0:3])
     return pci_state
 
 def get_pci_to_pcpf(planet, days_since_j2000):
+    '''
+    Calculates the rotation from the inertial frame to the planet fixed frame
+    :param planet: central body
+    :param days_since_j2000: epoch in days since J2000, scalar or (N,) array
+    :return: quaternion(s) from the inertial to the planet fixed frame and the rotation rate
+    '''
     degrees_per_day     = 360 / planet.sidereal_day * (24*3600)
     rot_offset          = planet.rot_offset
     gamma               = np.radians(degrees_per_day*days_since_j2000 + rot_offset)
-    q_inertial_to_pcpf  = quaternion.from_rotation_vector(-gamma*np.array([0, 0, 1]))
+    q_inertial_to_pcpf  = quaternion.from_rotation_vector(np.multiply.outer(-gamma, np.array([0, 0, 1])))
     omega_pcpf  = np.array([0, 0, degrees_per_day/(24*3600)])
     return q_inertial_to_pcpf, omega_pcpf
 
 def get_pcpf_to_pci(planet, days_since_j2000):
+    '''
+    Calculates the rotation from the planet fixed frame to the inertial frame
+    :param planet: central body
+    :param days_since_j2000: epoch in days since J2000, scalar or (N,) array
+    :return: quaternion(s) from the planet fixed to the inertial frame and the rotation rate
+    '''
     degrees_per_day     = 360 / planet.sidereal_day * (24*3600)
     rot_offset          = planet.rot_offset
     gamma               = np.radians(degrees_per_day*days_since_j2000 + rot_offset)
-    q_pcpf_to_inertial  = quaternion.from_rotation_vector(gamma*np.array([0, 0, 1]))
+    q_pcpf_to_inertial  = quaternion.from_rotation_vector(np.multiply.outer(gamma, np.array([0, 0, 1])))
     omega_pcpf  = np.array([0, 0, -degrees_per_day/(24*3600)])
     return q_pcpf_to_inertial, omega_pcpf
 
 def get_hill_to_pci(state, mu):
     '''
-    Calculates the rotation matrix from the Hill frame to the inertial frame
-    :param state: current state vector [x, y, z, vx, vy, vz]
-    :return: rotation matrix from the Hill frame to the inertial frame
+    Calculates the rotation from the Hill frame to the inertial frame
+    :param state: current state vector [x, y, z, vx, vy, vz] or (N,6) array of states
+    :return: quaternion(s) from the Hill frame to the inertial frame and the frame rate(s)
     '''
-    r = state[0:3]
-    v = state[3:6]
+    r = state[...,0:3]
+    v = state[...,3:6]
     h = np.cross(r, v)
 
-    r_normalized    = r/np.linalg.norm(r)
-    h_normalized    = h/np.linalg.norm(h)
+    r_normalized    = r/np.linalg.norm(r, axis=-1, keepdims=True)
+    h_normalized    = h/np.linalg.norm(h, axis=-1, keepdims=True)
 
     # Rotation matrix from Hill to Inertial
-    R_hill_to_inertial = np.array([r_normalized, np.cross(h_normalized, r_normalized), h_normalized]).T
+    R_hill_to_inertial = np.stack([r_normalized, np.cross(h_normalized, r_normalized), h_normalized], axis=-1)
     q_hill_to_inertial = quaternion.from_rotation_matrix(R_hill_to_inertial)
 
     a           = OEConvert.semimajor_axis(state, mu)
     n           =  np.sqrt(mu/a**3)
-    omega_hill  = np.array([0, 0, n])
+    omega_hill  = np.stack([np.zeros_like(n), np.zeros_like(n), n], axis=-1)
     return q_hill_to_inertial, omega_hill
 
-def get_lvlh_to_pci(state, mu):
+def get_lvlh_to_pci_matrix(state):
     '''
-    Calculates the rotation matrix from the LVLH frame to the inertial frame
-    :param state: current state vector [x, y, z, vx, vy, vz]
-    :return: rotation matrix from the LVLH frame to the inertial frame
+    Rotation matrix from the LVLH frame to the inertial frame, shared by every
+    LVLH conversion so they use one definition of the frame
+    :param state: current state vector [x, y, z, vx, vy, vz] or (N,6) array of states
+    :return: (3,3) or (N,3,3) rotation matrices
     '''
-    r = state[0:3]
-    v = state[3:6]
+    r = state[...,0:3]
+    v = state[...,3:6]
     h = np.cross(r, v)
 
-    r_normalized    = r/np.linalg.norm(r)
-    h_normalized    = h/np.linalg.norm(h)
+    r_normalized    = r/np.linalg.norm(r, axis=-1, keepdims=True)
+    h_normalized    = h/np.linalg.norm(h, axis=-1, keepdims=True)
+    return np.stack([np.cross(-h_normalized, -r_normalized), -h_normalized, -r_normalized], axis=-1)
 
-    # Rotation matrix from Hill to Inertial
-    R_lvlh_to_inertial = np.array([np.cross(-h_normalized, -r_normalized), -h_normalized, -r_normalized]).T
-    q_lvlh_to_inertial = quaternion.from_rotation_matrix(R_lvlh_to_inertial)
+def get_lvlh_to_pci(state, mu):
+    '''
+    Calculates the rotation from the LVLH frame to the inertial frame
+    :param state: current state vector [x, y, z, vx, vy, vz] or (N,6) array of states
+    :return: quaternion(s) from the LVLH frame to the inertial frame and the frame rate(s)
+    '''
+    q_lvlh_to_inertial = quaternion.from_rotation_matrix(get_lvlh_to_pci_matrix(state))
     
     a           = OEConvert.semimajor_axis(state, mu)
     n           =  np.sqrt(mu/a**3)
-    omega_lvlh  = np.array([0, n, 0])
+    omega_lvlh  = np.stack([np.zeros_like(n), n, np.zeros_like(n)], axis=-1)
     return q_lvlh_to_inertial, omega_lvlh
 
+def get_inertial_to_lvlh(state, q_prev=None):
+    '''
+    Quaternion from the inertial frame to the LVLH frame, as used for the pointing
+    target. Uses the closed-form matrix conversion, and when q_prev is given each
+    result is flipped into the same hemisphere so the target does not change sign
+    between control steps
+    :param state: current state vector [x, y, z, vx, vy, vz] or (N,6) array of states
+    :param q_prev: previous target [w, x, y, z] or (N,4) array of them
+    :return: [w, x, y, z] or (N,4) array of quaternions
+    '''
+    R_lvlh_to_inertial  = get_lvlh_to_pci_matrix(state)
+    q_lvlh_to_inertial  = quaternion.from_rotation_matrix(R_lvlh_to_inertial, nonorthogonal=False)
+    q_inertial_to_lvlh  = quaternion.as_float_array(q_lvlh_to_inertial)*np.array([1, -1, -1, -1])
+
+    if q_prev is not None:
+        flip                = np.sum(q_inertial_to_lvlh*q_prev, axis=-1, keepdims=True) < 0
+        q_inertial_to_lvlh  = np.where(flip, -q_inertial_to_lvlh, q_inertial_to_lvlh)
+    return q_inertial_to_lvlh
+
 def pcpf2lla(pcpfState, planet):
-    x = pcpfState[0]
-    y = pcpfState[1]
-    z = pcpfState[2]
+    '''
+    Converts planet fixed positions to geodetic latitude, longitude and altitude
+    :param pcpfState: pcpf state or (N,3+) array of states, only the position is used
+    :param planet: central body
+    :return: [lat (deg), lon (deg), alt (m)] or (N,3) array of them
+    '''
+    x = pcpfState[...,0]
+    y = pcpfState[...,1]
+    z = pcpfState[...,2]
 
     # WGS84 ellipsoid parameters
     a = planet.radius
@@ -150,13 +209,19 @@ def pcpf2lla(pcpfState, planet):
     lat = np.arcsin((epsilon**2 + 1) * (d/N))
     lon = np.arctan2(y, x)
     alt = rho * np.cos(lat) + z * np.sin(lat) - a**2/N
-    return np.array([np.degrees(lat), np.degrees(lon), alt])
+    return np.stack([np.degrees(lat), np.degrees(lon), alt], axis=-1)
 
 def lla2pcpf(llaState, planet):
+    '''
+    Converts geodetic latitude, longitude and altitude to planet fixed positions
+    :param llaState: [lat (deg), lon (deg), alt (m)] or (N,3) array of them
+    :param planet: central body
+    :return: pcpf position [x, y, z] or (N,3) array of them
+    '''
     # unpacking the input vector
-    lat = np.radians(llaState[0])
-    lon = np.radians(llaState[1])
-    alt = llaState[2]
+    lat = np.radians(llaState[...,0])
+    lon = np.radians(llaState[...,1])
+    alt = llaState[...,2]
 
     # WGS84 ellipsoid parameters
     planet_semimajor = planet.radius
@@ -174,4 +239,4 @@ def lla2pcpf(llaState, planet):
     x = (N + alt) * np.cos(lat) * np.cos(lon)
     y = (N + alt) * np.cos(lat) * np.sin(lon)
     z = (N * (1 - e**2) + alt) * np.sin(lat)
-    return np.array([x, y, z])
\ No newline at end of file
+    return np.stack([x, y, z], axis=-1)
\ No newline at end of file
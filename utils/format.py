@@ -1,6 +1,12 @@
+import os
+import hashlib
+import tempfile
 import numpy as np
 from stl import mesh
 
+# Bumped whenever the mesh processing changes, so stale cached meshes are not reused
+MESH_VERSION = 1
+
 def state_vec(name, state, sigfigs=6):
     print(f"{name} State Vector:")
     print(f"R: [{state[0]:.{sigfigs}}, {state[1]:.{sigfigs}}, {state[2]:.{sigfigs}}] m")
@@ -22,6 +28,35 @@ def states_for_plot(sat_pos, sat_orient, quat_targ_history):
     sat_state_plot[:,7:11] = quat_targ_history
     return sat_state_plot
 
+def plot_states(satellite, frame):
+    '''
+    Plot states of a satellite as drawn in one frame, built on first use and kept in
+    satellite.plot_states so every plot drawn in that frame shares them
+    :param satellite: satellite, with a plot_states dict
+    :param frame: "inertial" for the positions and attitude, "attitude" for the inertial
+                  attitude about the origin, "lvlh" or "hill" for the attitude wrt. those frames
+    :return: (N,11) plot states, see states_for_plot
+    '''
+    if frame not in satellite.plot_states.keys():
+        num_states  = len(satellite.state_history)
+        origin      = np.zeros((num_states, 3))
+        identity    = np.zeros((num_states, 4))
+        identity[:,0] = 1
+        if frame == "inertial":
+            states  = states_for_plot(satellite.state_history[:,0:3], satellite.state_history[:,6:10],
+                                      satellite.target_orient_history)
+        elif frame == "attitude":
+            states  = states_for_plot(origin, satellite.state_history[:,6:10], satellite.target_orient_history)
+        elif frame == "lvlh":
+            states  = states_for_plot(origin, satellite.lvlh_to_body_hist, identity)
+        elif frame == "hill":
+            states  = states_for_plot(origin, satellite.hill_to_body_hist, identity)
+        else:
+            print(f"Unknown plot frame {frame}")
+            exit()
+        satellite.plot_states[frame] = states
+    return satellite.plot_states[frame]
+
 # From @empet on plotly forum
 def stl2mesh3d(stl_mesh):
     # stl_mesh is read by nympy-stl from a stl file; it is  an array of faces/triangles (i.e. three 3d points) 
@@ -36,12 +71,62 @@ def stl2mesh3d(stl_mesh):
     IJK = np.vstack((I, J, K)).T
     return vertices, IJK
 
-def model(satellite):
-    # Unpack model location and axis order
-    model       = satellite.model
-    axis_order  = satellite.model_axis_order
-    colorscale  = satellite.colorscale
+def cluster_vertices(vertices, IJK, resolution):
+    '''
+    Vertex clustering on a uniform grid of resolution cells along the longest side of
+    the model. The vertices of each occupied cell merge into one at their mean, and
+    triangles that collapse or repeat are dropped
+    :return: clustered vertices and IJK
+    '''
+    low     = np.min(vertices, axis=0)
+    size    = np.max(np.max(vertices, axis=0) - low)/resolution
+    cells   = np.minimum(((vertices - low)/size).astype(np.int64), resolution - 1)
+    key     = (cells[:,0]*resolution + cells[:,1])*resolution + cells[:,2]
+    _, cluster  = np.unique(key, return_inverse=True)
+    cluster     = cluster.ravel()
+
+    faces   = cluster[IJK]
+    faces   = faces[(faces[:,0] != faces[:,1]) & (faces[:,1] != faces[:,2]) & (faces[:,0] != faces[:,2])]
+    _, first    = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    faces   = faces[np.sort(first)]
+
+    # Only the clusters still used by a triangle are kept
+    used, faces = np.unique(faces, return_inverse=True)
+    faces   = faces.reshape(-1, 3)
+    counts  = np.bincount(cluster)
+    merged  = np.stack([np.bincount(cluster, weights=vertices[:,axis])/counts for axis in range(3)], axis=1)
+    return merged[used], faces
 
+def decimate_mesh(vertices, IJK, max_faces):
+    '''
+    Decimates a mesh to at most max_faces triangles by vertex clustering, with the
+    finest grid that meets the target found by bisection on its resolution
+    :param vertices: (V,3) vertices
+    :param IJK: (F,3) vertex indices of the triangles
+    :param max_faces: most triangles kept
+    :return: decimated vertices and IJK
+    '''
+    if len(IJK) <= max_faces:
+        return vertices, IJK
+    best        = cluster_vertices(vertices, IJK, 1)
+    lo, hi      = 1, 4096
+    while hi - lo > 1:
+        resolution  = (lo + hi)//2
+        clustered   = cluster_vertices(vertices, IJK, resolution)
+        if len(clustered[1]) <= max_faces:
+            lo, best    = resolution, clustered
+        else:
+            hi          = resolution
+    return best
+
+def load_mesh(model, axis_order, max_faces=0):
+    '''
+    Reads a vehicle STL, orders its axes, centers it and scales it to a unit size
+    :param model: STL file
+    :param axis_order: order of the model axes in the body frame
+    :param max_faces: decimation target, 0 keeps every triangle
+    :return: (V,3) vertices and (F,3) IJK
+    '''
     # Get model data
     vehicle = mesh.Mesh.from_file(model)
     vehicle_points, IJK = stl2mesh3d(vehicle)
@@ -65,6 +150,50 @@ def model(satellite):
     # Normalize the vehicle scale
     max_range       = max(range_x, range_y, range_z)
     vehicle_points  = vehicle_points/max_range
+
+    if max_faces > 0:
+        vehicle_points, IJK = decimate_mesh(vehicle_points, IJK, max_faces)
+    return vehicle_points.astype(np.float64), IJK
+
+def cached_mesh(model, axis_order, cache_dir=None, max_faces=0):
+    '''
+    Processed vehicle mesh, read back from the cache when the same file was processed
+    with the same axis order and decimation target before
+    :param model: STL file
+    :param axis_order: order of the model axes in the body frame
+    :param cache_dir: directory of the cached meshes, None to always process the STL
+    :param max_faces: decimation target, 0 keeps every triangle
+    :return: (V,3) vertices and (F,3) IJK
+    '''
+    if cache_dir is None:
+        return load_mesh(model, axis_order, max_faces)
+
+    with open(model, 'rb') as model_file:
+        key = hashlib.sha1(model_file.read())
+    key.update(f"{os.path.abspath(model)} {list(axis_order)} {max_faces} v{MESH_VERSION}".encode())
+    cache_file  = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(model))[0]}_{key.hexdigest()[:16]}.npz")
+    if os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as cached:
+            return cached["vertices"], cached["ijk"]
+
+    vehicle_points, IJK = load_mesh(model, axis_order, max_faces)
+
+    # Both arrays go in one file, written under a name of this process's own and moved
+    # into place, so an interrupted write or a second process never leaves a partial mesh
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as tmp_file:
+        np.savez(tmp_file, vertices=vehicle_points, ijk=IJK)
+    os.replace(tmp_file.name, cache_file)
+    return vehicle_points, IJK
+
+def model(satellite, cache_dir=None, max_faces=0):
+    # Unpack model location and axis order
+    model       = satellite.model
+    axis_order  = satellite.model_axis_order
+    colorscale  = satellite.colorscale
+
+    # Get model data, the navigation lights are added after the mesh
+    vehicle_points, IJK = cached_mesh(model, axis_order, cache_dir, max_faces)
     vehicle_points  = np.vstack((vehicle_points, satellite.lights)).astype(np.float64)
 
     return [vehicle_points, IJK, colorscale]
\ No newline at end of file
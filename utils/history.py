@@ -0,0 +1,89 @@
+import numpy as np
+
+class History():
+    '''
+    Append-only, array-backed time history. Rows live in a preallocated buffer
+    that grows in chunks when full, and reads return views instead of copies
+    '''
+    def __init__(self, first_row, capacity=1, chunk=4096):
+        first_row       = np.asarray(first_row, dtype=np.float64)
+        self.chunk      = chunk
+        self.count      = 0
+        self.buffer     = np.empty((max(int(capacity), 1),) + first_row.shape)
+        self.append(first_row)
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        # Only pickle the rows that have been written
+        state           = self.__dict__.copy()
+        state["buffer"] = self.buffer[:self.count].copy()
+        return state
+
+    def reserve(self, capacity):
+        '''
+        Grows the buffer so it can hold at least capacity rows without reallocating
+        :param capacity: total number of rows to allocate room for
+        '''
+        if capacity <= len(self.buffer):
+            return
+        buffer                  = np.empty((int(capacity),) + self.buffer.shape[1:])
+        buffer[:self.count]     = self.buffer[:self.count]
+        self.buffer             = buffer
+
+    def append(self, row):
+        if self.count == len(self.buffer):
+            self.reserve(len(self.buffer) + self.chunk)
+        self.buffer[self.count] = row
+        self.count             += 1
+
+    def extend(self, rows):
+        if self.count + len(rows) > len(self.buffer):
+            self.reserve(max(self.count + len(rows), len(self.buffer) + self.chunk))
+        self.buffer[self.count:self.count+len(rows)]    = rows
+        self.count                                     += len(rows)
+
+    @property
+    def data(self):
+        return self.buffer[:self.count]
+
+    def last(self):
+        return self.buffer[self.count-1]
+
+    def column(self, idx):
+        return HistoryColumn(self, idx)
+
+class HistoryColumn():
+    '''
+    Read-only view of one column of a History whose rows are stacked blocks, e.g. one
+    satellite of an (N,13) constellation state history
+    '''
+    def __init__(self, store, idx):
+        self.store  = store
+        self.idx    = idx
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def buffer(self):
+        return self.store.buffer[:,self.idx]
+
+    @property
+    def data(self):
+        return self.store.data[:,self.idx]
+
+    def last(self):
+        return self.store.last()[self.idx]
+
+def from_array(hist):
+    '''
+    Wraps an existing (N, ...) history array in a History store
+    :param hist: array of previously recorded rows
+    :return: History holding a copy of the rows
+    '''
+    store                       = History(hist[0], capacity=len(hist))
+    store.buffer[:len(hist)]    = hist
+    store.count                 = len(hist)
+    return store
@@ -2,16 +2,37 @@ import os
 import yaml
 import numpy as np
 
+import Core.access as access
+import Core.conjunction as conjunction
+import Core.events as events
+import Core.output as output
 import Core.simulator as sim
 import Core.visualizer as vis
+import Dynamics.atmosphere as atmosphere
 import Dynamics.body as body
+import Dynamics.gravity as gravity
+import Dynamics.integrators as integrators
+import Dynamics.multirate as multirate
+import Dynamics.third_body as third_body
+import Vehicles.constellation as constellation
 import Vehicles.satellite as sat
 import utils.OEConvert as OEConvert
+import utils.convert as convert
 
 def populate_sim(sim_file):
     with open(sim_file, 'r') as file:
         config      = yaml.safe_load(file)
+    return build_sim(config)
 
+def build_sim(config, modify_sats=None, verbose=True):
+    '''
+    Builds a simulator from a parsed sim config
+    :param config: sim config dictionary, as read from sim.yaml
+    :param modify_sats: optional function applied to the lists of satellites and constellations before the
+                        simulator is created
+    :param verbose: print the initial states and the run progress
+    :return: simulator
+    '''
     with open("Config/planets.yaml", 'r') as planet_file:
         planet_conf = yaml.safe_load(planet_file)
 
@@ -22,10 +43,80 @@ def populate_sim(sim_file):
     dt              = sim_properties["dt"]
     save_loc        = sim_properties["save_loc"]
     save_file       = sim_properties["save_file"]
-    save_file       = os.path.join(save_loc, save_file)
+    if save_file is not None:
+        save_file   = os.path.join(save_loc, save_file)
+
+    batch           = False
+    if "batch" in sim_properties.keys():
+        batch       = bool(sim_properties["batch"])
+
+    checkpoint_interval = 0
+    if "checkpoint" in sim_properties.keys():
+        checkpoint_interval = float(sim_properties["checkpoint"])
+
+    integrator      = None
+    if "integrator" in sim_properties.keys():
+        int_props   = sim_properties["integrator"]
+        max_step    = float(int_props["step"]) if "step" in int_props.keys() else dt
+        rtol        = float(int_props["rtol"]) if "rtol" in int_props.keys() else 1e-10
+        atol        = float(int_props["atol"]) if "atol" in int_props.keys() else 1e-6
+        min_step    = float(int_props["min_step"]) if "min_step" in int_props.keys() else None
+        integrator  = integrators.create(int_props["method"], max_step, rtol, atol, min_step)
+
+    rates           = None
+    if "multirate" in sim_properties.keys() and sim_properties["multirate"]["enabled"]:
+        rate_props      = sim_properties["multirate"]
+        orbit_method    = rate_props["orbit_method"] if "orbit_method" in rate_props.keys() else "RK4"
+        rates           = multirate.MultiRate(float(rate_props["orbit_step"]), float(rate_props["attitude_step"]),
+                                              orbit_method)
+
+    screening       = None
+    if "screening" in sim_properties.keys() and sim_properties["screening"]["enabled"]:
+        screen_props    = sim_properties["screening"]
+        screening       = conjunction.Screening(float(screen_props["threshold"]), float(screen_props["step"]))
+
+    ground_access   = None
+    if "access" in sim_properties.keys() and sim_properties["access"]["enabled"]:
+        access_props    = sim_properties["access"]
+        stations        = access_props["stations"]
+        if isinstance(stations, str):
+            # Long station lists can be kept in their own yaml file
+            with open(stations, 'r') as station_file:
+                stations = yaml.safe_load(station_file)
+        ground_access   = access.Access(stations, float(access_props["mask"]))
+
+    sim_events      = None
+    if "events" in sim_properties.keys() and sim_properties["events"]["enabled"]:
+        event_props     = sim_properties["events"]
+        terminal        = event_props["terminal"] if "terminal" in event_props.keys() else []
+        logged          = event_props["logged"] if "logged" in event_props.keys() else []
+        reentry_alt     = float(event_props["reentry_alt"]) if "reentry_alt" in event_props.keys() else 100e3
+        sim_events      = events.Events(terminal or [], logged or [], reentry_alt)
 
     central_body    = body.Body(body_name, planet_conf[body_name])
 
+    # The atmosphere is tabulated before the vehicles build their dynamics
+    if "drag" in sim_properties.keys() and sim_properties["drag"]["enabled"]:
+        drag_props      = sim_properties["drag"]
+        model           = drag_props["model"] if "model" in drag_props.keys() else "exponential"
+        layers          = drag_props["layers"] if "layers" in drag_props.keys() else None
+        table_top       = float(drag_props["table_top"]) if "table_top" in drag_props.keys() else 1500e3
+        table_step      = float(drag_props["table_step"]) if "table_step" in drag_props.keys() else 100
+        central_body.atmosphere = atmosphere.build(central_body, model, layers, table_top, table_step)
+
+    if "gravity" in sim_properties.keys() and sim_properties["gravity"]["enabled"]:
+        gravity_props   = sim_properties["gravity"]
+        degree          = int(gravity_props["degree"])
+        order           = int(gravity_props["order"]) if "order" in gravity_props.keys() else degree
+        central_body.gravity_field = gravity.load(gravity_props["file"], degree, order, central_body)
+        central_body.gravity_field.set_epoch(convert.daysSinceJ2000(t0))
+
+    if "third_body" in sim_properties.keys() and sim_properties["third_body"]["enabled"]:
+        third_props     = sim_properties["third_body"]
+        cache_dir       = third_props["cache"] if "cache" in third_props.keys() else None
+        central_body.third_bodies = third_body.ThirdBodies(third_props["bodies"], central_body, planet_conf,
+                                                           convert.daysSinceJ2000(t0), tf, cache_dir)
+
     sats            = []
     satellites      = config["satellites"]
 
@@ -62,7 +153,7 @@ def populate_sim(sim_file):
             argp    = kep["argp"]
             TA      = kep["TA"]
 
-            state   = OEConvert.keplerian_to_cartesian([a, e, i, lan, argp, TA], central_body.mu)
+            state   = OEConvert.keplerian_to_cartesian([a, e, i, lan, argp, TA], central_body.mu, verbose)
         else:
             print("No initial state specified")
             exit()
@@ -71,10 +162,73 @@ def populate_sim(sim_file):
         omega_body  = np.array(satellite["omega_body"])
         state       = np.hstack((state, quat, omega_body))
 
+        propagator  = satellite["propagator"] if "propagator" in satellite.keys() else {}
+
         satellite   = sat.Satellite(t0, state, central_body, sat_config)
+        set_propagator(satellite, propagator)
         sats.append(satellite)
 
-    simulator = sim.Simulator(central_body, t0, tf, dt, sats, save_file)
+    constellations  = []
+    if "constellations" in config.keys() and config["constellations"]:
+        for name, con_props in config["constellations"].items():
+            constellations.append(build_constellation(name, con_props, t0, central_body))
+
+    if modify_sats is not None:
+        modify_sats(sats, constellations)
+
+    simulator = sim.Simulator(central_body, t0, tf, dt, sats, save_file, batch, integrator,
+                              checkpoint_interval, rates, constellations, screening, ground_access,
+                              sim_events)
+    simulator.show_progress = verbose
+    return simulator
+
+def set_propagator(vehicle, propagator):
+    if "method" in propagator.keys():
+        method  = propagator["method"].casefold()
+        if method not in ["numeric", "kepler"]:
+            print(f"Unknown propagator {method}")
+            exit()
+        j2_secular      = bool(propagator["j2"]) if "j2" in propagator.keys() else False
+        hold_attitude   = "attitude" in propagator.keys() and propagator["attitude"] == "hold"
+        vehicle.set_propagator(method, j2_secular, hold_attitude)
+
+def build_constellation(name, con_props, t0, central_body):
+    '''
+    Expands a Walker constellation block of the sim config
+    :param name: name of the constellation, members are named name_plane_slot
+    :param con_props: constellation block
+    :param t0: start epoch
+    :param central_body: central body
+    :return: constellation
+    '''
+    total       = int(con_props["total"])
+    planes      = int(con_props["planes"])
+    phasing     = int(con_props["phasing"])
+    if "alt" in con_props.keys():
+        a       = con_props["alt"] + central_body.radius
+    elif "semimajor" in con_props.keys():
+        a       = con_props["semimajor"]
+    else:
+        print("No altitude or semimajor axis specified")
+        exit()
+    pattern     = con_props["pattern"] if "pattern" in con_props.keys() else "delta"
+    raan0       = con_props["raan0"] if "raan0" in con_props.keys() else 0
+
+    kep         = constellation.walker(total, planes, phasing, a, con_props["inc"], pattern, raan0)
+    orbits      = OEConvert.keplerian_to_cartesian(kep, central_body.mu)
+
+    quat        = np.array(con_props["q_body_to_inertial"]) if "q_body_to_inertial" in con_props.keys() else [1, 0, 0, 0]
+    omega_body  = np.array(con_props["omega_body"]) if "omega_body" in con_props.keys() else [0, 0, 0]
+    states      = np.hstack((orbits, np.tile(quat, (total, 1)), np.tile(omega_body, (total, 1))))
+
+    names       = constellation.member_names(name, total, planes)
+    con         = constellation.Constellation(name, t0, states, central_body, con_props["vehicle_conf"], names)
+    set_propagator(con, con_props["propagator"] if "propagator" in con_props.keys() else {})
+    return con
+
+def resume_sim(sim_file):
+    simulator = populate_sim(sim_file)
+    simulator.restore()
     return simulator
 
 def load_vis(vis_file):
@@ -83,9 +237,29 @@ def load_vis(vis_file):
 
     load_file   = vis_config["loadfile"]
     num_frames  = vis_config["animation"]["num_frames"]
+    workers     = vis_config["animation"]["workers"] if "workers" in vis_config["animation"].keys() else 1
+    max_points  = vis_config["max_points"] if "max_points" in vis_config.keys() else 2000
+    mesh_cache  = None
+    max_faces   = 0
+    if "mesh" in vis_config.keys():
+        mesh_props  = vis_config["mesh"]
+        mesh_cache  = mesh_props["cache"] if "cache" in mesh_props.keys() else None
+        max_faces   = mesh_props["max_faces"] if "max_faces" in mesh_props.keys() else 0
 
-    sim_data    = np.load(load_file, allow_pickle=True).item()
+    if load_file.endswith(".npy"):
+        # Pickled Simulator written before the columnar output format
+        sim_data    = np.load(load_file, allow_pickle=True).item()
+    else:
+        sim_data    = output.load(load_file)
     num_states  = sim_data.satellites[0].state_history.shape[0]
     frame_rate  = int(num_states / num_frames)
-    visualizer  = vis.Visualizer(sim_data, frame_rate)
+    visualizer  = vis.Visualizer(sim_data, frame_rate, max_points, mesh_cache, max_faces, workers)
+
+    if "export" in vis_config.keys() and vis_config["export"]["enabled"]:
+        export_props                = vis_config["export"]
+        visualizer.export_plots     = export_props["plots"]
+        if "directory" in export_props.keys():
+            visualizer.export_dir   = export_props["directory"]
+        if "formats" in export_props.keys():
+            visualizer.export_formats = export_props["formats"]
     return visualizer
\ No newline at end of file
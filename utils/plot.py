@@ -1,10 +1,11 @@
+import heapq
 import plotly
 import quaternion
 import numpy as np
 import plotly.graph_objects as go
 import utils.format as format
 
-def get_3d_frame_data(plot_states, idx, vehicle_data, scale, draw_thrusters):
+def get_3d_frame_data(plot_states, idx, vehicle_data, scale, draw_thrusters, keep=None):
     # Unpack input data
     pos         = plot_states[idx, 0:3]
     orient      = plot_states[idx, 3:7]
@@ -13,7 +14,7 @@ def get_3d_frame_data(plot_states, idx, vehicle_data, scale, draw_thrusters):
     quat_targ   = quaternion.from_float_array(quat_targ)
 
     # Create the spacecraft trajectory
-    spacecraft_traj = draw_traj(plot_states[:, 0:3], idx, vehicle_data[2])
+    spacecraft_traj = draw_traj(plot_states[:, 0:3], idx, vehicle_data[2], keep)
 
     # Plot the spacecraft axes
     sc_axes    = draw_spacecraft_axes(pos, quat, scale)
@@ -31,13 +32,52 @@ def get_3d_frame_data(plot_states, idx, vehicle_data, scale, draw_thrusters):
     objs.extend(spacecraft)
     return objs
 
-def draw_traj(posits, idx, colorscale):
-    spacecraft_traj  = go.Scatter3d(x=posits[0:idx,0],
-                                    y=posits[0:idx,1],
-                                    z=posits[0:idx,2],
+def decimate(points, max_points):
+    '''
+    Level of detail of a trajectory, Ramer-Douglas-Peucker simplification run to a
+    point budget instead of a tolerance. Starting from the end points, the span whose
+    farthest point lies farthest from its chord is split at that point until max_points
+    are kept, so the largest distance between the drawn and the full trajectory is as
+    small as the budget allows and points go where it curves
+    :param points: (N,D) trajectory
+    :param max_points: most points kept, at least 2
+    :return: sorted indices of the kept points
+    '''
+    num_points  = len(points)
+    if num_points <= max_points:
+        return np.arange(num_points)
+
+    spans   = []
+    def push(start, end):
+        if end - start < 2:
+            return
+        chord   = points[end] - points[start]
+        offset  = points[start+1:end] - points[start]
+        length2 = np.dot(chord, chord)
+        frac    = np.clip(offset @ chord/length2, 0, 1) if length2 > 0 else np.zeros(len(offset))
+        dist    = np.linalg.norm(offset - frac[:,None]*chord, axis=1)
+        far     = int(np.argmax(dist))
+        heapq.heappush(spans, (-dist[far], start, end, start + 1 + far))
+
+    kept    = [0, num_points - 1]
+    push(0, num_points - 1)
+    while spans and len(kept) < max_points:
+        _, start, end, split = heapq.heappop(spans)
+        kept.append(split)
+        push(start, split)
+        push(split, end)
+    return np.sort(kept)
+
+def draw_traj(posits, idx, colorscale, keep=None):
+    # The decimated trajectory is drawn whole when the kept points are given
+    if keep is None:
+        keep = np.arange(0, idx, 1)
+    spacecraft_traj  = go.Scatter3d(x=posits[keep,0],
+                                    y=posits[keep,1],
+                                    z=posits[keep,2],
                                     mode="lines",
                                     line=dict(width=5, colorscale=colorscale, 
-                                              color=np.arange(0, idx, 1), 
+                                              color=keep, 
                                               showscale=False), showlegend=False)
     return [spacecraft_traj]
 
@@ -222,17 +262,13 @@ def pci(satellites, body):
     objs = [draw_planet(body)]
     max_global_range = 0
     for sc in satellites:
-        sat_pos             = sc.state_history[:,0:3]
-        sat_orient          = sc.state_history[:,6:10]
-        quat_targ_history   = sc.target_orient_history
-        vehicle_model       = sc.vehicle_model
-
-        sat_state_plot  = format.states_for_plot(sat_pos, sat_orient, quat_targ_history)
+        vehicle_model   = sc.vehicle_model
+        sat_state_plot  = format.plot_states(sc, "inertial")
         draw_thrusters  = False
         frame           = get_3d_frame_data(sat_state_plot, 
                                             len(sat_state_plot)-1, 
                                             vehicle_model, scale, 
-                                            draw_thrusters)
+                                            draw_thrusters, sc.traj_keep)
         objs.extend(frame)
 
         max_range = np.max(np.abs(sc.state_history[:,0:3]))
@@ -258,7 +294,8 @@ def pci(satellites, body):
                                                           size=18,color="RebeccaPurple"))
     return fig
 
-def create_ground_circle(radius, R, center_lat, center_lon):
+def ground_circle(radius, R, center_lat, center_lon):
+    # Broadcasts over centers given as columns, one circle per row
     angles = np.linspace(0, 2*np.pi, 100)
 
     lat_rad = np.radians(center_lat)
@@ -271,37 +308,48 @@ def create_ground_circle(radius, R, center_lat, center_lon):
     
     lat_points = np.degrees(lat_points)
     lon_points = np.degrees(lon_points)
+    return lat_points, lon_points
+
+def create_ground_circle(radius, R, center_lat, center_lon):
+    lat_points, lon_points = ground_circle(radius, R, center_lat, center_lon)
 
     circle = go.Scattergeo(lat=lat_points, lon=lon_points, mode="lines", 
                            line=dict(width=2, color="whitesmoke"), 
                            showlegend=False)
     return circle
 
-def ground_track_frame(sc, body, idx):
+def ground_track_frame(sc, body, idx, keep=None):
     objs =[]
+    state_lla_hist  = sc.lla_hist
+    if keep is None:
+        keep        = np.arange(len(state_lla_hist[0:idx,0]))
+    vis_range, last_pos = ground_position(sc, body, idx)
+
+    traj            = go.Scattergeo(lat=state_lla_hist[keep,0], lon=state_lla_hist[keep,1], 
+                                mode="markers", marker=dict(size=4, color=keep, 
+                                                            colorscale=sc.colorscale), showlegend=False)
+    objs.extend([vis_range, traj, last_pos])
+    return objs
+
+def ground_position(sc, body, idx):
     state_lla_hist  = sc.lla_hist
     R_body          = body.radius
     alt             = state_lla_hist[idx,2]
     angle           = np.arccos(R_body/(R_body + alt))
     arc_len         = R_body*angle
-    num_points      = len(state_lla_hist[0:idx,0])
     vis_range       = create_ground_circle(arc_len, R_body, state_lla_hist[idx,0], state_lla_hist[idx,1])
 
-    traj            = go.Scattergeo(lat=state_lla_hist[0:idx,0], lon=state_lla_hist[0:idx,1], 
-                                mode="markers", marker=dict(size=4, color=np.arange(num_points), 
-                                                            colorscale=sc.colorscale), showlegend=False)
     sc_icon_color   = plotly.colors.get_colorscale(sc.colorscale)[-1]
     last_pos        = go.Scattergeo(lat=[state_lla_hist[idx,0]], lon=[state_lla_hist[idx,1]],
                                 mode="markers", marker=dict(size=15, color=sc_icon_color, 
                                                             symbol = "triangle-right"), 
                                 name=sc.name)
-    objs.extend([vis_range, traj, last_pos])
-    return objs
+    return [vis_range, last_pos]
 
 def ground_track(spacecrafts, body): 
     fig     = go.Figure();  
     for sc in spacecrafts:
-        frame   = ground_track_frame(sc, body, -1)
+        frame   = ground_track_frame(sc, body, -1, sc.track_keep)
         fig.add_traces(frame)
         
     fig.update_layout(title="Ground Track",
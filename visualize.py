@@ -1,7 +1,9 @@
 import utils.loader as loader
 
 visualizer = loader.load_vis("Config/vis.yaml")
-# visualizer.run("eci_anim")
-
-visualizer.run("att_lvlh_anim")
-# visualizer.run("groundtrack_anim")
\ No newline at end of file
+if visualizer.export_plots:
+    visualizer.export()
+else:
+    # visualizer.run("eci_anim")
+    visualizer.run("att_lvlh_anim")
+    # visualizer.run("groundtrack_anim")
\ No newline at end of file